@@ -20,6 +20,16 @@ asyncio compatibility shim for TinyDB
 Enables usage of TinyDB in asyncio-aware contexts without slow synchronous IO.
 """
 
+from .compression import Codec, GzipCodec, LZ4Codec, ZstdCodec
 from .database import AIOTinyDB
-from .exceptions import DatabaseNotReady
-from .storage import AIOJSONStorage, AIOImmutableJSONStorage
+from .directory import AIODirectoryStorage
+from .exceptions import DatabaseConflictError, DatabaseNotReady
+from .metrics import HistogramMetrics, Metrics
+from .pool import AIOProcessPool
+from .rwlock import AIORWLock
+from .snapshot import AIOSnapshotStorage
+from .sqlite import AIOSQLiteStorage
+from .serializers import JSONSerializer, MsgPackSerializer, ORJSONSerializer, Serializer
+from .storage import AIOJSONStorage, AIOImmutableJSONStorage, AIOLogStorage, AIOMappedJSONStorage
+from .table import AIOTable
+from .watch import AIOFileWatcher, TableChange
@@ -0,0 +1,92 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `ResultCache`, the query result cache `AIOTinyDB`
+keeps across sessions.
+"""
+
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from tinydb.queries import QueryLike
+from tinydb.table import Document
+
+# (storage generation, table version, documents)
+_Entry = Tuple[int, int, List[Document]]
+
+
+class ResultCache:
+    """
+    Least recently used cache of query results
+
+    A result is only returned while the storage `generation` and the
+    version of its table are the ones it was stored with. Tables bump
+    their version with `invalidate()` whenever they are changed, the
+    storage generation covers changes made by other processes.
+
+    At most `maxsize` results are kept, `hits`, `misses` and `evictions`
+    count lookups which found a result, lookups which didn't and results
+    dropped to make room for new ones.
+    """
+    def __init__(self, maxsize: int) -> None:
+        if maxsize < 1:
+            raise ValueError(f'Cache size must be positive: {maxsize!r}')
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[Tuple[str, QueryLike], _Entry]' = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, table: str, cond: QueryLike, generation: int) -> Optional[List[Document]]:
+        """
+        Documents found by `cond` in `table`, `None` if they aren't cached
+        """
+        key = (table, cond)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[:2] == (generation, self._versions.get(table, 0)):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2][:]
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, table: str, cond: QueryLike, generation: int, docs: List[Document]) -> None:
+        """
+        Remember the documents found by `cond` in `table`
+        """
+        key = (table, cond)
+        self._entries[key] = (generation, self._versions.get(table, 0), docs[:])
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, table: str) -> None:
+        """
+        Forget all results of `table`
+        """
+        self._versions[table] = self._versions.get(table, 0) + 1
+
+    def clear(self) -> None:
+        """
+        Forget all results
+        """
+        self._entries.clear()
@@ -0,0 +1,194 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Contains the codecs `AIOJSONStorage` uses to compress the serialized
+database, and a reader decompressing a file chunk by chunk.
+"""
+
+import zlib
+from typing import Callable, List, Optional, Type
+
+try:
+    import zstandard
+    ZSTD_SUPPORTED = True
+except ImportError:  # pragma: no cover
+    ZSTD_SUPPORTED = False  # pragma: no cover
+
+try:
+    import lz4.frame
+    LZ4_SUPPORTED = True
+except ImportError:  # pragma: no cover
+    LZ4_SUPPORTED = False  # pragma: no cover
+
+# bytes needed to tell the codecs apart
+MAGIC_SIZE = 4
+CHUNK_SIZE = 1 << 18
+
+# decompresses the next chunk, an empty one flushes what's left
+Decompressor = Callable[[bytes], bytes]
+Read = Callable[[int, int], bytes]
+
+
+class Codec:
+    """
+    Base class of compression codecs, recognized by the `magic` bytes
+    every compressed file starts with
+    """
+    name = 'base'
+    magic = b''
+
+    def compress(self, data: bytes) -> bytes:
+        """
+        Compress the serialized database
+        """
+        raise NotImplementedError('To be overridden!')
+
+    def decompressor(self) -> Decompressor:
+        """
+        Get a function decompressing a file chunk by chunk
+        """
+        raise NotImplementedError('To be overridden!')
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}()'
+
+
+class GzipCodec(Codec):
+    """
+    gzip compression using the standard library `zlib` module
+    """
+    name = 'gzip'
+    magic = b'\x1f\x8b'
+
+    def __init__(self, level: int = 6) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        compressor = zlib.compressobj(self.level, wbits=31)
+        return compressor.compress(data) + compressor.flush()
+
+    def decompressor(self) -> Decompressor:
+        decompressor = zlib.decompressobj(wbits=31)
+        return lambda chunk: decompressor.decompress(chunk) if chunk else decompressor.flush()
+
+
+class ZstdCodec(Codec):
+    """
+    Zstandard compression using `zstandard`, much faster than gzip at a
+    similar ratio
+    """
+    name = 'zstd'
+    magic = b'\x28\xb5\x2f\xfd'
+
+    def __init__(self, level: int = 3) -> None:
+        if not ZSTD_SUPPORTED:
+            raise ValueError('ZstdCodec requires the zstandard package')
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def decompressor(self) -> Decompressor:
+        decompressor = zstandard.ZstdDecompressor().decompressobj()
+        return lambda chunk: decompressor.decompress(chunk) if chunk else b''
+
+
+class LZ4Codec(Codec):
+    """
+    LZ4 frame compression using `lz4`, the fastest codec with the lowest
+    ratio
+    """
+    name = 'lz4'
+    magic = b'\x04\x22\x4d\x18'
+
+    def __init__(self) -> None:
+        if not LZ4_SUPPORTED:
+            raise ValueError('LZ4Codec requires the lz4 package')
+
+    def compress(self, data: bytes) -> bytes:
+        return lz4.frame.compress(data)
+
+    def decompressor(self) -> Decompressor:
+        decompressor = lz4.frame.LZ4FrameDecompressor()
+        return lambda chunk: decompressor.decompress(chunk) if chunk else b''
+
+
+_CODECS: List[Type[Codec]] = [GzipCodec, ZstdCodec, LZ4Codec]
+
+
+def detect_codec(head: bytes) -> Optional[Codec]:
+    """
+    Get a codec for a file starting with `head`, `None` if it isn't
+    compressed
+    """
+    for codec in _CODECS:
+        if head.startswith(codec.magic):
+            return codec()
+    return None
+
+
+class ContentReader:
+    """
+    Reads the contents of a file, decompressed by `codec` unless it's
+    `None`, where `read(offset, size)` returns the raw bytes of the file
+
+    Calling the reader itself has the signature `iter_records` expects, but
+    reads are sequential: `offset` is ignored and every call continues where
+    the previous one stopped. Only a chunk of the compressed file is held in
+    memory at a time.
+    """
+    def __init__(self, read: Read, codec: Optional[Codec]) -> None:
+        self._read = read
+        self._decompress = None if codec is None else codec.decompressor()
+        self._offset = 0
+        self._ahead = b''
+        self._done = False
+
+    def head(self) -> bytes:
+        """
+        Read the first chunk of the contents ahead, e.g. to detect the format
+        """
+        if not self._ahead and not self._offset:
+            self._ahead = self(0, CHUNK_SIZE)
+        return self._ahead
+
+    def __call__(self, offset: int, size: int) -> bytes:
+        if self._ahead:
+            data, self._ahead = self._ahead, b''
+            return data
+        while not self._done:
+            chunk = self._read(self._offset, size)
+            self._offset += len(chunk)
+            if self._decompress is None:
+                data = chunk
+            else:
+                # a chunk of the header only decompresses to nothing
+                data = self._decompress(chunk)
+            self._done = not chunk
+            if data:
+                return data
+        return b''
+
+    def read_all(self) -> bytearray:
+        """
+        Read the complete contents
+        """
+        contents = bytearray()
+        while True:
+            data = self(0, CHUNK_SIZE)
+            if not data:
+                return contents
+            contents += data
@@ -20,13 +20,27 @@ This module contains the async-enabled `AIOTinyDB` database.
 
 # pylint: disable=super-init-not-called,arguments-differ
 # pylint: disable=too-many-instance-attributes
+import asyncio
 from asyncio import Lock
+from concurrent.futures import Executor
+from contextlib import asynccontextmanager
+from time import perf_counter
 from types import TracebackType
-from typing import Any, Dict, NoReturn, Optional, Set, Type, TypeVar
+from typing import (
+    AsyncGenerator, AsyncIterator, Any, Dict, NoReturn, Optional, Sequence, Set, Type, TypeVar,
+    cast,
+)
 from tinydb import TinyDB
 from tinydb.table import Table
-from .exceptions import NotOverridableError, DatabaseNotReady
-from .storage import AIOJSONStorage, AIOStorage
+from .cache import ResultCache
+from .exceptions import NotOverridableError, DatabaseNotReady, ReadonlyStorageError
+from .index import IndexSpec
+from .metrics import NULL_METRICS, Metrics
+from .pool import AIOPooledTable, AIOProcessPool
+from .rwlock import AIORWLock
+from .storage import AIOJSONStorage, AIOLogStorage, AIOStorage
+from .table import AIOTable
+from .watch import AIOFileWatcher, TableChange, diff_digests, read_digests
 
 AIOTinyDB_T = TypeVar('AIOTinyDB_T', bound='AIOTinyDB')  # pylint: disable=invalid-name
 
@@ -48,33 +62,143 @@ class AIOTinyDB(TinyDB):
     loop.run_until_complete(test())
     loop.close()
     ```
+
+    CPU-bound queries can be awaited instead, which runs them in
+    `query_executor` (the default executor of the event loop if not set):
+    ```
+    async with AIOTinyDB('test.json') as db:
+        found = await db.asearch(where('counter') == 1)
+    ```
+
+    With `process_pool=AIOProcessPool()` read queries can also be run by
+    worker processes which keep the parsed file in memory (see `pooled`).
+
+    `async with db` sessions are exclusive. Coroutines which only read can
+    use `async with db.reading()` instead, these run concurrently and share
+    one opened storage.
+
+    Tables can be given secondary indexes to speed up queries, e.g.
+    `db.table('users', indexes=['email', ('tenant', 'created')])` (see
+    `AIOTable`). They are remembered for the following sessions.
+
+    Query results are normally forgotten at the end of every session. With
+    `result_cache_size=N` the results of up to `N` cacheable queries are
+    kept in `result_cache` across sessions, until the storage `generation`
+    changes: any write, or a change of the file by another process, drops
+    them all.
+
+    With `group_commit_window=...` writer sessions share one opened storage
+    and one write-back. A session that ends while others wait for the lock,
+    or before `group_commit_window` seconds have passed since the first one,
+    leaves the storage open for the next. The batch is written back after
+    `group_commit_size` sessions, once the window is over or as soon as no
+    writer is waiting with a window of `0`. Every session of the batch
+    returns from `async with` once that write is done, and raises its
+    exception if it failed.
+
+    With `persistent=True` the storage keeps the file open and parsed between
+    sessions. Changes are then written after `flush_interval` seconds (or
+    right at the end of each session if it is `None`), by `await db.flush()`
+    or by `await db.aclose()`, which should be called once the database isn't
+    needed anymore.
+
+    `async for change in db.watch()` reports which tables changed whenever
+    the file is written, by this or any other process.
+
+    `metrics=HistogramMetrics()` (or any other `Metrics`) receives how long
+    sessions waited for each other and how long they took in total. It is
+    passed on to the storage, which reports waiting for the file lock,
+    reading, parsing, serializing and writing.
     """
     # The class that will be used to create table instances
-    table_class = Table
+    table_class = AIOTable
     # The class that will be used by default to create storage instances
     default_storage_class: Type[AIOStorage] = AIOJSONStorage  # type: ignore[assignment]
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         storage = kwargs.pop('storage', self.default_storage_class)
+        self._query_executor: Optional[Executor] = kwargs.pop('query_executor', None)
+        self._process_pool: Optional[AIOProcessPool] = kwargs.pop('process_pool', None)
+        self._flush_interval: Optional[float] = kwargs.pop('flush_interval', None)
+        self._flush_task: Optional['asyncio.Task[None]'] = None
+        self._group_commit_window: Optional[float] = kwargs.pop('group_commit_window', None)
+        self._group_commit_size: int = kwargs.pop('group_commit_size', 100)
+        self._batch: Optional['asyncio.Future[None]'] = None
+        self._batch_size: int = 0
+        self._batch_closer: Optional['asyncio.Future[None]'] = None
+        result_cache_size: int = kwargs.pop('result_cache_size', 0)
+        self._result_cache = ResultCache(result_cache_size) if result_cache_size else None
+        # left in `kwargs` for the storage
+        self._metrics: Metrics = kwargs.get('metrics', NULL_METRICS)
+        self._session_start: float = 0.0
         self._storage: AIOStorage = storage(*args, **kwargs)
         self._opened: bool = False
+        self._readonly: bool = False
         self._tables: Dict[str, Table] = {}
-        self._lock: Optional[Lock] = None
+        self._indexes: Dict[str, Sequence[IndexSpec]] = {}
+        self._lock: Optional[AIORWLock] = None
+        self._open_lock: Optional[Lock] = None
+        self._query_lock: Optional[Lock] = None
 
     def drop_table(self, name: str) -> None:
         if not self._opened:
             raise DatabaseNotReady('File is not opened. Use `async with AIOTinyDB(...):`')
+        if self._readonly:
+            raise ReadonlyStorageError('Database is opened for reading only')
+        if self._result_cache is not None:
+            self._result_cache.invalidate(name)
         return super().drop_table(name)
 
     def drop_tables(self) -> None:
         if not self._opened:
             raise DatabaseNotReady('File is not opened. Use `async with AIOTinyDB(...):`')
+        if self._readonly:
+            raise ReadonlyStorageError('Database is opened for reading only')
+        if self._result_cache is not None:
+            self._result_cache.clear()
         return super().drop_tables()
 
-    def table(self, name: str, **kwargs: Any) -> Table:
+    def table(self, name: str, **kwargs: Any) -> AIOTable:
         if not self._opened:
             raise DatabaseNotReady('File is not opened. Use `async with AIOTinyDB(...):`')
-        return super().table(name, **kwargs)
+        kwargs.setdefault('executor', self._query_executor)
+        kwargs.setdefault('lock', self._query_lock)
+        kwargs.setdefault('readonly', self._readonly)
+        kwargs.setdefault('result_cache', self._result_cache)
+        indexes = kwargs.pop('indexes', None)
+        if indexes is not None:
+            # tables are created anew in every session, their indexes are declared once
+            self._indexes[name] = indexes
+        table = cast(AIOTable, super().table(name, **kwargs))
+        table.set_indexes(self._indexes.get(name, ()))
+        return table
+
+    @property
+    def result_cache(self) -> Optional[ResultCache]:
+        """
+        Query results kept across sessions, `None` unless `result_cache_size` is set
+        """
+        return self._result_cache
+
+    @property
+    def metrics(self) -> Metrics:
+        """
+        Receiver of the durations of sessions and their phases
+        """
+        return self._metrics
+
+    def pooled(self, name: Optional[str] = None) -> AIOPooledTable:
+        """
+        Get a table whose `search`, `count` and `contains` coroutines are run
+        by the worker processes of `process_pool`. Unlike other methods, it is
+        used outside of `async with` and sees the data last written to disk.
+        """
+        if self._process_pool is None:
+            raise DatabaseNotReady('No process pool. Use `AIOTinyDB(..., process_pool=...)`')
+        filename = getattr(self._storage, 'filename', None)
+        if filename is None:
+            raise DatabaseNotReady('Only file based storages can be used with a process pool')
+        return AIOPooledTable(self._process_pool, filename, name or self.default_table_name)
 
     def tables(self) -> Set[str]:
         if not self._opened:
@@ -86,14 +210,43 @@ class AIOTinyDB(TinyDB):
             raise AttributeError('File is not opened. Use `async with AIOTinyDB(...):`')
         return super().__getattr__(name)
 
-    async def __aenter__(self: AIOTinyDB_T) -> AIOTinyDB_T:
+    def _init_locks(self) -> AIORWLock:
+        # locks are bound to the running loop on creation in older Pythons
         if self._lock is None:
-            self._lock = Lock()
-        await self._lock.acquire()
-        if not self._opened:
-            await self._storage.__aenter__()
-            self._opened = True
-            self._tables[self.default_table_name] = self.table(self.default_table_name)
+            self._lock = AIORWLock()
+            self._open_lock = Lock()
+            self._query_lock = Lock()
+        return self._lock
+
+    async def _open(self, readonly: bool) -> None:
+        await self._storage.__aenter__()  # pylint: disable=unnecessary-dunder-call
+        self._opened = True
+        self._readonly = readonly
+        self._tables[self.default_table_name] = self.table(self.default_table_name)
+
+    async def _close(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        self._opened = False
+        self._readonly = False
+        self._tables = {}
+        await self._storage.__aexit__(exc_type, exc_value, exc_tb)
+
+    async def __aenter__(self: AIOTinyDB_T) -> AIOTinyDB_T:
+        lock = self._init_locks()
+        start = perf_counter()
+        await lock.acquire_write()
+        self._metrics.observe('lock_wait', perf_counter() - start)
+        self._session_start = start
+        try:
+            if not self._opened:
+                await self._open(readonly=False)
+        except BaseException:
+            lock.release_write()
+            raise
         return self
 
     async def __aexit__(
@@ -102,12 +255,215 @@ class AIOTinyDB(TinyDB):
         exc_value: Optional[BaseException],
         exc_tb: Optional[TracebackType]
     ) -> None:
-        if self._opened:
-            self._opened = False
-            await self._storage.__aexit__(exc_type, exc_value, exc_tb)
-            self._tables = {}
         assert self._lock is not None
-        self._lock.release()
+        start = self._session_start
+        try:
+            if self._group_commit_window is not None and self._opened:
+                await self._join_batch(exc_type, exc_value, exc_tb)
+                return
+            try:
+                if self._opened:
+                    await self._end_session(exc_type, exc_value, exc_tb)
+            finally:
+                self._lock.release_write()
+        finally:
+            self._metrics.observe('session', perf_counter() - start)
+
+    async def _end_session(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        await self._close(exc_type, exc_value, exc_tb)
+        if self._flush_interval is not None:
+            if self._flush_task is None:
+                self._flush_task = asyncio.ensure_future(self._flush_later())
+        elif not self._storage.background_flush:
+            await self._storage.aflush()
+
+    async def _join_batch(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        """
+        End a write session in group commit mode, leaving the storage open if
+        the next writer is (or may soon be) waiting, and wait until the
+        sessions of the batch are written back
+        """
+        assert self._lock is not None and self._group_commit_window is not None
+        if self._batch is None:
+            self._batch = asyncio.get_event_loop().create_future()
+        batch = self._batch
+        self._batch_size += 1
+        try:
+            if self._batch_size >= self._group_commit_size or not (
+                    self._lock.waiting_writers or self._group_commit_window):
+                await self._finish_batch(exc_type, exc_value, exc_tb)
+            elif self._batch_closer is None:
+                self._batch_closer = asyncio.ensure_future(self._finish_batch_later())
+        finally:
+            self._lock.release_write()
+        # the batch goes on if a waiting session is cancelled
+        await asyncio.shield(batch)
+
+    async def _finish_batch(
+        self,
+        exc_type: Optional[Type[BaseException]] = None,
+        exc_value: Optional[BaseException] = None,
+        exc_tb: Optional[TracebackType] = None
+    ) -> None:
+        """
+        Write back and close the storage left open by a batch of sessions,
+        passing the outcome on to all of them
+        """
+        batch, self._batch = self._batch, None
+        assert batch is not None
+        self._batch_size = 0
+        self._batch_closer = None
+        try:
+            if self._opened:
+                await self._end_session(exc_type, exc_value, exc_tb)
+        except BaseException as error:  # pylint: disable=broad-except
+            batch.set_exception(error)
+        else:
+            batch.set_result(None)
+
+    async def _finish_batch_later(self) -> None:
+        """
+        Finish the batch after the window, or once the writers which are
+        already waiting are done
+        """
+        assert self._lock is not None and self._group_commit_window is not None
+        await asyncio.sleep(self._group_commit_window)
+        await self._lock.acquire_write()
+        try:
+            # unless a session, a reader or flush() finished it already
+            if self._batch is not None:
+                await self._finish_batch()
+        finally:
+            self._lock.release_write()
+
+    async def _flush_later(self) -> None:
+        assert self._flush_interval is not None
+        await asyncio.sleep(self._flush_interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self) -> None:
+        """
+        Write the changes a persistent storage kept in memory
+        """
+        lock = self._init_locks()
+        await lock.acquire_write()
+        try:
+            if self._batch is not None:
+                await self._finish_batch()
+            await self._storage.aflush()
+        finally:
+            lock.release_write()
+
+    async def aclose(self) -> None:
+        """
+        Flush and close a persistent storage
+        """
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        lock = self._init_locks()
+        await lock.acquire_write()
+        try:
+            if self._batch is not None:
+                await self._finish_batch()
+            await self._storage.aclose()
+        finally:
+            lock.release_write()
+
+    async def watch(
+        self, *, poll_interval: float = 1.0, inotify: bool = True
+    ) -> AsyncGenerator[TableChange, None]:
+        """
+        Iterate over the changes of the database file, table by table
+
+        Whenever the file is written, by this or any other process, a
+        `TableChange` is yielded for every table which was created, changed
+        or dropped. The file is watched by an `AIOFileWatcher`, and tables
+        are compared by checksums of their part of the file, so JSON isn't
+        even parsed. Cached results of changed tables and documents a
+        persistent storage kept are dropped before the changes are yielded.
+        Like `pooled()`, this is used outside of `async with`.
+
+        # Example
+        ```
+        async for change in db.watch():
+            if change.table == 'settings':
+                async with db.reading():
+                    settings = db.table('settings').all()
+        ```
+        """
+        storage = self._storage
+        if not isinstance(storage, AIOJSONStorage) or isinstance(storage, AIOLogStorage):
+            raise DatabaseNotReady('Only JSON file storages can be watched')
+        async with AIOFileWatcher(
+                storage.filename, poll_interval=poll_interval, inotify=inotify) as watcher:
+            digests = await read_digests(storage.filename)
+            while True:
+                await watcher.wait()
+                current = await read_digests(storage.filename)
+                changes = diff_digests(digests, current)
+                digests = current
+                if changes:
+                    self._invalidate(changes)
+                for change in changes:
+                    yield change
+
+    def _invalidate(self, changes: Sequence[TableChange]) -> None:
+        if self._result_cache is not None:
+            for change in changes:
+                self._result_cache.invalidate(change.table)
+        # a no-op while the storage is used by a session or has unwritten changes
+        self._storage.invalidate()
+
+    @asynccontextmanager
+    async def reading(self: AIOTinyDB_T) -> AsyncIterator[AIOTinyDB_T]:
+        """
+        Open the database for reading only
+
+        Any number of read sessions can be active at the same time, they
+        share the storage opened by the first one and it is closed when the
+        last one ends. `async with db` sessions wait for all readers to
+        finish, and new readers wait for waiting writers. Writing inside a
+        read session raises `ReadonlyStorageError`.
+
+        # Example
+        ```
+        async with db.reading():
+            found = db.search(where('counter') == 1)
+        ```
+        """
+        lock = self._init_locks()
+        assert self._open_lock is not None
+        start = perf_counter()
+        await lock.acquire_read()
+        self._metrics.observe('lock_wait', perf_counter() - start)
+        try:
+            async with self._open_lock:
+                if self._batch is not None:
+                    # readers only see what's written back
+                    await self._finish_batch()
+                if not self._opened:
+                    await self._open(readonly=True)
+            yield self
+        finally:
+            try:
+                async with self._open_lock:
+                    if lock.readers == 1 and self._opened:
+                        await self._close(None, None, None)
+            finally:
+                lock.release_read()
+                self._metrics.observe('session', perf_counter() - start)
 
     def close(self) -> NoReturn:
         raise NotOverridableError('Usual methods will not work on async')
@@ -0,0 +1,356 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `AIODirectoryStorage`, which keeps every table of a
+database in its own file so that changing one table doesn't rewrite all.
+"""
+
+# pylint: disable=super-init-not-called,too-many-instance-attributes
+import os
+from time import perf_counter
+from types import TracebackType
+from typing import (
+    Any, Dict, Iterator, List, MutableMapping, Optional, Set, Tuple, Type, cast,
+)
+from urllib.parse import quote, unquote
+import aiofiles
+from aiofiles.threadpool.binary import AsyncBufferedIOBase, AsyncBufferedReader
+from .compression import MAGIC_SIZE
+from .exceptions import DatabaseConflictError, ReadonlyStorageError
+from .metrics import NULL_METRICS
+from .storage import FILELOCK_SUPPORTED, AIOJSONStorage, AIOStorage, StrOrBytesPath
+
+try:
+    # `fcntl.flock()` is only available on unix
+    from .filelock import AIOFileLock
+except ImportError:  # pragma: no cover
+    pass  # pragma: no cover
+
+
+# locked by the sessions which may write
+_LOCK_NAME = '.lock'
+
+
+def _is_internal(entry: str) -> bool:
+    """
+    Check whether a directory entry is the lock file or a temporary file
+    of an atomic write, rather than the file of a table
+    """
+    return entry == _LOCK_NAME or entry.startswith('.') and entry.endswith('.tmp')
+
+
+class _TableFile(AIOJSONStorage):
+    """
+    File of a single table of an `AIODirectoryStorage`, locked for a whole
+    session but only parsed once the table is used
+    """
+    async def _open_file(self) -> AsyncBufferedReader:
+        # a missing file means the table was dropped, don't create it again
+        return await aiofiles.open(self._filename, 'rb' if self._readonly else 'rb+')
+
+    async def _load(self) -> None:
+        await self._lock_file()
+        self._opened = True
+
+    def load_now(self) -> Dict[str, Any]:
+        """
+        Parse the locked file, blocking
+        """
+        assert self._file is not None
+        start = perf_counter()
+        fileno = self._file.fileno()
+        codec = self._detect_codec(os.pread(fileno, MAGIC_SIZE, 0))
+        contents = self._reader(fileno, codec).read_all()
+        self._metrics.observe('read', perf_counter() - start, len(contents))
+        start = perf_counter()
+        self._data = self._detect(contents).loads(contents) if contents else {}
+        self._metrics.observe('parse', perf_counter() - start, len(contents))
+        return self._data
+
+    async def save(self, table: Dict[str, Any]) -> None:
+        """
+        Write the table to the locked file
+        """
+        self._data = table
+        await self._flush()
+
+    async def create(self, table: Dict[str, Any]) -> None:
+        """
+        Write the file of a new table, unless another session created it
+        """
+        serialized = await self._serialize(table)
+        try:
+            # others see the file only once it is complete
+            await self._write_atomic(serialized, link=True)
+        except FileExistsError:
+            raise DatabaseConflictError(
+                f'{os.fsdecode(self._filename)} was created by another session') from None
+
+
+class _DirectoryTables(MutableMapping[str, Dict[str, Any]]):
+    """
+    Tables of an `AIODirectoryStorage`, each one parsed on first access
+    """
+    def __init__(self, storage: 'AIODirectoryStorage') -> None:
+        self._storage = storage
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        return self._storage._table(name)  # pylint: disable=protected-access
+
+    def __setitem__(self, name: str, table: Dict[str, Any]) -> None:
+        self._storage._set_table(name, table)  # pylint: disable=protected-access
+
+    def __delitem__(self, name: str) -> None:
+        self._storage._drop_table(name)  # pylint: disable=protected-access
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(sorted(self._storage._names))  # pylint: disable=protected-access
+
+    def __len__(self) -> int:
+        return len(self._storage._names)  # pylint: disable=protected-access
+
+
+class AIODirectoryStorage(AIOStorage):
+    """
+    Asyncronous storage for AIOTinyDB keeping every table in its own file
+
+    `path` is a directory containing one file per table, named after the
+    table (quoted where needed) plus `suffix`. `__aenter__` locks the files
+    of all tables, each with its own `AIOFileLock`, but a table is only read
+    and parsed once it is used, and only the tables which were changed are
+    written back in `__aexit__`. `tables()` is answered from the directory
+    listing without reading any of them.
+
+    `generation` is increased by every change of a table and whenever a
+    session finds table files changed since they were last read or written.
+
+    Sessions which may write also hold an exclusive lock on `.lock` in the
+    directory, so like with a single file, a session sees the tables the
+    sessions before it created. New tables are created with a link so a
+    table created by another process which ignores that lock is never
+    overwritten; `DatabaseConflictError` is raised instead, and none of the
+    session's new tables is kept.
+
+    `access_mode`, `lock_timeout` and all other arguments are the same as
+    for `AIOJSONStorage`, and apply to every table file.
+    """
+    def __init__(
+        self,
+        path: StrOrBytesPath,
+        *args: Any,
+        suffix: str = '.json',
+        access_mode: str = 'r+',
+        **kwargs: Any
+    ) -> None:
+        if access_mode not in ('r', 'r+'):
+            raise ValueError(f'Unknown access mode: {access_mode!r}')
+        self.args = args
+        self.kwargs = kwargs
+        self._path = os.fsdecode(path)
+        self._suffix = suffix
+        self._readonly = access_mode == 'r'
+        self._access_mode = access_mode
+        self._lock_file: Optional[AsyncBufferedIOBase] = None
+        self._lock: Optional['AIOFileLock'] = None
+        self._files: Dict[str, _TableFile] = {}
+        self._tables: Dict[str, Dict[str, Any]] = {}
+        self._names: Set[str] = set()
+        self._changed: Set[str] = set()
+        self._dropped: Set[str] = set()
+        self._opened: bool = False
+        self._seen_stamp: Optional[Tuple[Any, ...]] = None
+        self._generation: int = 0
+        self.flushes: int = 0
+        self.skipped_flushes: int = 0
+
+    @property
+    def path(self) -> str:
+        """
+        Path of the database directory
+        """
+        return self._path
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _current_stamp(self) -> Tuple[Any, ...]:
+        """
+        Identify the current version of all table files
+        """
+        stamp = []
+        for name in self._list_tables():
+            try:
+                stat = os.stat(self._table_path(name))
+            except FileNotFoundError:
+                continue
+            stamp.append((name, stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        return tuple(stamp)
+
+    def _table_path(self, name: str) -> str:
+        return os.path.join(self._path, quote(name, safe='') + self._suffix)
+
+    def _table_file(self, name: str) -> _TableFile:
+        return _TableFile(
+            self._table_path(name), *self.args, access_mode=self._access_mode, **self.kwargs)
+
+    def _list_tables(self) -> List[str]:
+        try:
+            entries = os.listdir(self._path)
+        except FileNotFoundError:
+            return []
+        # tables may start with a dot too, e.g. '' is stored in `.json`
+        return sorted(
+            unquote(entry[:-len(self._suffix)]) for entry in entries
+            if entry.endswith(self._suffix) and not _is_internal(entry))
+
+    async def _lock_directory(self) -> None:
+        """
+        Lock the directory for a session which may create tables
+        """
+        if self._readonly or not FILELOCK_SUPPORTED:
+            return
+        file = self._lock_file = await aiofiles.open(os.path.join(self._path, _LOCK_NAME), 'ab')
+        lock = self._lock = AIOFileLock(
+            file, timeout=self.kwargs.get('lock_timeout'),
+            metrics=self.kwargs.get('metrics', NULL_METRICS))
+        await lock.acquire()
+
+    async def __aenter__(self) -> 'AIODirectoryStorage':
+        if not self._readonly:
+            os.makedirs(self._path, exist_ok=True)
+        try:
+            # before any table file, so sessions can't deadlock
+            await self._lock_directory()
+            # always in the same order, so sessions can't deadlock
+            for name in self._list_tables():
+                file = self._table_file(name)
+                try:
+                    await file.__aenter__()  # pylint: disable=unnecessary-dunder-call
+                except FileNotFoundError:
+                    # dropped by the session we waited for
+                    continue
+                self._files[name] = file
+        except BaseException:
+            await self._close()
+            raise
+        self._names = set(self._files)
+        stamp = self._current_stamp()
+        if stamp != self._seen_stamp:
+            self._seen_stamp = stamp
+            self._generation += 1
+        self._opened = True
+        return self
+
+    def _table(self, name: str) -> Dict[str, Any]:
+        if name not in self._names:
+            raise KeyError(name)
+        if name not in self._tables:
+            self._tables[name] = self._files[name].load_now()
+        return self._tables[name]
+
+    def _set_table(self, name: str, table: Dict[str, Any]) -> None:
+        if self._readonly:
+            raise ReadonlyStorageError('Storage is opened read-only')
+        self._tables[name] = table
+        self._names.add(name)
+        self._changed.add(name)
+        self._dropped.discard(name)
+        self._generation += 1
+
+    def _drop_table(self, name: str) -> None:
+        if self._readonly:
+            raise ReadonlyStorageError('Storage is opened read-only')
+        if name not in self._names:
+            raise KeyError(name)
+        self._tables.pop(name, None)
+        self._names.discard(name)
+        self._changed.discard(name)
+        if name in self._files:
+            self._dropped.add(name)
+        self._generation += 1
+
+    def read(self) -> Dict[str, Dict[str, Any]]:
+        assert self._opened
+        # tinydb only looks tables up, replaces and deletes them by name
+        return cast(Dict[str, Dict[str, Any]], _DirectoryTables(self))
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        assert self._opened
+        if isinstance(data, _DirectoryTables):
+            # the changes were tracked as they were made
+            return
+        for name in self._names - data.keys():
+            self._drop_table(name)
+        for name, table in data.items():
+            self._set_table(name, table)
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        if not self._opened:
+            return
+        try:
+            if self._changed or self._dropped:
+                await self._flush()
+            else:
+                self.skipped_flushes += 1
+        finally:
+            await self._close()
+
+    async def _flush(self) -> None:
+        """
+        Write the changed tables and remove the dropped ones
+        """
+        # new tables first, so nothing else is written if one of them conflicts
+        created: List[StrOrBytesPath] = []
+        try:
+            for name in sorted(self._changed - self._files.keys()):
+                file = self._table_file(name)
+                await file.create(self._tables[name])
+                created.append(file.filename)
+        except DatabaseConflictError:
+            for filename in created:
+                os.unlink(filename)
+            raise
+        for name in sorted(self._changed & self._files.keys()):
+            await self._files[name].save(self._tables[name])
+        for name in self._dropped:
+            # still locked, others waiting for the lock notice it's gone
+            os.unlink(self._files[name].filename)
+        self._seen_stamp = self._current_stamp()
+        self.flushes += 1
+
+    async def _close(self) -> None:
+        """
+        Unlock and close all table files
+        """
+        for file in self._files.values():
+            await file.__aexit__(None, None, None)
+        if self._lock_file is not None:
+            if self._lock is not None and self._lock.locked():
+                self._lock.release()
+            await self._lock_file.close()
+            self._lock_file, self._lock = None, None
+        self._files = {}
+        self._tables = {}
+        self._names = set()
+        self._changed = set()
+        self._dropped = set()
+        self._opened = False
@@ -33,3 +33,7 @@ class ReadonlyStorageError(AIOTinyDBError):
 
 class NotOverridableError(AIOTinyDBError):
     """Indicates a non-overridable method"""
+
+
+class DatabaseConflictError(AIOTinyDBError):
+    """Raised when changes conflict with those of a concurrent session"""
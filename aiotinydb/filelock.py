@@ -19,10 +19,13 @@ concurrent access from several processes on unix systems.
 """
 
 import asyncio
-from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_UN
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_SH, LOCK_UN
+from time import perf_counter
 from types import TracebackType
 from typing import TYPE_CHECKING, Optional, Union, Type
 
+from .metrics import NULL_METRICS, Metrics
+
 
 if TYPE_CHECKING:
     import sys
@@ -39,7 +42,7 @@ if TYPE_CHECKING:
     FileDescriptorLike = Union[int, HasFileno]
 
 
-class AIOFileLock:
+class AIOFileLock:  # pylint: disable=too-many-instance-attributes
     """AsyncIO wrapper around `fctnl.flock` with an interface similar to asyncio.Lock.
 
     Usage:
@@ -66,14 +69,37 @@ class AIOFileLock:
         else:
            # lock is acquired
            ...
+
+    With `shared=True` a shared (`LOCK_SH`) lock is acquired instead of an
+    exclusive (`LOCK_EX`) one, so any number of readers can hold it at the
+    same time while writers wait for all of them to release it.
+
+    A contended lock is polled with `LOCK_NB`, starting after `poll_interval`
+    seconds and doubling the delay up to `max_poll_interval`. No thread is
+    blocked while waiting, so cancelling `acquire()` never leaves the lock
+    acquired behind the caller's back. If `timeout` is set and the lock can't
+    be acquired within that many seconds, `asyncio.TimeoutError` is raised.
+    The time it took to acquire the lock is reported to `metrics` as
+    `flock_wait`.
     """
-    def __init__(
+    def __init__(  # pylint: disable=too-many-arguments
         self,
         file_descriptor: 'FileDescriptorLike',
         loop: Optional[asyncio.AbstractEventLoop] = None,
+        *,
+        shared: bool = False,
+        timeout: Optional[float] = None,
+        poll_interval: float = 0.001,
+        max_poll_interval: float = 0.05,
+        metrics: Metrics = NULL_METRICS,
     ) -> None:
         self.file_descriptor = file_descriptor
         self.loop = loop
+        self.shared = shared
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.metrics = metrics
         self._locked: bool = False
 
     async def __aenter__(self) -> None:
@@ -97,13 +123,26 @@ class AIOFileLock:
         This method blocks until the lock is unlocked, then sets it to
         locked and returns True.
         """
-        try:
-            # avoid performance overhead of ThreadExecutor if lock is unlocked
-            flock(self.file_descriptor, LOCK_EX | LOCK_NB)
-        except BlockingIOError:
-            # use ThreadExecutor to wait until lock is unlocked
-            loop = self.loop or asyncio.get_event_loop()
-            await loop.run_in_executor(None, flock, self.file_descriptor, LOCK_EX)
+        operation = LOCK_SH if self.shared else LOCK_EX
+        loop = self.loop or asyncio.get_event_loop()
+        deadline = None if self.timeout is None else loop.time() + self.timeout
+        delay = self.poll_interval
+        start = perf_counter()
+        while True:
+            try:
+                flock(self.file_descriptor, operation | LOCK_NB)
+                break
+            except BlockingIOError:
+                if deadline is None:
+                    await asyncio.sleep(delay)
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError(  # pylint: disable=raise-missing-from
+                            f'Could not lock file within {self.timeout} seconds')
+                    await asyncio.sleep(min(delay, remaining))
+                delay = min(delay * 2, self.max_poll_interval)
+        self.metrics.observe('flock_wait', perf_counter() - start)
         self._locked = True
         return True
 
@@ -0,0 +1,308 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `Index`, a secondary index over document fields, and
+`candidates`, which uses indexes to narrow down the documents a query has
+to be checked against.
+"""
+
+import functools
+from bisect import bisect_left, insort
+from typing import (
+    Any, Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Set, Tuple, Union,
+)
+from tinydb.queries import QueryInstance, QueryLike
+
+IndexSpec = Union[str, Sequence[str]]
+Key = Tuple[Any, ...]
+
+# how values of different types are ordered, values of different ranks are
+# never equal and only values of the same rank are compared
+_NUMBER, _STRING, _NULL, _OTHER, _MISSING = range(5)
+_MISSING_KEY = (_MISSING, 0)
+
+
+_RANKS = {bool: _NUMBER, int: _NUMBER, float: _NUMBER, str: _STRING, type(None): _NULL}
+
+
+def _rank(value: Any) -> Optional[int]:
+    """
+    Rank of a value a query compares with, `None` if it can't be indexed
+    """
+    rank = _RANKS.get(type(value))
+    # NaN isn't equal to anything, not even itself
+    return None if value != value else rank  # pylint: disable=comparison-with-itself
+
+
+def _component(value: Any) -> Tuple[int, Any]:
+    rank = _RANKS.get(type(value))
+    if rank is None or value != value:  # pylint: disable=comparison-with-itself
+        # lists, objects and NaN only ever match queries that can't use an index
+        return (_OTHER, 0)
+    return (rank, value)
+
+
+def normalize(spec: IndexSpec) -> Tuple[str, ...]:
+    """
+    Turn a field name or a sequence of them into the fields of an index
+    """
+    return (spec,) if isinstance(spec, str) else tuple(spec)
+
+
+class Index:
+    """
+    Index over one or more top-level fields of the documents of a table
+
+    A hash map answers equality on all fields, a sorted list answers
+    equality on leading fields combined with a range on the next one. They
+    are built from the documents returned by `table` once a query needs
+    them, and have to be told about every change afterwards.
+    """
+    def __init__(self, fields: Tuple[str, ...], table: Callable[[], Mapping[str, Mapping]]) -> None:
+        self.fields = fields
+        self._table = table
+        self._key_map: Optional[Dict[str, Key]] = None
+        self._hash_map: Optional[Dict[Key, Set[str]]] = None
+        self._sorted_entries: Optional[List[Tuple[Key, str]]] = None
+
+    def _key(self, doc: Mapping) -> Key:
+        return tuple(
+            _component(doc[field]) if field in doc else _MISSING_KEY for field in self.fields)
+
+    @property
+    def _keys(self) -> Dict[str, Key]:
+        if self._key_map is None:
+            table = self._table()
+            if len(self.fields) == 1:
+                field, = self.fields
+                self._key_map = {
+                    doc_id: (_component(doc[field]) if field in doc else _MISSING_KEY,)
+                    for doc_id, doc in table.items()}
+            else:
+                self._key_map = {doc_id: self._key(doc) for doc_id, doc in table.items()}
+        return self._key_map
+
+    @property
+    def _hash(self) -> Dict[Key, Set[str]]:
+        if self._hash_map is None:
+            self._hash_map = {}
+            for doc_id, key in self._keys.items():
+                ids = self._hash_map.get(key)
+                if ids is None:
+                    self._hash_map[key] = {doc_id}
+                else:
+                    ids.add(doc_id)
+        return self._hash_map
+
+    @property
+    def _sorted(self) -> List[Tuple[Key, str]]:
+        if self._sorted_entries is None:
+            self._sorted_entries = sorted((key, doc_id) for doc_id, key in self._keys.items())
+        return self._sorted_entries
+
+    def reset(self) -> None:
+        """
+        Forget everything, the index is built again once it's needed
+        """
+        self._key_map = self._hash_map = self._sorted_entries = None
+
+    def add(self, doc_id: str, doc: Mapping) -> None:
+        """
+        Index a new or updated document
+        """
+        if self._key_map is None:
+            return
+        self.discard(doc_id)
+        key = self._key(doc)
+        self._key_map[doc_id] = key
+        if self._hash_map is not None:
+            self._hash_map.setdefault(key, set()).add(doc_id)
+        if self._sorted_entries is not None:
+            insort(self._sorted_entries, (key, doc_id))
+
+    def discard(self, doc_id: str) -> None:
+        """
+        Remove a document from the index
+        """
+        if self._key_map is None:
+            return
+        key = self._key_map.pop(doc_id, None)
+        if key is None:
+            return
+        if self._hash_map is not None:
+            ids = self._hash_map[key]
+            ids.discard(doc_id)
+            if not ids:
+                del self._hash_map[key]
+        if self._sorted_entries is not None:
+            del self._sorted_entries[bisect_left(self._sorted_entries, (key, doc_id))]
+
+    def lookup(self, values: Sequence[Any]) -> Set[str]:
+        """
+        Documents whose fields equal `values`
+        """
+        return self._hash.get(tuple(_component(value) for value in values), set())
+
+    def range(
+        self,
+        prefix: Sequence[Any],
+        lower: Optional[Tuple[Any, bool]] = None,
+        upper: Optional[Tuple[Any, bool]] = None,
+        rank: Optional[int] = None,
+    ) -> Set[str]:
+        """
+        Documents whose leading fields equal `prefix` and whose next field
+        lies between `lower` and `upper`, each a `(value, inclusive)` pair
+        of the same `rank`
+        """
+        head = tuple(_component(value) for value in prefix)
+        if rank is None:
+            start, end = bisect_left(self._sorted, (head,)), self._end(head)
+        else:
+            start = self._bound(head, lower, (rank,), after=False)
+            end = self._bound(head, upper, (rank + 1,), after=True)
+        return {doc_id for _, doc_id in self._sorted[start:end]}
+
+    def _end(self, head: Key) -> int:
+        """
+        Position after all entries starting with `head`
+        """
+        if not head:
+            return len(self._sorted)
+        # entries with a greater last component of the same head come after
+        *rest, (rank, value) = head
+        return bisect_left(self._sorted, (tuple(rest) + ((rank, value, 1),),))
+
+    def _bound(
+        self, head: Key, bound: Optional[Tuple[Any, bool]], default: Key, after: bool
+    ) -> int:
+        if bound is None:
+            return bisect_left(self._sorted, (head + (default,),))
+        value, inclusive = bound
+        rank = _rank(value)
+        # (rank, value, 1) sorts after every (rank, value, ...) entry
+        probe = (rank, value, 1) if inclusive == after else (rank, value)
+        return bisect_left(self._sorted, (head + (probe,),))
+
+
+Condition = Tuple[str, str, Any]  # (field, operator, value)
+Plan = Tuple[int, Callable[[], Set[str]]]
+
+_COMPARISONS = ('==', '<', '<=', '>', '>=')
+
+
+def _condition(hashval: Tuple[Any, ...]) -> Optional[Condition]:
+    """
+    Turn the hash value of a comparison on a top-level field into a condition
+    """
+    if len(hashval) != 3 or hashval[0] not in _COMPARISONS:
+        return None
+    operator, path, value = hashval
+    if len(path) != 1 or not isinstance(path[0], str):
+        return None
+    rank = _rank(value)
+    if rank is None or (rank == _NULL and operator != '=='):
+        return None
+    return (path[0], operator, value)
+
+
+def _flatten_and(hashval: Tuple[Any, ...]) -> List[Tuple[Any, ...]]:
+    if hashval and hashval[0] == 'and':
+        return [part for item in hashval[1] for part in _flatten_and(item)]
+    return [hashval]
+
+
+def _plan(index: Index, conditions: List[Condition]) -> Optional[Plan]:
+    """
+    Use `index` for as many of `conditions` as possible, returning how
+    selective that is (higher is better) and how to find the matching
+    documents
+    """
+    prefix: List[Any] = []
+    for field in index.fields:
+        equal = [value for name, operator, value in conditions
+                 if name == field and operator == '==']
+        if not equal:
+            break
+        prefix.append(equal[0])
+    if len(prefix) == len(index.fields):
+        return (2 * len(prefix), functools.partial(index.lookup, prefix))
+    field = index.fields[len(prefix)]
+    ranges = [(operator, value) for name, operator, value in conditions
+              if name == field and operator != '==']
+    if not ranges:
+        if not prefix:
+            return None
+        return (2 * len(prefix), functools.partial(index.range, prefix))
+    # a lower and an upper bound of the same rank as the first range
+    rank = _rank(ranges[0][1])
+    lower = upper = None
+    for operator, value in ranges:
+        if _rank(value) != rank:
+            continue
+        if operator in ('>', '>=') and lower is None:
+            lower = (value, operator == '>=')
+        elif operator in ('<', '<=') and upper is None:
+            upper = (value, operator == '<=')
+    return (2 * len(prefix) + 1, functools.partial(index.range, prefix, lower, upper, rank))
+
+
+def _candidates(indexes: Sequence[Index], hashval: Tuple[Any, ...]) -> Optional[Set[str]]:
+    if not hashval:
+        return None
+    operator = hashval[0]
+    if operator == 'or':
+        result: Set[str] = set()
+        for part in hashval[1]:
+            found = _candidates(indexes, part)
+            if found is None:
+                return None
+            result |= found
+        return result
+    if operator == 'one_of' and len(hashval[1]) == 1 and isinstance(hashval[1][0], str):
+        field = hashval[1][0]
+        index = next((index for index in indexes if index.fields[0] == field), None)
+        if index is None or not all(_rank(value) is not None for value in hashval[2]):
+            return None
+        found = set()
+        for value in hashval[2]:
+            found |= index.range([value])
+        return found
+    parts = _flatten_and(hashval)
+    conditions = [condition for condition in map(_condition, parts) if condition is not None]
+    plans = [plan for plan in (_plan(index, conditions) for index in indexes) if plan is not None]
+    best = max(plans, key=lambda plan: plan[0])[1]() if plans else None
+    if len(parts) > 1:
+        # other parts of an `and` may narrow it down further
+        for part in parts:
+            if _condition(part) is None:
+                found = _candidates(indexes, part)
+                if found is not None:
+                    best = found if best is None else best & found
+    return best
+
+
+def candidates(indexes: Iterable[Index], cond: QueryLike) -> Optional[Set[str]]:
+    """
+    IDs of the documents which may match `cond`, `None` if the indexes
+    can't tell and all documents have to be checked
+    """
+    indexes = list(indexes)
+    if not indexes or not isinstance(cond, QueryInstance) or not cond.is_cacheable():
+        return None
+    hashval = cond._hash  # pylint: disable=protected-access
+    assert hashval is not None
+    return _candidates(indexes, hashval)
@@ -0,0 +1,147 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Contains the instrumentation hooks which `AIOTinyDB`, the storages and
+`AIOFileLock` report the duration of every phase of a session to.
+"""
+
+from bisect import bisect_left
+from typing import Any, Dict, List, Optional, Sequence
+
+# upper bounds in seconds, from 100µs to 10s
+DEFAULT_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Metrics:  # pylint: disable=too-few-public-methods
+    """
+    Receives the durations of the phases of database sessions, this base
+    class ignores them
+
+    The phases are:
+
+    - `lock_wait`: waiting for another session of the same `AIOTinyDB`
+    - `flock_wait`: waiting for another process to unlock the file
+    - `read`: reading (and decompressing) the file, with its size
+    - `parse`: parsing the contents, with their size
+    - `serialize`: serializing (and compressing) the documents, with the
+      size of the result
+    - `write`: writing the file, with the number of bytes written
+    - `session`: a whole session, from entering `async with` until its
+      changes are written back (or until it ends, if they're kept)
+
+    Override `observe` to pass them on to a monitoring system.
+    """
+    def observe(self, phase: str, duration: float, size: Optional[int] = None) -> None:
+        """
+        Record that `phase` took `duration` seconds, handling `size` bytes
+        if that applies
+        """
+
+
+# the default of all instrumented objects
+NULL_METRICS = Metrics()
+
+
+class Histogram:
+    """
+    Distribution of the durations of one phase
+    """
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        # the last count is for durations above the last bucket
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.bytes = 0
+
+    def add(self, duration: float, size: Optional[int] = None) -> None:
+        """
+        Record one duration
+        """
+        self.counts[bisect_left(self.buckets, duration)] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+        if size is not None:
+            self.bytes += size
+
+    def quantile(self, fraction: float) -> float:
+        """
+        Estimate the duration `fraction` of all durations are below, as the
+        upper bound of its bucket
+        """
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank and seen:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        """
+        Get the counts and totals, e.g. for exporting them as JSON
+        """
+        return {
+            'count': self.count,
+            'total': self.total,
+            'max': self.max,
+            'bytes': self.bytes,
+            'p50': self.quantile(0.5),
+            'p99': self.quantile(0.99),
+            'buckets': dict(zip([*map(str, self.buckets), '+inf'], self.counts)),
+        }
+
+
+class HistogramMetrics(Metrics):
+    """
+    Collects the durations of every phase in a `Histogram` in memory
+
+    # Example
+    ```
+    metrics = HistogramMetrics()
+    db = AIOTinyDB('test.json', metrics=metrics)
+    ...
+    print(metrics['session'].quantile(0.99), metrics.snapshot())
+    ```
+    """
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.buckets = tuple(buckets)
+        self.histograms: Dict[str, Histogram] = {}
+
+    def observe(self, phase: str, duration: float, size: Optional[int] = None) -> None:
+        if phase not in self.histograms:
+            self.histograms[phase] = Histogram(self.buckets)
+        self.histograms[phase].add(duration, size)
+
+    def __getitem__(self, phase: str) -> Histogram:
+        return self.histograms.get(phase) or Histogram(self.buckets)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the histograms of all phases observed so far as dictionaries
+        """
+        return {phase: histogram.as_dict() for phase, histogram in self.histograms.items()}
+
+    def reset(self) -> None:
+        """
+        Forget everything observed so far
+        """
+        self.histograms.clear()
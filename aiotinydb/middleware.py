@@ -20,12 +20,13 @@ async middlewares and implementations.
 """
 
 # pylint: disable=too-few-public-methods
+import asyncio
 from types import TracebackType
-from typing import NoReturn, Optional, Type, TypeVar
+from typing import Any, Dict, NoReturn, Optional, Type, TypeVar
 from tinydb.middlewares import Middleware
 from tinydb.middlewares import CachingMiddleware as VanillaCachingMiddleware
 from .exceptions import NotOverridableError
-from .storage import AIOStorage
+from .storage import AIOJSONStorage, AIOStorage
 
 AIOMiddlewareT = TypeVar('AIOMiddlewareT', bound='AIOMiddleware')
 
@@ -83,4 +84,186 @@ class CachingMiddleware(VanillaCachingMiddleware, AIOMiddlewareMixin):
     """
         Async-aware CachingMiddleware. For more info read
         docstring for `tinydb.middlewares.CachingMiddleware`
+
+        `flushes` and `skipped_flushes` count how often the cache was
+        written to the storage or had nothing to write.
     """
+    def __init__(self, storage_cls: Any) -> None:
+        super().__init__(storage_cls)
+        self.flushes: int = 0
+        self.skipped_flushes: int = 0
+
+    def flush(self) -> None:
+        if self._cache_modified_count > 0:
+            self.flushes += 1
+        else:
+            self.skipped_flushes += 1
+        super().flush()
+
+
+class AIOCachingMiddleware(AIOMiddleware):  # pylint: disable=too-many-instance-attributes
+    """
+    Caching middleware which writes in the background
+
+    Reads are answered from memory and writes only replace the cached
+    document tree. Once `max_pending` writes have piled up, or `max_delay`
+    seconds after the first of them, a background task hands a copy of the
+    tree to the storage and awaits its `aflush()`. `AIOJSONStorage` based
+    storages are created with `executor='thread'` unless another executor
+    is given, so serialization doesn't block the event loop.
+
+    The storage stays open, and its file locked, as long as there are
+    pending writes, even after `async with` ends. The next session continues
+    with the cached tree, and a session which is cancelled doesn't lose its
+    writes. `await flush()` (or `await db.flush()`) writes them right away,
+    `await db.aclose()` writes them and closes the storage.
+
+    Writes made by the `a*` methods in executor threads are scheduled on the
+    loop which entered the session.
+
+    `flushes` counts the writes handed to the storage.
+    """
+    background_flush = True
+
+    def __init__(self, storage_cls: Any, max_delay: float = 1.0, max_pending: int = 1000) -> None:
+        super().__init__(storage_cls)
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.cache: Optional[Dict[str, Dict[str, Any]]] = None
+        self.flushes: int = 0
+        self._pending: int = 0
+        self._active: bool = False
+        self._storage_open: bool = False
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional['asyncio.Future[None]'] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __call__(self, *args: Any, **kwargs: Any) -> 'AIOCachingMiddleware':
+        if isinstance(self._storage_cls, type) and issubclass(self._storage_cls, AIOJSONStorage):
+            kwargs.setdefault('executor', 'thread')
+        return super().__call__(*args, **kwargs)
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of writes not handed to the storage yet
+        """
+        return self._pending
+
+    def _get_lock(self) -> asyncio.Lock:
+        # locks are bound to the running loop on creation in older Pythons
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    async def __aenter__(self) -> 'AIOCachingMiddleware':
+        assert isinstance(self.storage, AIOStorage)
+        self._loop = asyncio.get_running_loop()
+        async with self._get_lock():
+            if not self._storage_open:
+                await self.storage.__aenter__()
+                self._storage_open = True
+                self.cache = None
+            self._active = True
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        async with self._get_lock():
+            self._active = False
+            if not self._pending:
+                await self._close_storage()
+
+    async def _close_storage(self) -> None:
+        assert isinstance(self.storage, AIOStorage)
+        if self._storage_open:
+            self._storage_open = False
+            self.cache = None
+            await self.storage.__aexit__(None, None, None)
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Get the cached document tree, reading it from the storage once
+        """
+        if self.cache is None:
+            self.cache = self.storage.read()
+        return self.cache
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Replace the cached document tree and schedule writing it
+        """
+        assert self._loop is not None
+        self.cache = data
+        self._pending += 1
+        # may be called in an executor thread
+        self._loop.call_soon_threadsafe(self._schedule)
+
+    def _schedule(self) -> None:
+        if self._flush_task is not None:
+            # reconsidered once the running flush is done
+            return
+        if self._pending >= self.max_pending:
+            self._start_flush()
+        elif self._timer is None:
+            assert self._loop is not None
+            self._timer = self._loop.call_later(self.max_delay, self._start_flush)
+
+    def _start_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._flush_task = asyncio.ensure_future(self._flush_in_background())
+
+    async def _flush_in_background(self) -> None:
+        try:
+            await self.flush()
+        finally:
+            self._flush_task = None
+            if self._pending:
+                # written while the storage was busy
+                self._schedule()
+
+    async def flush(self) -> None:
+        """
+        Hand the pending writes to the storage and wait until they're written
+        """
+        assert isinstance(self.storage, AIOStorage)
+        async with self._get_lock():
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._pending:
+                pending, self._pending = self._pending, 0
+                try:
+                    # sessions keep changing the cached tree while it's written;
+                    # tables copy the documents they change instead of changing
+                    # them in place, so copying the tree and tables is enough
+                    assert self.cache is not None
+                    self.storage.write({name: dict(table) for name, table in self.cache.items()})
+                    await self.storage.aflush()
+                except BaseException:
+                    self._pending += pending
+                    raise
+                self.flushes += 1
+            if not self._active and not self._pending:
+                await self._close_storage()
+
+    async def aflush(self) -> None:
+        """
+        Same as `flush`
+        """
+        await self.flush()
+
+    async def aclose(self) -> None:
+        """
+        Write the pending writes and close the storage
+        """
+        assert isinstance(self.storage, AIOStorage)
+        await self.flush()
+        await self.storage.aclose()
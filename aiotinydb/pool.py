@@ -0,0 +1,299 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `AIOProcessPool`, a pool of long-lived worker processes
+which keep parsed read-only copies of JSON databases to run CPU-bound queries
+on several cores.
+"""
+
+import asyncio
+import functools
+import os
+import types
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+from tinydb import Query, TinyDB
+from tinydb.queries import QueryInstance, QueryLike
+from tinydb.storages import Storage
+from tinydb.table import Document, Table
+from tinydb.utils import FrozenDict
+from .compression import MAGIC_SIZE, ContentReader, detect_codec
+from .exceptions import ReadonlyStorageError
+from .serializers import detect_serializer
+from .storage import StrOrBytesPath
+
+try:
+    # `fcntl.flock()` is only available on unix
+    from fcntl import flock, LOCK_SH
+    FILELOCK_SUPPORTED = True
+except ImportError:  # pragma: no cover
+    FILELOCK_SUPPORTED = False  # pragma: no cover
+
+QuerySpec = Tuple[Any, ...]
+Stamp = Tuple[int, int, int]
+
+
+def _thaw(value: Any) -> Any:
+    """
+    Undo `tinydb.utils.freeze` to get back JSON-like values
+    """
+    if isinstance(value, FrozenDict):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    if isinstance(value, frozenset):
+        return set(value)
+    return value
+
+
+def _encode(hashval: Tuple[Any, ...]) -> QuerySpec:
+    # pylint: disable=too-many-return-statements
+    if not hashval:
+        return ('noop',)
+    operator = hashval[0]
+    if operator in ('and', 'or'):
+        return (operator, tuple(_encode(part) for part in hashval[1]))
+    if operator == 'not':
+        return (operator, _encode(hashval[1]))
+    if operator in ('==', '!=', 'one_of'):
+        return (operator, hashval[1], _thaw(hashval[2]))
+    if operator in ('<', '<=', '>', '>=', 'exists', 'matches', 'search'):
+        return hashval
+    if operator == 'test':
+        return (operator, hashval[1], hashval[2], tuple(_thaw(arg) for arg in hashval[3]))
+    if operator in ('any', 'all'):
+        if isinstance(hashval[2], QueryInstance):
+            return (operator, hashval[1], 'query', encode_query(hashval[2]))
+        return (operator, hashval[1], 'items', _thaw(hashval[2]))
+    if operator == 'fragment':
+        return (operator, _thaw(hashval[1]))
+    raise ValueError(f'Unsupported query: {hashval!r}')
+
+
+def _uses_regex(spec: QuerySpec) -> bool:
+    operator = spec[0]
+    if operator in ('matches', 'search'):
+        return True
+    if operator in ('and', 'or'):
+        return any(_uses_regex(part) for part in spec[1])
+    if operator == 'not':
+        return _uses_regex(spec[1])
+    if operator in ('any', 'all') and spec[2] == 'query':
+        return _uses_regex(spec[3])
+    return False
+
+
+def _regex_flags(value: Any, seen: Set[int]) -> Iterator[int]:
+    """
+    Find the flags of the `matches()`/`search()` tests of a query, which
+    its hash value lacks, in the closures tinydb builds the query of
+    """
+    if id(value) in seen:
+        return
+    seen.add(id(value))
+    if isinstance(value, QueryInstance):
+        yield from _regex_flags(value._test, seen)  # pylint: disable=protected-access
+    elif isinstance(value, types.FunctionType) and value.__module__ == 'tinydb.queries':
+        cells = value.__closure__ or ()
+        variables = dict(zip(value.__code__.co_freevars, (cell.cell_contents for cell in cells)))
+        if 'regex' in variables and 'flags' in variables:
+            yield variables['flags']
+        for variable in variables.values():
+            yield from _regex_flags(variable, seen)
+
+
+def encode_query(cond: QueryLike) -> QuerySpec:
+    """
+    Turn a query into a picklable spec which `decode_query` turns back into
+    an equivalent query in another process.
+
+    `Query` objects can't be pickled, but cacheable ones describe themselves
+    in their hash value which is what gets sent. Regex flags passed to
+    `matches()`/`search()` are not part of it, so such queries raise
+    `ValueError`; use inline flags (`(?i)`) instead. Functions passed to
+    `test()` and plain callables used as conditions must be picklable (e.g.
+    module level functions).
+    """
+    if isinstance(cond, QueryInstance):
+        if not cond.is_cacheable():
+            raise ValueError(f'Query {cond!r} cannot be sent to a worker process')
+        hashval = cond._hash  # pylint: disable=protected-access
+        assert hashval is not None
+        spec = _encode(hashval)
+        if _uses_regex(spec):
+            flags = list(_regex_flags(cond, set()))
+            if not flags or any(flags):
+                raise ValueError(
+                    f'Regex flags of {cond!r} cannot be sent to a worker process, '
+                    'use inline flags (e.g. "(?i)") instead')
+        return spec
+    return ('callable', cond)
+
+
+def decode_query(spec: QuerySpec) -> QueryLike:
+    """
+    Rebuild a query from a spec made by `encode_query`
+    """
+    # pylint: disable=too-many-return-statements
+    operator = spec[0]
+    if operator == 'callable':
+        return spec[1]
+    if operator == 'noop':
+        return Query().noop()
+    if operator in ('and', 'or'):
+        parts = [decode_query(part) for part in spec[1]]
+        combine = QueryInstance.__and__ if operator == 'and' else QueryInstance.__or__
+        return functools.reduce(combine, parts)  # type: ignore[arg-type]
+    if operator == 'not':
+        return ~decode_query(spec[1])  # type: ignore[operator]
+    if operator == 'fragment':
+        return Query().fragment(spec[1])
+    query = functools.reduce(lambda query, part: query[part], spec[1], Query())
+    if operator == 'exists':
+        return query.exists()
+    if operator in ('matches', 'search'):
+        return getattr(query, operator)(spec[2])
+    if operator == 'test':
+        return query.test(spec[2], *spec[3])
+    if operator in ('any', 'all'):
+        cond = decode_query(spec[3]) if spec[2] == 'query' else spec[3]
+        return getattr(query, operator)(cond)
+    if operator == 'one_of':
+        return query.one_of(spec[2])
+    comparisons: Dict[str, Callable[[Any, Any], QueryInstance]] = {
+        '==': Query.__eq__, '!=': Query.__ne__,
+        '<': Query.__lt__, '<=': Query.__le__, '>': Query.__gt__, '>=': Query.__ge__,
+    }
+    return comparisons[operator](query, spec[2])
+
+
+class _SnapshotStorage(Storage):
+    """
+    Read-only storage around an already parsed database
+    """
+    def __init__(self, data: Optional[Dict[str, Dict[str, Any]]]) -> None:
+        self._data = data
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return self._data
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        raise ReadonlyStorageError('Worker snapshots are read-only')
+
+
+# Parsed databases of a worker process, keyed by filename
+_SNAPSHOTS: Dict[str, Tuple[Stamp, _SnapshotStorage, Dict[str, Table]]] = {}
+
+
+def _table(filename: str, name: str) -> Table:
+    """
+    Get a table of the worker's snapshot, re-reading the file if it changed
+    """
+    with open(filename, 'rb') as file:
+        if FILELOCK_SUPPORTED:
+            flock(file, LOCK_SH)
+        stat = os.fstat(file.fileno())
+        stamp = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if filename not in _SNAPSHOTS or _SNAPSHOTS[filename][0] != stamp:
+            fileno = file.fileno()
+            codec = detect_codec(os.pread(fileno, MAGIC_SIZE, 0))
+            contents = ContentReader(
+                lambda offset, size: os.pread(fileno, size, offset), codec).read_all()
+            data = detect_serializer(contents).loads(contents) if contents else None
+            storage = _SnapshotStorage(data)
+            _SNAPSHOTS[filename] = (stamp, storage, {})
+    _, storage, tables = _SNAPSHOTS[filename]
+    if name not in tables:
+        tables[name] = Table(storage, name)
+    return tables[name]
+
+
+def _execute(filename: str, name: str, method: str, spec: QuerySpec) -> Any:
+    return getattr(_table(filename, name), method)(decode_query(spec))
+
+
+class AIOProcessPool:
+    """
+    Pool of long-lived worker processes for CPU-bound read queries
+
+    Every worker parses a database file once and keeps it in memory; it is
+    only read again when the inode, modification time or size of the file
+    change. Queries see the last state written to the file, so don't await
+    them inside an `async with AIOTinyDB(...)` block for the same file: the
+    worker would wait for that block to release the file lock.
+
+    # Example
+    ```
+    pool = AIOProcessPool(max_workers=4)
+    db = AIOTinyDB('test.json', process_pool=pool)
+    found = await db.pooled().search(where('counter') == 1)
+    pool.shutdown()
+    ```
+    """
+    def __init__(self, max_workers: Optional[int] = None, **kwargs: Any) -> None:
+        self._executor = ProcessPoolExecutor(max_workers, **kwargs)
+
+    async def _execute(
+        self, filename: StrOrBytesPath, cond: QueryLike, table: str, method: str
+    ) -> Any:
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor, _execute, os.fsdecode(filename), table, method, encode_query(cond))
+
+    async def search(
+        self, filename: StrOrBytesPath, cond: QueryLike, table: str = TinyDB.default_table_name
+    ) -> List[Document]:
+        """Search for all documents of `table` in `filename` matching `cond`"""
+        return await self._execute(filename, cond, table, 'search')
+
+    async def count(
+        self, filename: StrOrBytesPath, cond: QueryLike, table: str = TinyDB.default_table_name
+    ) -> int:
+        """Count the documents of `table` in `filename` matching `cond`"""
+        return await self._execute(filename, cond, table, 'count')
+
+    async def contains(
+        self, filename: StrOrBytesPath, cond: QueryLike, table: str = TinyDB.default_table_name
+    ) -> bool:
+        """Check whether `table` in `filename` contains a document matching `cond`"""
+        return await self._execute(filename, cond, table, 'contains')
+
+    def shutdown(self, wait: bool = True) -> None:
+        """Stop the worker processes"""
+        self._executor.shutdown(wait)
+
+
+class AIOPooledTable:
+    """
+    A table of an `AIOTinyDB` queried through an `AIOProcessPool`,
+    returned by `AIOTinyDB.pooled()`
+    """
+    def __init__(self, pool: AIOProcessPool, filename: StrOrBytesPath, name: str) -> None:
+        self._pool = pool
+        self._filename = filename
+        self._name = name
+
+    async def search(self, cond: QueryLike) -> List[Document]:
+        """Search for all documents matching `cond` in a worker process"""
+        return await self._pool.search(self._filename, cond, self._name)
+
+    async def count(self, cond: QueryLike) -> int:
+        """Count the documents matching `cond` in a worker process"""
+        return await self._pool.count(self._filename, cond, self._name)
+
+    async def contains(self, cond: QueryLike) -> bool:
+        """Check for a document matching `cond` in a worker process"""
+        return await self._pool.contains(self._filename, cond, self._name)
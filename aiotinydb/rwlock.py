@@ -0,0 +1,113 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module provides `AIORWLock`, an asyncio lock which can be held by many
+readers or a single writer.
+"""
+
+import asyncio
+from collections import deque
+from typing import Callable, Deque
+
+
+class AIORWLock:
+    """asyncio reader/writer lock.
+
+    Any number of coroutines can hold the lock for reading at the same time,
+    a writer holds it alone. Waiting writers take precedence over new readers,
+    so a steady stream of readers can't starve them.
+
+    Like `asyncio.Lock.release`, releasing doesn't wait for anything, so it
+    can't be interrupted by a cancellation.
+
+    Usage:
+
+        lock = AIORWLock()
+        ...
+        await lock.acquire_read()
+        try:
+            ...
+        finally:
+            lock.release_read()
+    """
+    def __init__(self) -> None:
+        # in the order they came, like the waiters of `asyncio.Lock`
+        self._waiters: Deque['asyncio.Future[None]'] = deque()
+        self._readers: int = 0
+        self._writer: bool = False
+        self._waiting_writers: int = 0
+
+    @property
+    def readers(self) -> int:
+        """Number of coroutines holding the lock for reading."""
+        return self._readers
+
+    @property
+    def waiting_writers(self) -> int:
+        """Number of coroutines waiting to acquire the lock for writing."""
+        return self._waiting_writers
+
+    def locked(self) -> bool:
+        """Return True if the lock is held by a writer."""
+        return self._writer
+
+    def _wake_up(self) -> None:
+        """Let all waiting coroutines check again whether they may proceed."""
+        for waiter in self._waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    async def _wait_for(self, predicate: Callable[[], bool]) -> None:
+        loop = asyncio.get_running_loop()
+        while not predicate():
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                self._waiters.remove(waiter)
+
+    async def acquire_read(self) -> None:
+        """Acquire the lock for reading."""
+        await self._wait_for(lambda: not self._writer and not self._waiting_writers)
+        self._readers += 1
+
+    def release_read(self) -> None:
+        """Release a lock acquired for reading."""
+        if not self._readers:
+            raise RuntimeError('Lock is not acquired for reading.')
+        self._readers -= 1
+        self._wake_up()
+
+    async def acquire_write(self) -> None:
+        """Acquire the lock for writing."""
+        self._waiting_writers += 1
+        try:
+            await self._wait_for(lambda: not self._writer and not self._readers)
+        except BaseException:
+            self._waiting_writers -= 1
+            # readers may have been waiting for this writer only
+            self._wake_up()
+            raise
+        self._waiting_writers -= 1
+        self._writer = True
+
+    def release_write(self) -> None:
+        """Release a lock acquired for writing."""
+        if not self._writer:
+            raise RuntimeError('Lock is not acquired for writing.')
+        self._writer = False
+        self._wake_up()
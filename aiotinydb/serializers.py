@@ -0,0 +1,156 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Contains the serializers `AIOJSONStorage` uses to turn the document tree
+into bytes and back.
+"""
+
+import json
+from typing import Any, Dict, Optional, Union
+
+try:
+    import orjson
+    ORJSON_SUPPORTED = True
+except ImportError:  # pragma: no cover
+    ORJSON_SUPPORTED = False  # pragma: no cover
+
+try:
+    import msgpack
+    MSGPACK_SUPPORTED = True
+except ImportError:  # pragma: no cover
+    MSGPACK_SUPPORTED = False  # pragma: no cover
+
+Tables = Dict[str, Dict[str, Any]]
+# a decompressed file is read into a bytearray, which isn't copied again
+Contents = Union[bytes, bytearray]
+
+# first bytes of a MessagePack map: fixmap, map 16 and map 32
+_MSGPACK_MAP_PREFIXES = frozenset(range(0x80, 0x90)) | {0xde, 0xdf}
+
+
+class Serializer:
+    """
+    Base class of serializers
+
+    Keyword arguments the storage was created with are passed on to
+    `dumps()`.
+    """
+    name = 'base'
+
+    def dumps(self, data: Any, **kwargs: Any) -> bytes:
+        """
+        Serialize the document tree
+        """
+        raise NotImplementedError('To be overridden!')
+
+    def loads(self, contents: Contents) -> Tables:
+        """
+        Parse the document tree
+        """
+        raise NotImplementedError('To be overridden!')
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}()'
+
+
+class JSONSerializer(Serializer):
+    """
+    Serializer using the standard library `json` module, keyword arguments
+    are passed on to `json.dumps`
+    """
+    name = 'json'
+
+    def dumps(self, data: Any, **kwargs: Any) -> bytes:
+        return json.dumps(data, **kwargs).encode('utf-8')
+
+    def loads(self, contents: Contents) -> Tables:
+        return json.loads(contents)
+
+
+class ORJSONSerializer(Serializer):
+    """
+    Serializer using `orjson`, which is several times faster than `json`
+
+    It is stricter than `json` though: `NaN` and `Infinity` can't be read,
+    integers beyond 64 bits are read as floats and can't be written, and
+    keys have to be strings. Only `indent=2` and `sort_keys=True` of the
+    `json.dumps` keyword arguments are supported.
+    """
+    name = 'orjson'
+
+    def __init__(self) -> None:
+        if not ORJSON_SUPPORTED:
+            raise ValueError('ORJSONSerializer requires the orjson package')
+
+    @staticmethod
+    def supports(kwargs: Dict[str, Any]) -> bool:
+        """
+        Check whether `kwargs` meant for `json.dumps` can be translated
+        """
+        return kwargs.keys() <= {'indent', 'sort_keys'} and kwargs.get('indent') in (None, 2)
+
+    def dumps(self, data: Any, **kwargs: Any) -> bytes:
+        if not self.supports(kwargs):
+            raise TypeError(f'Unsupported arguments for orjson: {kwargs!r}')
+        option = 0
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        if kwargs.get('sort_keys'):
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(data, option=option)
+
+    def loads(self, contents: Contents) -> Tables:
+        return orjson.loads(contents)
+
+
+class MsgPackSerializer(Serializer):
+    """
+    Serializer for the compact binary MessagePack format using `msgpack`,
+    keyword arguments are passed on to `msgpack.packb`
+    """
+    name = 'msgpack'
+
+    def __init__(self) -> None:
+        if not MSGPACK_SUPPORTED:
+            raise ValueError('MsgPackSerializer requires the msgpack package')
+
+    def dumps(self, data: Any, **kwargs: Any) -> bytes:
+        return msgpack.packb(data, **kwargs)
+
+    def loads(self, contents: Contents) -> Tables:
+        return msgpack.unpackb(contents)
+
+
+def default_serializer() -> Serializer:
+    """
+    Get the serializer used unless another one is passed, `json`, which reads
+    and writes everything the standard library does
+    """
+    return JSONSerializer()
+
+
+def detect_serializer(contents: Contents, serializer: Optional[Serializer] = None) -> Serializer:
+    """
+    Get a serializer for the format of `contents`, `serializer` if it's
+    given and of that format
+    """
+    if contents[:1] and contents[0] in _MSGPACK_MAP_PREFIXES:
+        if serializer is not None and serializer.name == 'msgpack':
+            return serializer
+        return MsgPackSerializer()
+    if serializer is not None and serializer.name != 'msgpack':
+        return serializer
+    return default_serializer()
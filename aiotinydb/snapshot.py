@@ -0,0 +1,424 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `AIOSnapshotStorage`, which lets many processes read
+one database from a shared memory-mapped snapshot instead of each parsing
+and holding its own copy.
+"""
+
+import functools
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from collections.abc import ItemsView
+from time import perf_counter
+from typing import (
+    Any, AsyncIterator, BinaryIO, Callable, Dict, Iterator, List, Mapping, Optional, Sequence,
+    Tuple, cast,
+)
+import aiofiles
+from .exceptions import ReadonlyStorageError
+from .serializers import Serializer, default_serializer
+from .storage import (
+    FILELOCK_SUPPORTED, AIOImmutableJSONStorage, StrOrBytesPath, Tables, _in_thread,
+)
+
+if FILELOCK_SUPPORTED:
+    from .filelock import AIOFileLock
+
+Header = Dict[str, Any]
+
+# magic, position and length of the JSON header
+_PREAMBLE = struct.Struct('<8sQQ')
+_MAGIC = b'AIOTSNP1'
+_INT64 = struct.Struct('<q')
+_OFFSETS = struct.Struct('<QQ')
+
+
+def _int_id(doc_id: str) -> Optional[int]:
+    """
+    The integer a document ID stands for, `None` if it isn't one
+    """
+    if doc_id.isdigit() and str(int(doc_id)) == doc_id:
+        return int(doc_id)
+    return None
+
+
+def _pack(typecode: str, values: Sequence[int]) -> bytes:
+    packed = array(typecode, values)
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def _align(file: BinaryIO) -> None:
+    file.write(b'\0' * (-file.tell() % 8))
+
+
+def _write_table(file: BinaryIO, table: Mapping[str, Any], dumps: Callable[[Any], bytes]) -> Header:
+    """
+    Write the IDs, document offsets and encoded documents of `table`,
+    return where to find them
+    """
+    entry: Header = {'count': len(table), 'ids': None, 'keys': None}
+    ids = [_int_id(doc_id) for doc_id in table]
+    _align(file)
+    if all(doc_id is not None for doc_id in ids) and all(
+            previous < following for previous, following in zip(ids, ids[1:])):  # type: ignore
+        # ascending integers, looked up by binary search
+        entry['ids'] = file.tell()
+        file.write(_pack('q', cast(List[int], ids)))
+    else:
+        keys = json.dumps(list(table)).encode('utf-8')
+        entry['keys'] = [file.tell(), file.tell() + len(keys)]
+        file.write(keys)
+        _align(file)
+    entry['offsets'] = file.tell()
+    # the offsets are only known once the documents are written
+    position = entry['offsets'] + 8 * (len(table) + 1)
+    offsets = [position]
+    file.seek(position)
+    for doc in table.values():
+        encoded = dumps(doc)
+        file.write(encoded)
+        position += len(encoded)
+        offsets.append(position)
+    file.seek(entry['offsets'])
+    file.write(_pack('Q', offsets))
+    file.seek(position)
+    return entry
+
+
+def write_snapshot(  # pylint: disable=too-many-arguments,too-many-locals
+    filename: str,
+    data: Optional[Tables],
+    generation: int,
+    stamp: Sequence[int],
+    serializer: Optional[Serializer] = None,
+    **kwargs: Any
+) -> int:
+    """
+    Atomically replace the snapshot `filename` with one of `data`, return
+    its size
+
+    Documents are encoded with `serializer` (JSON by default), passing it
+    `kwargs`.
+    """
+    serializer = serializer or default_serializer()
+
+    def dumps(value: Any) -> bytes:
+        return serializer.dumps(value, **kwargs)
+
+    dirname, basename = os.path.split(filename)
+    handle, tmp_path = tempfile.mkstemp(prefix=f'.{basename}.', suffix='.tmp', dir=dirname or None)
+    try:
+        with os.fdopen(handle, 'wb') as file:
+            file.write(_PREAMBLE.pack(_MAGIC, 0, 0))
+            tables = {name: _write_table(file, table, dumps)
+                      for name, table in (data or {}).items()}
+            header = json.dumps(
+                {'generation': generation, 'stamp': list(stamp), 'serializer': serializer.name,
+                 'tables': tables}).encode('utf-8')
+            position = file.tell()
+            file.write(header)
+            size = file.tell()
+            file.seek(0)
+            file.write(_PREAMBLE.pack(_MAGIC, position, len(header)))
+        os.replace(tmp_path, filename)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return size
+
+
+def map_snapshot(filename: str) -> Optional[Tuple[mmap.mmap, Header]]:
+    """
+    Memory-map the snapshot `filename` and read its header, `None` if there
+    is no valid snapshot
+    """
+    try:
+        with open(filename, 'rb') as file:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # missing or empty
+        return None
+    try:
+        magic, position, length = _PREAMBLE.unpack_from(buffer)
+        if magic != _MAGIC:
+            raise ValueError('Not a snapshot')
+        return buffer, json.loads(buffer[position:position + length])
+    except (struct.error, ValueError):
+        buffer.close()
+        return None
+
+
+class _Int64Array(Sequence[int]):
+    """
+    View of an array of integers in the snapshot, for `bisect`
+    """
+    def __init__(self, buffer: mmap.mmap, position: int, count: int) -> None:
+        self._buffer = buffer
+        self.position = position
+        self._count = count
+
+    def __getitem__(self, index: Any) -> Any:
+        return _INT64.unpack_from(self._buffer, self.position + 8 * index)[0]
+
+    def __len__(self) -> int:
+        return self._count
+
+
+class _SnapshotItems(ItemsView[str, Any]):
+    def __init__(self, table: '_SnapshotTable') -> None:
+        super().__init__(table)
+        self._table = table
+
+    def __iter__(self) -> Iterator[Tuple[str, Any]]:
+        # in order instead of looking every ID up again
+        return self._table.iter_items()
+
+
+class _SnapshotTable(Mapping[str, Any]):
+    """
+    Table of a snapshot, each document decoded when it's accessed
+    """
+    def __init__(self, buffer: mmap.mmap, entry: Header, loads: Callable[[bytes], Any]) -> None:
+        self._buffer = buffer
+        self._count: int = entry['count']
+        self._offsets: int = entry['offsets']
+        self._loads = loads
+        self._ids = None if entry['ids'] is None else _Int64Array(buffer, entry['ids'], self._count)
+        self._key_range: Optional[List[int]] = entry['keys']
+        self._keys: Optional[Dict[str, int]] = None
+
+    def _index(self, doc_id: str) -> Optional[int]:
+        if self._ids is not None:
+            key = _int_id(doc_id)
+            if key is None:
+                return None
+            index = bisect_left(self._ids, key)
+            return index if index < self._count and self._ids[index] == key else None
+        if self._keys is None:
+            assert self._key_range is not None
+            start, end = self._key_range
+            keys = json.loads(self._buffer[start:end])
+            self._keys = {key: index for index, key in enumerate(keys)}
+        return self._keys.get(doc_id)
+
+    def _document(self, index: int) -> Any:
+        start, end = _OFFSETS.unpack_from(self._buffer, self._offsets + 8 * index)
+        return self._loads(self._buffer[start:end])
+
+    def __getitem__(self, doc_id: str) -> Any:
+        index = self._index(doc_id)
+        if index is None:
+            raise KeyError(doc_id)
+        return self._document(index)
+
+    def __contains__(self, doc_id: object) -> bool:
+        return isinstance(doc_id, str) and self._index(doc_id) is not None
+
+    def __iter__(self) -> Iterator[str]:
+        if self._ids is not None:
+            start = self._ids.position
+            for (doc_id,) in _INT64.iter_unpack(self._buffer[start:start + 8 * self._count]):
+                yield str(doc_id)
+        else:
+            assert self._key_range is not None
+            start, end = self._key_range
+            yield from json.loads(self._buffer[start:end])
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self) -> _SnapshotItems:
+        return _SnapshotItems(self)
+
+    def iter_items(self) -> Iterator[Tuple[str, Any]]:
+        """
+        Iterate over the IDs and documents in the order they were written
+        """
+        buffer, loads = self._buffer, self._loads
+        offsets = array('Q', buffer[self._offsets:self._offsets + 8 * (self._count + 1)])
+        if sys.byteorder == 'big':
+            offsets.byteswap()
+        for index, doc_id in enumerate(self):
+            yield doc_id, loads(buffer[offsets[index]:offsets[index + 1]])
+
+
+class _SnapshotTables(Mapping[str, Mapping[str, Any]]):
+    """
+    Tables of a memory-mapped snapshot
+    """
+    def __init__(self, buffer: mmap.mmap, header: Header, serializer: Serializer) -> None:
+        loads = serializer.loads
+        self._tables = {name: _SnapshotTable(buffer, entry, loads)
+                        for name, entry in header['tables'].items()}
+
+    def __getitem__(self, name: str) -> Mapping[str, Any]:
+        return self._tables[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._tables)
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+    def __setitem__(self, name: str, table: Any) -> None:
+        # tinydb changes the tables before passing them to `write()`
+        raise ReadonlyStorageError('Storage is opened read-only')
+
+    def __delitem__(self, name: str) -> None:
+        raise ReadonlyStorageError('Storage is opened read-only')
+
+
+class AIOSnapshotStorage(AIOImmutableJSONStorage):
+    """
+    Asyncronous readonly storage for AIOTinyDB reading a shared snapshot
+
+    Instead of keeping the parsed documents, the first process to open the
+    database writes a snapshot of it to `snapshot_file` (by default
+    `<filename>.snap`): every document encoded on its own, plus an index of
+    where each one starts. Then all processes memory-map that file, which
+    the OS keeps in its page cache only once, and decode a document only
+    when it's accessed. The memory each process needs doesn't grow with the
+    size of the database, only with the documents it works on at a time. A
+    snapshot on a tmpfs such as `/dev/shm` never touches a disk.
+
+    The snapshot records which version of the database file it was made
+    of. The first session to find the database file changed builds a new
+    snapshot, with `generation` increased by one, while holding a lock on
+    `<snapshot_file>.lock` so that other processes wait for it instead of
+    building their own. The file is replaced atomically: sessions still
+    reading the old one keep their mapping until they end.
+
+    Lookups by document ID use binary search if the IDs are ascending
+    integers (as TinyDB assigns them). Queries decode every document they
+    check, so they're slower than on documents parsed ahead of time.
+
+    Documents are encoded with `serializer` if one is given, JSON otherwise,
+    and the same keyword arguments as the database file. A snapshot encoded
+    with another serializer is built again.
+
+    All other arguments are the same as for `AIOImmutableJSONStorage`,
+    including `persistent`, which keeps the mapping between sessions.
+    """
+    def __init__(
+        self,
+        filename: StrOrBytesPath,
+        *args: Any,
+        snapshot_file: Optional[StrOrBytesPath] = None,
+        **kwargs: Any
+    ) -> None:
+        if kwargs.get('streaming'):
+            raise ValueError('AIOSnapshotStorage decodes documents lazily already')
+        super().__init__(filename, *args, **kwargs)
+        self._snapshot_filename = os.fsdecode(
+            snapshot_file if snapshot_file is not None else os.fsdecode(filename) + '.snap')
+        # not the one detected from the database file, all processes agree on it
+        self._snapshot_serializer = self._fixed_serializer or default_serializer()
+        self._mmap: Optional[mmap.mmap] = None
+        self._snapshot_generation: int = 0
+        self.snapshots_built: int = 0
+
+    @property
+    def snapshot_filename(self) -> str:
+        """
+        Path of the snapshot file
+        """
+        return self._snapshot_filename
+
+    @property
+    def generation(self) -> int:
+        """
+        Generation of the snapshot, the same in every process reading it
+        """
+        return self._snapshot_generation
+
+    async def _read_data(self) -> Optional[Tables]:
+        self._release_snapshot()
+        stamp = list(self._current_stamp())
+        mapped = await _in_thread(map_snapshot, self._snapshot_filename)
+        if mapped is None or not self._is_current(mapped[1], stamp):
+            if mapped is not None:
+                mapped[0].close()
+            mapped = await self._publish(stamp)
+        self._mmap, header = mapped
+        self._snapshot_generation = header['generation']
+        # tinydb only looks tables and documents up by name, mappings are as good as dicts
+        return cast(Tables, _SnapshotTables(self._mmap, header, self._snapshot_serializer))
+
+    def _is_current(self, header: Header, stamp: List[int]) -> bool:
+        """
+        Check whether a snapshot was made of the current database file, in
+        the format this storage reads
+        """
+        return header['stamp'] == stamp and \
+            header.get('serializer') == self._snapshot_serializer.name
+
+    async def _publish(self, stamp: List[int]) -> Tuple[mmap.mmap, Header]:
+        """
+        Build a snapshot of the locked database file, unless another
+        process did that while this one waited for the lock
+        """
+        lock_file = await aiofiles.open(self._snapshot_filename + '.lock', 'ab')
+        lock = None
+        try:
+            if FILELOCK_SUPPORTED:
+                lock = AIOFileLock(lock_file, timeout=self._lock_timeout, metrics=self._metrics)
+                await lock.acquire()
+            mapped = await _in_thread(map_snapshot, self._snapshot_filename)
+            if mapped is not None and self._is_current(mapped[1], stamp):
+                return mapped
+            generation = 0
+            if mapped is not None:
+                generation = mapped[1]['generation']
+                mapped[0].close()
+            data = await super()._read_data()
+            start = perf_counter()
+            size = await _in_thread(functools.partial(
+                write_snapshot, self._snapshot_filename, data, generation + 1, stamp,
+                self._snapshot_serializer, **self.kwargs))
+            self._metrics.observe('write', perf_counter() - start, size)
+            self.snapshots_built += 1
+        finally:
+            if lock is not None and lock.locked():
+                lock.release()
+            await lock_file.close()
+        mapped = await _in_thread(map_snapshot, self._snapshot_filename)
+        if mapped is None:
+            raise ValueError(f'Snapshot {self._snapshot_filename} can not be read')
+        return mapped
+
+    async def aiter_table(self, name: str) -> AsyncIterator[Tuple[str, Any]]:
+        table = (self.read() or {}).get(name) or {}
+        # decoded one at a time, not all at once
+        for item in table.items():
+            yield item
+
+    def _release_snapshot(self) -> None:
+        buffer, self._mmap = self._mmap, None
+        if buffer is not None:
+            buffer.close()
+
+    async def _close(self) -> None:
+        await super()._close()
+        self._release_snapshot()
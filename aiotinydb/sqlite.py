@@ -0,0 +1,415 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `AIOSQLiteStorage`, which keeps every document in its
+own row of an SQLite database so that a session only writes what changed,
+and helpers to migrate databases between storages.
+"""
+
+# pylint: disable=super-init-not-called,too-many-instance-attributes
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from types import TracebackType
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, TypeVar
+from urllib.parse import quote
+from .exceptions import ReadonlyStorageError
+from .metrics import NULL_METRICS, Metrics
+from .serializers import Serializer, default_serializer
+from .storage import (
+    AIOImmutableJSONStorage, AIOJSONStorage, AIOStorage, StrOrBytesPath, _deep_copy)
+
+T = TypeVar('T')  # pylint: disable=invalid-name
+Tables = Dict[str, Dict[str, Any]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tinydb_tables (name TEXT PRIMARY KEY) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS tinydb_documents (
+    tbl TEXT NOT NULL,
+    doc_id NOT NULL,
+    doc TEXT NOT NULL,
+    PRIMARY KEY (tbl, doc_id)
+) WITHOUT ROWID;
+"""
+# the longest busy timeout SQLite takes, in seconds
+_NO_TIMEOUT = (2 ** 31 - 1) / 1000
+_SYNCHRONOUS = {'none': 'NORMAL', 'file': 'FULL', 'full': 'FULL'}
+# every table as one JSON object, so it's parsed with a single `loads()`
+_LOAD = """
+SELECT tbl, '{' || group_concat(json_quote(CAST(doc_id AS TEXT)) || ':' || doc, ',') || '}'
+FROM tinydb_documents GROUP BY tbl
+"""
+
+
+def _key(doc_id: str) -> Any:
+    """
+    Column value of a document ID: integer IDs are stored as integers, so
+    the primary key keeps them in numeric order
+    """
+    if doc_id.isdigit() and str(int(doc_id)) == doc_id:
+        return int(doc_id)
+    return doc_id
+
+
+class AIOSQLiteStorage(AIOStorage):
+    """
+    Asyncronous SQLite storage for AIOTinyDB, one row per document
+
+    Documents are stored as JSON in rows keyed by their table and ID, so
+    the file can also be queried with SQLite's JSON functions. `__aenter__`
+    starts a transaction and loads all documents, `__aexit__` writes only
+    the rows of documents which were inserted, changed or removed and
+    commits. To find those, a copy of the documents as last read or
+    written is kept, and the tables TinyDB passes to `write()` as new
+    objects are compared against it. `rows_written` and `rows_deleted`
+    count the changed rows, `flushes` and `skipped_flushes` the sessions
+    which did and didn't write.
+
+    The database is opened in WAL mode, so readers don't wait for a writer
+    and see the last committed state. Writer sessions take SQLite's write
+    lock for their whole duration (`BEGIN IMMEDIATE`), `access_mode='r'`
+    opens the file read-only. `lock_timeout` limits how many seconds to
+    wait for another writer before `asyncio.TimeoutError` is raised. `fsync`
+    is mapped to SQLite's `synchronous` setting: `'none'` (default) syncs at
+    checkpoints only, `'file'` and `'full'` on every commit.
+
+    All calls to `sqlite3` run in a dedicated thread. With `persistent=True`
+    the connection and the loaded documents are kept between sessions; they
+    are only loaded again if another connection committed in the meantime.
+    Changes are committed at the end of every session either way. The
+    thread is kept between sessions too, also without `persistent`, until
+    `await db.aclose()` stops it.
+
+    Documents are serialized by `serializer`, `JSONSerializer` unless e.g.
+    `ORJSONSerializer()` is passed. All other keyword arguments are passed on
+    to its `dumps()` (e.g. `json.dumps`).
+    """
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        filename: StrOrBytesPath,
+        *,
+        access_mode: str = 'r+',
+        lock_timeout: Optional[float] = None,
+        fsync: str = 'none',
+        persistent: bool = False,
+        serializer: Optional[Serializer] = None,
+        metrics: Metrics = NULL_METRICS,
+        **kwargs: Any
+    ) -> None:
+        if access_mode not in ('r', 'r+'):
+            raise ValueError(f'Unknown access mode: {access_mode!r}')
+        if serializer is not None and serializer.name == 'msgpack':
+            raise ValueError('AIOSQLiteStorage stores documents as JSON')
+        if fsync not in _SYNCHRONOUS:
+            raise ValueError(f'Unknown fsync policy: {fsync!r}')
+        self.kwargs = kwargs
+        self._filename = os.fsdecode(filename)
+        self._readonly = access_mode == 'r'
+        self._lock_timeout = lock_timeout
+        self._fsync = fsync
+        self._persistent = persistent
+        self._metrics = metrics
+        self._serializer = serializer or default_serializer()
+        self._thread: Optional[ThreadPoolExecutor] = None
+        self._connection: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._data: Optional[Tables] = None
+        # copy of the documents as stored, to compare against
+        self._snapshot: Tables = {}
+        # the table objects last read or written
+        self._tables: Tables = {}
+        self._changed: Set[str] = set()
+        self._dropped: Set[str] = set()
+        self._generation: int = 0
+        # observed in the thread, reported on the event loop
+        self._observations: List[Tuple[str, float, Optional[int]]] = []
+        self._opened: bool = False
+        self.flushes: int = 0
+        self.skipped_flushes: int = 0
+        self.rows_written: int = 0
+        self.rows_deleted: int = 0
+
+    @property
+    def filename(self) -> str:
+        """
+        Path of the database file
+        """
+        return self._filename
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def _executor(self) -> ThreadPoolExecutor:
+        """
+        Get the thread owning the connection, started again after `aclose()`
+        """
+        if self._thread is None:
+            self._thread = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='aiotinydb-sqlite')
+        return self._thread
+
+    async def _call(self, func: Callable[..., T], *args: Any) -> T:
+        """
+        Run `func` in the thread owning the connection
+        """
+        loop = asyncio.get_event_loop()
+        try:
+            return await loop.run_in_executor(self._executor(), func, *args)
+        finally:
+            observations, self._observations = self._observations, []
+            for phase, duration, size in observations:
+                self._metrics.observe(phase, duration, size)
+
+    def _observe(self, phase: str, start: float, size: Optional[int] = None) -> None:
+        self._observations.append((phase, perf_counter() - start, size))
+
+    def _connect(self) -> sqlite3.Connection:
+        timeout = _NO_TIMEOUT if self._lock_timeout is None else self._lock_timeout
+        if self._readonly:
+            connection = sqlite3.connect(
+                f'file:{quote(self._filename)}?mode=ro', uri=True, timeout=timeout,
+                isolation_level=None)
+        else:
+            dirname = os.path.dirname(self._filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+            connection = sqlite3.connect(self._filename, timeout=timeout, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(f'PRAGMA synchronous={_SYNCHRONOUS[self._fsync]}')
+            connection.executescript(_SCHEMA)
+        return connection
+
+    def _begin(self) -> None:
+        """
+        Start the transaction of a session and load the documents, unless
+        the ones kept from the last session are still current
+        """
+        if self._connection is None:
+            self._connection = self._connect()
+        connection = self._connection
+        start = perf_counter()
+        try:
+            connection.execute('BEGIN' if self._readonly else 'BEGIN IMMEDIATE')
+        except sqlite3.OperationalError as error:
+            if 'locked' not in str(error):
+                raise
+            raise asyncio.TimeoutError(
+                f'Could not lock database within {self._lock_timeout} seconds') from error
+        self._observe('flock_wait', start)
+        try:
+            # the read snapshot of a deferred transaction starts with this
+            exists = connection.execute(
+                "SELECT count(*) FROM sqlite_master WHERE name = 'tinydb_documents'").fetchone()[0]
+            version = connection.execute('PRAGMA data_version').fetchone()[0]
+            if self._data is None or version != self._data_version:
+                self._load(connection if exists else None)
+                self._data_version = version
+                self._generation += 1
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _load(self, connection: Optional[sqlite3.Connection]) -> None:
+        start = perf_counter()
+        data: Tables = {}
+        size = 0
+        if connection is not None:
+            for (name,) in connection.execute('SELECT name FROM tinydb_tables'):
+                data[name] = {}
+            loads = self._serializer.loads
+            for name, table in connection.execute(_LOAD):
+                data[name] = loads(table)
+                size += len(table)
+        self._data = data
+        self._snapshot = _deep_copy(data)
+        self._tables = dict(data)
+        self._observe('read', start, size)
+
+    def _diff(self, name: str, table: Dict[str, Any], upserts: List[Tuple[str, Any, str]],
+              deletes: List[Tuple[str, Any]]) -> Dict[str, Any]:
+        """
+        Add the rows to write and delete for `table` to `upserts` and
+        `deletes`, return the new copy of its documents
+        """
+        before = self._snapshot.get(name, {})
+        modified = {doc_id: doc for doc_id, doc in table.items() if before.get(doc_id) != doc}
+        dumps = self._serializer.dumps
+        upserts.extend((name, _key(doc_id), dumps(doc, **self.kwargs).decode('utf-8'))
+                       for doc_id, doc in modified.items())
+        removed = before.keys() - table.keys()
+        deletes.extend((name, _key(doc_id)) for doc_id in removed)
+        after = {doc_id: doc for doc_id, doc in before.items() if doc_id not in removed}
+        after.update(_deep_copy(modified))
+        return after
+
+    def _commit(self, data: Tables, changed: Set[str], dropped: Set[str]) -> None:
+        """
+        Write the rows of changed documents and commit
+        """
+        assert self._connection is not None
+        connection = self._connection
+        try:
+            start = perf_counter()
+            snapshot: Tables = {}
+            upserts: List[Tuple[str, Any, str]] = []
+            deletes: List[Tuple[str, Any]] = []
+            for name in changed:
+                snapshot[name] = self._diff(name, data[name], upserts, deletes)
+            size = sum(len(row[2]) for row in upserts)
+            self._observe('serialize', start, size)
+            start = perf_counter()
+            connection.executemany(
+                'DELETE FROM tinydb_documents WHERE tbl = ?', [(name,) for name in dropped])
+            connection.executemany(
+                'DELETE FROM tinydb_tables WHERE name = ?', [(name,) for name in dropped])
+            connection.executemany(
+                'INSERT OR IGNORE INTO tinydb_tables VALUES (?)',
+                [(name,) for name in changed - self._snapshot.keys()])
+            connection.executemany(
+                'DELETE FROM tinydb_documents WHERE tbl = ? AND doc_id = ?', deletes)
+            connection.executemany(
+                'INSERT OR REPLACE INTO tinydb_documents VALUES (?, ?, ?)', upserts)
+            connection.execute('COMMIT')
+            self._observe('write', start, size)
+        except BaseException:
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+            # what's kept doesn't match the database anymore
+            self._data = None
+            raise
+        for name in dropped:
+            self._snapshot.pop(name, None)
+        self._snapshot.update(snapshot)
+        self.rows_written += len(upserts)
+        self.rows_deleted += len(deletes)
+
+    def _end(self) -> None:
+        """
+        End the transaction of a session which didn't write
+        """
+        assert self._connection is not None
+        if self._connection.in_transaction:
+            self._connection.execute('COMMIT')
+
+    def _disconnect(self) -> None:
+        if self._connection is not None:
+            if self._connection.in_transaction:
+                self._connection.execute('ROLLBACK')
+            self._connection.close()
+            self._connection = None
+        self._data = None
+        self._snapshot = {}
+        self._tables = {}
+
+    async def __aenter__(self) -> 'AIOSQLiteStorage':
+        future = asyncio.ensure_future(self._call(self._begin))
+        try:
+            await asyncio.shield(future)
+        except asyncio.CancelledError:
+            # the thread goes on, end the transaction it may have started
+            future.add_done_callback(lambda _: self._executor().submit(self._disconnect))
+            raise
+        self._changed = set()
+        self._dropped = set()
+        self._opened = True
+        return self
+
+    def read(self) -> Optional[Tables]:
+        assert self._opened
+        return self._data
+
+    def write(self, data: Tables) -> None:
+        assert self._opened
+        if self._readonly:
+            raise ReadonlyStorageError('Storage is opened read-only')
+        for name in self._tables.keys() - data.keys():
+            self._dropped.add(name)
+            self._changed.discard(name)
+        for name, table in data.items():
+            # tinydb replaces the table it changes with a new dictionary
+            if self._tables.get(name) is not table:
+                self._changed.add(name)
+                self._dropped.discard(name)
+        self._data = data
+        self._tables = dict(data)
+        self._generation += 1
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        if not self._opened:
+            return
+        self._opened = False
+        try:
+            if self._changed or self._dropped:
+                assert self._data is not None
+                # the thread finishes the commit even if this is cancelled
+                await asyncio.shield(self._call(
+                    self._commit, self._data, self._changed, self._dropped))
+                self.flushes += 1
+            else:
+                await self._call(self._end)
+                self.skipped_flushes += 1
+        finally:
+            if not self._persistent:
+                await self._call(self._disconnect)
+
+    async def aclose(self) -> None:
+        """
+        Close the connection of a persistent storage and stop the thread
+        """
+        if self._thread is None:
+            return
+        await self._call(self._disconnect)
+        thread, self._thread = self._thread, None
+        # nothing is left to run, the thread ends right away
+        thread.shutdown(wait=False)
+
+
+async def copy_storage(source: AIOStorage, target: AIOStorage) -> None:
+    """
+    Replace all tables of `target` with those of `source`, e.g. to migrate
+    a database to another storage
+    """
+    async with source:
+        data = source.read() or {}
+        async with target:
+            target.write({name: dict(table) for name, table in data.items()})
+
+
+async def json_to_sqlite(json_path: StrOrBytesPath, sqlite_path: StrOrBytesPath,
+                         **kwargs: Any) -> None:
+    """
+    Copy a JSON database into an SQLite one, `kwargs` are passed on to
+    `AIOSQLiteStorage`
+    """
+    await copy_storage(AIOImmutableJSONStorage(json_path), AIOSQLiteStorage(sqlite_path, **kwargs))
+
+
+async def sqlite_to_json(sqlite_path: StrOrBytesPath, json_path: StrOrBytesPath,
+                         **kwargs: Any) -> None:
+    """
+    Copy an SQLite database into a JSON one, `kwargs` are passed on to
+    `AIOJSONStorage`
+    """
+    await copy_storage(AIOSQLiteStorage(sqlite_path, access_mode='r'),
+                       AIOJSONStorage(json_path, **kwargs))
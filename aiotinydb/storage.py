@@ -19,17 +19,32 @@ Contains the base class `AIOStorage` for async storages and
 implementations.
 """
 
-# pylint: disable=super-init-not-called
+# pylint: disable=super-init-not-called,too-many-instance-attributes,too-many-lines
+import asyncio
+import copy
+import functools
+import marshal
+import mmap
 import os
-import io
+import re
 import json
+import tempfile
 from abc import abstractmethod
+from concurrent.futures import Executor, ProcessPoolExecutor
+from time import perf_counter
 from types import TracebackType
-from typing import Any, Dict, Optional, NoReturn, Type, TypeVar, Union
+from typing import (
+    Any, AsyncIterator, Callable, Dict, Iterator, List, Mapping, Optional, NoReturn, Tuple, Type,
+    TypeVar, Union, cast,
+)
 import aiofiles
-from aiofiles.threadpool.text import AsyncTextIOWrapper
+from aiofiles.threadpool.binary import AsyncBufferedReader
 from tinydb.storages import Storage, JSONStorage
+from .compression import MAGIC_SIZE, Codec, ContentReader, detect_codec
 from .exceptions import NotOverridableError, ReadonlyStorageError
+from .metrics import NULL_METRICS, Metrics
+from .serializers import Contents, Serializer, default_serializer, detect_serializer
+from .streaming import aiter_records, build_tree, iter_records
 
 try:
     # `fcntl.flock()` is only available on unix
@@ -40,7 +55,42 @@ except ImportError:  # pragma: no cover
 
 AIOStorageT = TypeVar('AIOStorageT', bound='AIOStorage')
 AIOJSONStorageT = TypeVar('AIOJSONStorageT', bound='AIOJSONStorage')
+AIOLogStorageT = TypeVar('AIOLogStorageT', bound='AIOLogStorage')
 StrOrBytesPath = Union[str,  bytes, 'os.PathLike[str]', 'os.PathLike[bytes]']
+# `None`, `'thread'`, `'process'` or an executor instance
+ExecutorLike = Union[None, str, Executor]
+T = TypeVar('T')  # pylint: disable=invalid-name
+
+_PROCESS_POOL: Optional[ProcessPoolExecutor] = None
+
+
+def _process_pool() -> ProcessPoolExecutor:
+    """
+    Process pool shared by all storages created with `executor='process'`
+    """
+    global _PROCESS_POOL  # pylint: disable=global-statement
+    if _PROCESS_POOL is None:
+        _PROCESS_POOL = ProcessPoolExecutor()
+    return _PROCESS_POOL
+
+
+async def _in_thread(func: Callable[..., T], *args: Any) -> T:
+    """
+    Run blocking file system calls in the default executor
+    """
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(None, func, *args)
+
+
+def _fsync_dir(dirname: str) -> None:
+    """
+    Make a rename in `dirname` durable
+    """
+    handle = os.open(dirname, os.O_RDONLY)
+    try:
+        os.fsync(handle)
+    finally:
+        os.close(handle)
 
 
 class AIOStorage(Storage):
@@ -70,6 +120,40 @@ class AIOStorage(Storage):
         """
         raise NotImplementedError('To be overridden!')
 
+    # whether the storage writes changes kept after `__aexit__` by itself
+    background_flush = False
+
+    @property
+    def generation(self) -> Optional[int]:
+        """
+        Number which changes whenever the stored data changes, by `write()`
+        or by another process, `None` if the storage can't tell
+        """
+        return None
+
+    async def aiter_table(self, name: str) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Iterate over the IDs and documents of table `name`
+        """
+        table = (self.read() or {}).get(name) or {}
+        for doc_id, doc in list(table.items()):
+            yield doc_id, doc
+
+    async def aflush(self) -> None:
+        """
+        Write changes kept after `__aexit__`, for storages which do that
+        """
+
+    async def aclose(self) -> None:
+        """
+        Release resources kept after `__aexit__`, for storages which do that
+        """
+
+    def invalidate(self) -> None:
+        """
+        Drop outdated data kept after `__aexit__`, for storages which do that
+        """
+
     def close(self) -> NoReturn:
         """
         This is not called and should NOT be used
@@ -80,39 +164,389 @@ class AIOStorage(Storage):
 class AIOJSONStorage(AIOStorage, JSONStorage):
     """
     Asyncronous JSON Storage for AIOTinyDB
+
+    The file is parsed once in `__aenter__` and the resulting document tree
+    is kept in memory for the whole session. `read()` and `write()` work on
+    that tree directly (just like `tinydb.storages.MemoryStorage`), and it is
+    serialized back to the file only once in `__aexit__`.
+
+    By default parsing and serialization run on the event loop. Pass
+    `executor='thread'`, `executor='process'` or an `Executor` instance to
+    run them there instead. Note that the C accelerated `json` functions hold
+    the GIL, so a thread only keeps the loop responsive when the pure-Python
+    encoder is used (e.g. with `indent=...`); a process pool also works with
+    the C functions, but then the parsed tree has to be unpickled on return.
+
+    With `atomic=True` the file is not overwritten in place. The data is
+    written to a temporary file next to it which then replaces the original,
+    so a crash or a full disk never leaves a partially written database
+    behind. `fsync` controls durability: `'none'` leaves flushing to the OS,
+    `'file'` syncs the written file and `'full'` additionally syncs the
+    directory after the atomic rename.
+
+    Sessions which didn't `write()` anything don't touch the file at all,
+    `flushes` and `skipped_flushes` count both cases. `generation` is
+    increased by every `write()` and whenever a session finds the file
+    changed since it was last read or written.
+
+    A `persistent` storage keeps the file open and the documents parsed after
+    `__aexit__`. The next session only reads the file again if its inode,
+    modification time or size changed in the meantime. Changes are kept in
+    memory until `aflush()` (or `aclose()`) is awaited, and until then the
+    file stays locked.
+
+    With `access_mode='r'` the file is opened read-only and only a shared
+    lock is taken, so several processes can read it at the same time.
+    `lock_timeout` limits how many seconds to wait for the lock before
+    `asyncio.TimeoutError` is raised.
+
+    The file is read and written as bytes by a `Serializer`, by default
+    `JSONSerializer` using the `json` module. The format of an existing file
+    is detected when it is read: a MessagePack file stays MessagePack unless
+    a `serializer` is passed explicitly, in which case the file is converted
+    on the next write. A file of the format of the given `serializer` is
+    read by it too.
+
+    With `streaming=True` a JSON file is parsed incrementally, one document
+    at a time, instead of being read into memory as a whole first. This
+    happens on the first `read()`, so a session which only iterates over a
+    table with `aiter_table()` (e.g. `AIOTable.aiter()`) streams it from the
+    file without ever building the document tree.
+
+    Files can be compressed by a `Codec`, e.g. `compression=GzipCodec()`.
+    Like the serializer, the compression of an existing file is detected by
+    its first bytes and kept unless `compression` is passed explicitly.
+    Compression and decompression run in a thread, and a compressed file is
+    decompressed chunk by chunk without reading all of it first.
+
+    The durations of waiting for the file lock, reading, parsing,
+    serializing and writing are reported to `metrics` (see `Metrics`).
+
+    All other keyword arguments are passed on to the serializer's `dumps()`
+    (e.g. `json.dumps`).
     """
-    def __init__(self, filename: StrOrBytesPath, *args: Any, **kwargs: Any) -> None:
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        filename: StrOrBytesPath,
+        *args: Any,
+        executor: ExecutorLike = None,
+        atomic: bool = False,
+        fsync: str = 'none',
+        access_mode: str = 'r+',
+        lock_timeout: Optional[float] = None,
+        persistent: bool = False,
+        serializer: Optional[Serializer] = None,
+        streaming: bool = False,
+        compression: Optional[Codec] = None,
+        metrics: Metrics = NULL_METRICS,
+        **kwargs: Any
+    ) -> None:
         self.args = args
         self.kwargs = kwargs
         self._filename = filename
-        self._file: Optional[AsyncTextIOWrapper] = None
+        if access_mode not in ('r', 'r+'):
+            raise ValueError(f'Unknown access mode: {access_mode!r}')
+        self._readonly = access_mode == 'r'
+        self._lock_timeout = lock_timeout
+        self._persistent = persistent
+        if fsync not in ('none', 'file', 'full'):
+            raise ValueError(f'Unknown fsync policy: {fsync!r}')
+        self._atomic = atomic
+        self._fsync = fsync
+        self._offload: bool = executor is not None
+        self._executor: Optional[Executor]
+        if executor is None or executor == 'thread':
+            self._executor = None
+        elif executor == 'process':
+            self._executor = _process_pool()
+        elif isinstance(executor, Executor):
+            self._executor = executor
+        else:
+            raise ValueError(f'Unknown executor: {executor!r}')
+        self._fixed_serializer = serializer
+        self._serializer = serializer or default_serializer()
+        self._fixed_codec = compression
+        self._codec = compression
+        self._metrics = metrics
+        self._file: Optional[AsyncBufferedReader] = None
         self._lock: Optional['AIOFileLock'] = None
-        self._handle: Optional[io.StringIO] = None
+        self._data: Optional[Dict[str, Dict[str, Any]]] = None
+        self._streaming = streaming
+        # whether `_data` holds the contents of the file
+        self._parsed: bool = True
+        self._stamp: Optional[Tuple[int, ...]] = None
+        # unlike `_stamp` kept after closing, to notice changes by others
+        self._seen_stamp: Optional[Tuple[int, ...]] = None
+        self._generation: int = 0
+        self._opened: bool = False
+        self._dirty: bool = False
+        self.flushes: int = 0
+        self.skipped_flushes: int = 0
+
+    @property
+    def filename(self) -> StrOrBytesPath:
+        """
+        Path of the database file
+        """
+        return self._filename
 
     async def __aenter__(self: AIOJSONStorageT) -> AIOJSONStorageT:
-        if self._handle is None:
-            try:
-                self._file = await aiofiles.open(self._filename, 'r+')
-            except FileNotFoundError:
-                dirname = os.path.dirname(self._filename)
-                if dirname:
-                    os.makedirs(dirname, exist_ok=True)
-
-                self._file = await aiofiles.open(self._filename, 'w+')
-
-            if FILELOCK_SUPPORTED:
-                self._lock = AIOFileLock(self._file)
-                await self._lock.acquire()
-            self._handle = io.StringIO(await self._file.read())
+        if not self._opened:
+            await self._load()
         return self
 
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    @property
+    def serializer(self) -> Serializer:
+        """
+        Serializer used for the next write
+        """
+        return self._serializer
+
+    @property
+    def compression(self) -> Optional[Codec]:
+        """
+        Codec compressing the next write, `None` if it isn't compressed
+        """
+        return self._codec
+
+    async def _open_file(self) -> AsyncBufferedReader:
+        """
+        Open the database file, creating it if necessary
+        """
+        if self._readonly:
+            return await aiofiles.open(self._filename, 'rb')
+        try:
+            return await aiofiles.open(self._filename, 'rb+')
+        except FileNotFoundError:
+            dirname = os.path.dirname(self._filename)
+            if dirname:
+                os.makedirs(dirname, exist_ok=True)
+
+            return await aiofiles.open(self._filename, 'wb+')
+
+    def _replaced(self) -> bool:
+        """
+        Check whether the opened file was atomically replaced by another writer
+        """
+        assert self._file is not None
+        try:
+            current = os.stat(self._filename)
+        except FileNotFoundError:
+            return True
+        opened = os.fstat(self._file.fileno())
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+    async def _lock_file(self) -> None:
+        """
+        Open and lock the file unless that's already done, making sure the
+        locked file is still the one at `filename`
+        """
+        while True:
+            if self._file is None:
+                self._file = await self._open_file()
+                if FILELOCK_SUPPORTED:
+                    self._lock = AIOFileLock(
+                        self._file, shared=self._readonly, timeout=self._lock_timeout,
+                        metrics=self._metrics)
+            if self._lock is None:
+                return
+            if not self._lock.locked():
+                try:
+                    await self._lock.acquire()
+                except BaseException:
+                    await self._close_file()
+                    raise
+            if not self._replaced():
+                return
+            # the lock was granted on a file which is not there anymore
+            await self._close_file()
+
+    def _unlock_file(self) -> None:
+        if self._lock is not None and self._lock.locked():
+            self._lock.release()
+
+    async def _close_file(self) -> None:
+        """
+        Unlock and close the file
+        """
+        assert self._file is not None
+        self._unlock_file()
+        self._lock = None
+        await self._file.close()
+        self._file = None
+
+    async def _load(self) -> None:
+        """
+        Lock the file and parse its contents into the document tree, unless
+        a persistent storage still has them from an earlier session
+        """
+        await self._lock_file()
+        stamp = self._current_stamp()
+        if stamp != self._stamp:
+            if self._streaming:
+                # parsed once it's needed, iterating over a table doesn't
+                self._data, self._parsed = None, False
+            else:
+                self._data = await self._read_data()
+            self._stamp = stamp
+            self._dirty = False
+        if stamp != self._seen_stamp:
+            self._seen_stamp = stamp
+            self._generation += 1
+        self._opened = True
+
+    def _current_stamp(self) -> Tuple[int, ...]:
+        """
+        Identify the current version of the file to detect changes by others
+        """
+        stat = os.stat(self._filename)
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+    async def _read_data(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Read and parse the locked file
+        """
+        assert self._file is not None
+        start = perf_counter()
+        fileno = self._file.fileno()
+        codec = self._detect_codec(await _in_thread(os.pread, fileno, MAGIC_SIZE, 0))
+        contents: Contents
+        if codec is None:
+            await self._file.seek(0)
+            contents = await self._file.read()
+        else:
+            contents = await _in_thread(self._reader(fileno, codec).read_all)
+        self._metrics.observe('read', perf_counter() - start, len(contents))
+        if not contents:
+            return None
+        loads = self._detect(contents).loads
+        start = perf_counter()
+        data = await self._run(loads, contents)
+        self._metrics.observe('parse', perf_counter() - start, len(contents))
+        return data
+
+    def _reader(self, fileno: int, codec: Optional[Codec]) -> ContentReader:
+        """
+        Get a reader of the decompressed contents of the locked file
+        """
+        return ContentReader(lambda offset, size: os.pread(fileno, size, offset), codec)
+
+    def _parse_now(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Parse the locked file incrementally, blocking
+        """
+        assert self._file is not None
+        start = perf_counter()
+        fileno = self._file.fileno()
+        reader = self._reader(fileno, self._detect_codec(os.pread(fileno, MAGIC_SIZE, 0)))
+        serializer = self._detect(reader.head())
+        data: Optional[Dict[str, Dict[str, Any]]]
+        if serializer.name == 'msgpack':
+            data = serializer.loads(reader.read_all())
+        else:
+            data = build_tree(iter_records(reader))
+        # reading and parsing can't be told apart
+        self._metrics.observe('parse', perf_counter() - start)
+        return data
+
+    async def aiter_table(self, name: str) -> AsyncIterator[Tuple[str, Any]]:
+        if self._parsed:
+            async for item in super().aiter_table(name):
+                yield item
+            return
+        assert self._file is not None
+        fileno = self._file.fileno()
+        codec = self._detect_codec(await _in_thread(os.pread, fileno, MAGIC_SIZE, 0))
+        reader = self._reader(fileno, codec)
+        if self._detect(await _in_thread(reader.head)).name == 'msgpack':
+            # can't be streamed
+            async for item in super().aiter_table(name):
+                yield item
+            return
+        found = False
+        async for table, doc_id, doc in aiter_records(
+                lambda offset, size: _in_thread(reader, offset, size)):
+            if table != name:
+                if found:
+                    # all documents of a table are next to each other
+                    return
+                continue
+            found = True
+            if doc_id is not None:
+                yield doc_id, doc
+
+    def _detect(self, contents: Contents) -> Serializer:
+        """
+        Get a serializer for the format of the file's `contents`
+        """
+        serializer = detect_serializer(contents, self._fixed_serializer)
+        if self._fixed_serializer is None:
+            # keep writing the format the file already has
+            self._serializer = serializer
+        return serializer
+
+    def _detect_codec(self, head: bytes) -> Optional[Codec]:
+        """
+        Get the codec of a file starting with `head`, `None` if it isn't
+        compressed
+        """
+        codec = detect_codec(head)
+        if self._fixed_codec is None and head:
+            # keep writing the file compressed as it is
+            self._codec = codec
+        return codec
+
+    async def _serialize(self, data: Any) -> bytes:
+        """
+        Serialize and compress `data` for writing
+        """
+        start = perf_counter()
+        serialized = await self._run(self._serializer.dumps, data, **self.kwargs)
+        if self._codec is not None:
+            serialized = await _in_thread(self._codec.compress, serialized)
+        self._metrics.observe('serialize', perf_counter() - start, len(serialized))
+        return serialized
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Call `func` on the event loop or in the configured executor
+        """
+        if not self._offload:
+            return func(*args, **kwargs)
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs))
+
+    async def _close(self) -> None:
+        """
+        Unlock and close the file, drop the document tree
+        """
+        if self._file is not None:
+            await self._close_file()
+        self._data = None
+        self._parsed = True
+        self._stamp = None
+        self._opened = False
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        assert self._opened
+        if not self._parsed:
+            self._data = self._parse_now()
+            self._parsed = True
+        return self._data
+
     def write(self, data: Dict[str, Dict[str, Any]]) -> None:
-        assert isinstance(self._handle, io.StringIO)
-        self._handle.seek(0)
-        serialized = json.dumps(data, **self.kwargs)
-        self._handle.write(serialized)
-        self._handle.flush()
-        self._handle.truncate()
+        assert self._opened
+        if self._readonly:
+            raise ReadonlyStorageError('Storage is opened read-only')
+        self._data = data
+        self._parsed = True
+        self._dirty = True
+        self._generation += 1
 
     async def __aexit__(
         self,
@@ -120,53 +554,532 @@ class AIOJSONStorage(AIOStorage, JSONStorage):
         exc_value: Optional[BaseException],
         exc_tb: Optional[TracebackType]
     ) -> None:
-        if self._handle is not None:
-            assert self._file is not None
+        if not self._opened:
+            return
+        if not self._dirty:
+            self.skipped_flushes += 1
+        if self._persistent:
+            self._opened = False
+            if not self._dirty:
+                self._unlock_file()
+            return
+        try:
+            if self._dirty:
+                await self._flush()
+        finally:
+            await self._close()
 
-            await self._file.seek(0)
-            await self._file.write(self._handle.getvalue())
-            await self._file.flush()
-            await self._file.truncate()
-            if FILELOCK_SUPPORTED:
-                assert self._lock is not None
-                self._lock.release()
-                self._lock = None
-            await self._file.close()
-            self._handle.close()
-            self._file = None
-            self._handle = None
+    async def aflush(self) -> None:
+        """
+        Write the changes a persistent storage kept after `__aexit__` and
+        unlock the file
+        """
+        if self._dirty:
+            await self._flush()
+        if not self._opened:
+            self._unlock_file()
+
+    async def aclose(self) -> None:
+        """
+        Flush and close a persistent storage
+        """
+        await self.aflush()
+        await self._close()
+
+    def invalidate(self) -> None:
+        """
+        Drop the documents a persistent storage kept if the file changed
+        """
+        if self._opened or self._dirty or self._stamp is None:
+            return
+        try:
+            changed = self._current_stamp() != self._stamp
+        except FileNotFoundError:
+            changed = True
+        if changed:
+            self._data, self._stamp = None, None
+
+    async def _flush(self) -> None:
+        """
+        Serialize the document tree and write it to the file
+        """
+        assert self._file is not None
+        serialized = b'' if self._data is None else await self._serialize(self._data)
+        if self._atomic:
+            await self._write_atomic(serialized)
+            # the locked file was replaced, the next session opens the new one
+            await self._close_file()
+            if self._opened:
+                # flushed during a session, which goes on with the new file
+                await self._lock_file()
+        else:
+            await self._write_in_place(serialized)
+        self._stamp = self._seen_stamp = self._current_stamp()
+        self._dirty = False
+        self.flushes += 1
+
+    async def _write_in_place(self, serialized: bytes) -> None:
+        assert self._file is not None
+        start = perf_counter()
+        await self._file.seek(0)
+        await self._file.write(serialized)
+        await self._file.flush()
+        await self._file.truncate()
+        if self._fsync != 'none':
+            await _in_thread(os.fsync, self._file.fileno())
+        self._metrics.observe('write', perf_counter() - start, len(serialized))
+
+    async def _write_atomic(self, serialized: bytes, link: bool = False) -> None:
+        """
+        Write to a temporary file which then replaces the file, or with
+        `link=True`, only becomes it if there is no such file yet
+        """
+        start = perf_counter()
+        path = os.fsdecode(self._filename)
+        dirname, basename = os.path.split(path)
+        if self._file is not None:
+            mode = os.fstat(self._file.fileno()).st_mode
+        else:
+            mode = os.stat(dirname or os.curdir).st_mode & 0o666
+        handle, tmp_path = tempfile.mkstemp(
+            prefix=f'.{basename}.', suffix='.tmp', dir=dirname or None)
+        try:
+            os.fchmod(handle, mode)
+            async with aiofiles.open(handle, 'wb') as tmp_file:
+                await tmp_file.write(serialized)
+                await tmp_file.flush()
+                if self._fsync != 'none':
+                    await _in_thread(os.fsync, tmp_file.fileno())
+            await _in_thread(os.link if link else os.replace, tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if link:
+            os.unlink(tmp_path)
+        if self._fsync == 'full':
+            await _in_thread(_fsync_dir, dirname or os.curdir)
+        self._metrics.observe('write', perf_counter() - start, len(serialized))
 
 
 class AIOImmutableJSONStorage(AIOJSONStorage):
     """
     Asyncronous readonly JSON Storage for AIOTinyDB
     """
-    async def __aenter__(self: AIOJSONStorageT) -> AIOJSONStorageT:
-        if self._handle is None:
-            self._file = await aiofiles.open(self._filename, 'r')
-            if FILELOCK_SUPPORTED:
-                self._lock = AIOFileLock(self._file)
-                await self._lock.acquire()
-            self._handle = io.StringIO(await self._file.read())
-        return self
+    def __init__(self, filename: StrOrBytesPath, *args: Any, **kwargs: Any) -> None:
+        kwargs['access_mode'] = 'r'
+        super().__init__(filename, *args, **kwargs)
 
-    async def __aexit__(
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        raise ReadonlyStorageError('AIOImmutableJSONStorage cannot be written to')
+
+
+Tables = Dict[str, Dict[str, Any]]
+
+
+def _deep_copy(value: Any) -> Any:
+    """
+    Deep copy documents
+    """
+    try:
+        # much faster than `copy.deepcopy` for the types JSON consists of
+        return marshal.loads(marshal.dumps(value))
+    except ValueError:
+        return copy.deepcopy(value)
+
+
+def _diff_tables(old: Optional[Tables], new: Optional[Tables]) -> List[List[Any]]:
+    """
+    Compute the log records turning `old` into `new`
+    """
+    old = old or {}
+    new = new or {}
+    records: List[List[Any]] = [['drop', name] for name in old.keys() - new.keys()]
+    for name, table in new.items():
+        before = old.get(name)
+        if before is None:
+            records.append(['table', name])
+            before = {}
+        records.extend(['del', name, doc_id] for doc_id in before.keys() - table.keys())
+        records.extend(
+            ['put', name, doc_id, doc] for doc_id, doc in table.items()
+            if before.get(doc_id) != doc)
+    return records
+
+
+def _apply_records(data: Optional[Tables], records: List[List[Any]]) -> Optional[Tables]:
+    """
+    Apply log records to a document tree in place
+    """
+    if records and data is None:
+        data = {}
+    for operation, name, *args in records:
+        assert data is not None
+        if operation == 'drop':
+            data.pop(name, None)
+        elif operation == 'table':
+            data.setdefault(name, {})
+        elif operation == 'put':
+            data.setdefault(name, {})[args[0]] = args[1]
+        elif operation == 'del':
+            data.get(name, {}).pop(args[0], None)
+    return data
+
+
+def _replay_log(
+    data: Optional[Tables], lines: List[bytes], serializer: Serializer
+) -> Tuple[Optional[Tables], int]:
+    """
+    Apply the committed records of a log to a document tree, also return
+    where the last commit record ends
+    """
+    pending: List[List[Any]] = []
+    offset = committed = 0
+    for line in lines:
+        if not line.endswith(b'\n'):
+            # torn write at the end of the log, its batch was not committed
+            break
+        try:
+            record: Any = serializer.loads(line)
+        except ValueError:
+            break
+        offset += len(line)
+        if record[0] == 'commit':
+            data = _apply_records(data, pending)
+            pending = []
+            committed = offset
+        else:
+            pending.append(record)
+    return data, committed
+
+
+class AIOLogStorage(AIOJSONStorage):
+    """
+    Asyncronous append-only log storage for AIOTinyDB
+
+    Instead of rewriting the whole database, every session appends the
+    documents it inserted, updated or removed to a log file next to the JSON
+    snapshot (`<filename>.log`). Opening the storage reads the snapshot and
+    replays the log on top of it.
+
+    Whatever follows the last commit record, left behind by a crash, is cut
+    off the log when it's opened, so it's neither applied with the next
+    batch nor prevents that from being read.
+
+    Once the log grows beyond `compact_size` bytes or `compact_ratio` times
+    the size of the snapshot, a background task writes a new snapshot
+    (atomically by default) and empties the log; `compactions` counts those.
+    It reads the files with a storage of its own, parsing and serializing in
+    a thread unless an `executor` is given, under the file lock like any
+    other session. Sessions don't wait for it, `aclose()` does. If it fails,
+    the error is raised by the next session or by `aclose()`.
+
+    Finding the changed documents requires an unmodified copy of the data,
+    so the storage keeps two copies of the documents in memory. All other
+    arguments are the same as for `AIOJSONStorage`.
+    """
+    def __init__(
         self,
-        exc_type: Optional[Type[BaseException]],
-        exc_value: Optional[BaseException],
-        exc_tb: Optional[TracebackType]
+        filename: StrOrBytesPath,
+        *args: Any,
+        compact_size: Optional[int] = None,
+        compact_ratio: Optional[float] = 1.0,
+        **kwargs: Any
     ) -> None:
-        if self._handle is not None:
-            assert self._file is not None
-
-            if FILELOCK_SUPPORTED:
-                assert self._lock is not None
-                self._lock.release()
-                self._lock = None
-            await self._file.close()
-            self._handle.close()
-            self._file = None
-            self._handle = None
+        if kwargs.get('streaming'):
+            raise ValueError('AIOLogStorage can not be streamed')
+        kwargs.setdefault('atomic', True)
+        super().__init__(filename, *args, **kwargs)
+        self._compactor_args = (filename, args, dict(
+            kwargs, persistent=False, compact_size=None, compact_ratio=None,
+            executor=kwargs.get('executor') or 'thread'))
+        self._compaction: Optional['asyncio.Future[None]'] = None
+        self._log_filename = os.fsdecode(filename) + '.log'
+        # where the last commit record ends
+        self._log_size: int = 0
+        # the log is always JSON lines, whatever the format of the snapshot
+        self._log_serializer = default_serializer()
+        self._compact_size = compact_size
+        self._compact_ratio = compact_ratio
+        self._committed: Optional[Tables] = None
+        self.compactions: int = 0
 
-    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
-        raise ReadonlyStorageError('AIOImmutableJSONStorage cannot be written to')
+    def _current_stamp(self) -> Tuple[int, ...]:
+        try:
+            log = os.stat(self._log_filename)
+            log_stamp: Tuple[int, ...] = (log.st_ino, log.st_mtime_ns, log.st_size)
+        except FileNotFoundError:
+            log_stamp = ()
+        return super()._current_stamp() + log_stamp
+
+    async def _read_data(self) -> Optional[Tables]:
+        data = await super()._read_data()
+        try:
+            async with aiofiles.open(self._log_filename, 'rb') as log:
+                lines = await log.readlines()
+        except FileNotFoundError:
+            lines = []
+        data, self._log_size = _replay_log(data, lines, self._log_serializer)
+        if self._log_size < sum(map(len, lines)) and not self._readonly:
+            await self._truncate_log()
+        self._committed = _deep_copy(data)
+        return data
+
+    async def _truncate_log(self) -> None:
+        """
+        Cut off whatever follows the last commit record
+        """
+        async with aiofiles.open(self._log_filename, 'r+b') as log:
+            await log.truncate(self._log_size)
+            if self._fsync != 'none':
+                await _in_thread(os.fsync, log.fileno())
+
+    def _should_compact(self) -> bool:
+        try:
+            log_size = os.stat(self._log_filename).st_size
+        except FileNotFoundError:
+            return False
+        if self._compact_size is not None and log_size > self._compact_size:
+            return True
+        snapshot_size = os.stat(self._filename).st_size
+        return self._compact_ratio is not None and log_size > self._compact_ratio * snapshot_size
+
+    def _start_compaction(self) -> None:
+        # a finished one is collected by the next session
+        if self._compaction is None:
+            self._compaction = asyncio.ensure_future(self._compact_in_background())
+
+    def _collect_compaction(self) -> None:
+        """
+        Forget a finished compaction, raising the error it failed with
+        """
+        if self._compaction is not None and self._compaction.done():
+            compaction, self._compaction = self._compaction, None
+            compaction.result()
+
+    async def __aenter__(self: AIOLogStorageT) -> AIOLogStorageT:
+        self._collect_compaction()
+        await super().__aenter__()
+        return self
+
+    async def _compact_in_background(self) -> None:
+        filename, args, kwargs = self._compactor_args
+        compactor = type(self)(filename, *args, **kwargs)
+        async with compactor:
+            # unless another process did it in the meantime
+            if self._should_compact():
+                await compactor._compact()  # pylint: disable=protected-access
+                self.compactions += 1
+
+    async def _wait_compaction(self) -> None:
+        """
+        Wait for a running compaction, raising the error it failed with
+        """
+        if self._compaction is not None:
+            compaction, self._compaction = self._compaction, None
+            await compaction
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        # it waits for the file lock, which is released now
+        await self._wait_compaction()
+
+    async def _compact(self) -> None:
+        """
+        Write the whole document tree to the snapshot and empty the log
+        """
+        serialized = b'' if self._data is None else await self._serialize(self._data)
+        if self._atomic:
+            await self._write_atomic(serialized)
+        else:
+            await self._write_in_place(serialized)
+        # truncate the log before closing the replaced file releases the lock;
+        # replaying it on top of the new snapshot would be harmless though
+        async with aiofiles.open(self._log_filename, 'wb') as log:
+            if self._fsync != 'none':
+                await _in_thread(os.fsync, log.fileno())
+        if self._atomic:
+            await self._close_file()
+
+    async def _flush(self) -> None:
+        records = _diff_tables(self._committed, self._data)
+        if records:
+            start = perf_counter()
+            dumps = self._log_serializer.dumps
+            batch = b'\n'.join(dumps(record) for record in records + [['commit']]) + b'\n'
+            self._metrics.observe('serialize', perf_counter() - start, len(batch))
+            start = perf_counter()
+            if os.path.exists(self._log_filename) and \
+                    os.stat(self._log_filename).st_size > self._log_size:
+                # an earlier append failed half-way
+                await self._truncate_log()
+            async with aiofiles.open(self._log_filename, 'ab') as log:
+                await log.write(batch)
+                await log.flush()
+                if self._fsync != 'none':
+                    await _in_thread(os.fsync, log.fileno())
+            self._metrics.observe('write', perf_counter() - start, len(batch))
+            self._log_size += len(batch)
+        self.flushes += 1
+        # only the changed documents need to be copied
+        self._committed = _apply_records(self._committed, _deep_copy(records))
+        self._stamp = self._seen_stamp = self._current_stamp()
+        self._dirty = False
+        if self._should_compact():
+            self._start_compaction()
+
+
+# everything up to the next brace outside of a string, and the brace itself
+_SEGMENT = re.compile(rb'[^"{}]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}]*)*[{}]')
+_TABLE_KEY = re.compile(rb'\s*,?\s*("[^"\\]*(?:\\.[^"\\]*)*")\s*:\s*\{')
+_OPEN_BRACE = ord('{')
+Offsets = Dict[str, Tuple[int, int]]
+
+
+def _index_tables(buffer: 'mmap.mmap') -> Offsets:
+    """
+    Find where the value of every table starts and ends in a JSON document
+    without parsing it
+    """
+    offsets: Offsets = {}
+    depth = 1
+    name, table_start = '', 0
+    # one brace at a time, nothing but the table names is copied
+    for segment in _SEGMENT.finditer(buffer, buffer.find(b'{') + 1):
+        end = segment.end()
+        if buffer[end - 1] == _OPEN_BRACE:
+            depth += 1
+            if depth == 2:
+                key = _TABLE_KEY.match(buffer, segment.start(), end)
+                if key is None:
+                    raise ValueError(f'Unexpected table key at offset {end}')
+                name, table_start = json.loads(key.group(1)), end - 1
+        else:
+            depth -= 1
+            if depth == 1:
+                offsets[name] = (table_start, end)
+            elif not depth:
+                break
+    return offsets
+
+
+class _MappedTables(Mapping[str, Dict[str, Any]]):
+    """
+    Tables of a memory-mapped JSON document, each one decoded on first access
+    """
+    def __init__(
+        self, buffer: 'mmap.mmap', offsets: Offsets, loads: Callable[[bytes], Any]
+    ) -> None:
+        self._buffer = buffer
+        self._offsets = offsets
+        self._loads = loads
+        self._tables: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def decoded(self) -> List[str]:
+        """
+        Names of the tables decoded so far
+        """
+        return list(self._tables)
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        if name not in self._tables:
+            start, end = self._offsets[name]
+            self._tables[name] = self._loads(self._buffer[start:end])
+        return self._tables[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._offsets)
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+
+class AIOMappedJSONStorage(AIOImmutableJSONStorage):
+    """
+    Asyncronous readonly JSON Storage for AIOTinyDB which decodes tables lazily
+
+    The file is memory-mapped instead of read, and only the tables actually
+    used (e.g. through `db.table(name)`) are decoded. The pages of the file
+    live in the OS page cache, so processes mapping the same file share them.
+
+    To find the tables, the file is scanned once for braces outside of
+    strings, in a thread. That takes about as long as parsing the file, but
+    nothing of it is kept in memory except the offsets of the tables. These
+    are cached in `<filename>.idx` (if it can be written) for other
+    processes and later sessions; pass `index_file=False` to keep them in
+    memory only.
+
+    Only JSON files are supported. All other arguments are the same as for
+    `AIOImmutableJSONStorage`.
+    """
+    def __init__(
+        self, filename: StrOrBytesPath, *args: Any, index_file: bool = True, **kwargs: Any
+    ) -> None:
+        if kwargs.get('streaming'):
+            raise ValueError('AIOMappedJSONStorage decodes tables lazily already')
+        if kwargs.get('compression'):
+            raise ValueError('AIOMappedJSONStorage can not map compressed files')
+        super().__init__(filename, *args, **kwargs)
+        self._index_filename = os.fsdecode(filename) + '.idx' if index_file else None
+        self._mmap: Optional[mmap.mmap] = None
+
+    async def _read_data(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        assert self._file is not None
+        self._unmap()
+        if not os.fstat(self._file.fileno()).st_size:
+            return None
+        buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        serializer = detect_serializer(buffer[:1], self._fixed_serializer)
+        if serializer.name not in ('json', 'orjson') or detect_codec(buffer[:MAGIC_SIZE]):
+            buffer.close()
+            raise ValueError(f'{type(self).__name__} only supports JSON files')
+        stamp = self._current_stamp()
+        offsets = self._read_index(stamp)
+        if offsets is None:
+            try:
+                offsets = await _in_thread(_index_tables, buffer)
+            except BaseException:
+                buffer.close()
+                raise
+            self._write_index(stamp, offsets)
+        self._mmap = buffer
+        # tinydb only looks tables up by name, a mapping is as good as a dict
+        return cast(Dict[str, Dict[str, Any]], _MappedTables(buffer, offsets, serializer.loads))
+
+    def _read_index(self, stamp: Tuple[int, ...]) -> Optional[Offsets]:
+        if self._index_filename is None:
+            return None
+        try:
+            with open(self._index_filename, 'rb') as file:
+                index = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if tuple(index.get('stamp', ())) != stamp:
+            return None
+        return {name: (start, end) for name, (start, end) in index['tables'].items()}
+
+    def _write_index(self, stamp: Tuple[int, ...], offsets: Offsets) -> None:
+        if self._index_filename is None:
+            return
+        dirname, basename = os.path.split(self._index_filename)
+        try:
+            handle, tmp_path = tempfile.mkstemp(
+                prefix=f'.{basename}.', suffix='.tmp', dir=dirname or None)
+        except OSError:
+            # e.g. a read-only directory, the index is just not cached
+            return
+        try:
+            with os.fdopen(handle, 'w') as file:
+                json.dump({'stamp': stamp, 'tables': offsets}, file)
+            os.replace(tmp_path, self._index_filename)
+        except OSError:
+            os.unlink(tmp_path)
+
+    def _unmap(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    async def _close(self) -> None:
+        await super()._close()
+        self._unmap()
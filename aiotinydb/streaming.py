@@ -0,0 +1,237 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Incremental parsing of TinyDB JSON files, one document at a time, so a
+file never has to be held in memory as a whole.
+
+The top two levels of the file (tables and documents) are scanned by hand,
+every document is decoded by `json.JSONDecoder.raw_decode` once it is
+completely buffered.
+"""
+
+import codecs
+import json
+import re
+from typing import (
+    Any, AsyncIterator, Awaitable, Callable, Dict, Generator, Iterable, Iterator, Optional,
+    Tuple,
+)
+
+# (None, None, {}) starts the file's object, (table, None, {}) a table,
+# followed by (table, doc_id, document) for each of its documents; a table
+# which isn't an object is reported as (table, None, value) only
+Record = Tuple[Optional[str], Optional[str], Any]
+
+CHUNK_SIZE = 1 << 18
+
+_WHITESPACE = ' \t\n\r'
+_DELIMITERS = _WHITESPACE + ',:}'
+_DECODER = json.JSONDecoder()
+# a complete document ID and the colon, or the separator after a document
+_MEMBER = re.compile(r'[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*')
+_SEPARATOR = re.compile(r'[ \t\n\r]*([,}])')
+
+
+class _Buffer:
+    """
+    Decoded text of the part of the file which isn't parsed yet
+    """
+    def __init__(self) -> None:
+        self.text = ''
+        self.pos = 0
+        self.eof = False
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+
+    def feed(self, data: bytes) -> None:
+        """
+        Append the next chunk of the file, an empty one marks its end
+        """
+        if not data:
+            self.eof = True
+        # drop what's parsed already
+        self.text = self.text[self.pos:] + self._decoder.decode(data, final=not data)
+        self.pos = 0
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        """
+        Syntax error at `pos`
+        """
+        return json.JSONDecodeError(message, self.text, self.pos)
+
+    def decode_now(self) -> Tuple[bool, Any]:
+        """
+        Decode the value at `pos` if it's completely buffered
+        """
+        try:
+            value, end = _DECODER.raw_decode(self.text, self.pos)
+        except json.JSONDecodeError:
+            return False, None
+        if end == len(self.text) or self.text[end] not in _DELIMITERS:
+            return False, None
+        self.pos = end
+        return True, value
+
+
+def _skip_whitespace(buf: _Buffer) -> Generator[None, None, None]:
+    while True:
+        while buf.pos < len(buf.text) and buf.text[buf.pos] in _WHITESPACE:
+            buf.pos += 1
+        if buf.pos < len(buf.text) or buf.eof:
+            return
+        yield None
+
+
+def _expect(buf: _Buffer, chars: str) -> Generator[None, None, None]:
+    # skip to the next non-whitespace character, which has to be one of `chars`
+    yield from _skip_whitespace(buf)
+    if buf.pos >= len(buf.text) or buf.text[buf.pos] not in chars:
+        raise buf.error(f'Expecting one of {chars!r}')
+
+
+def _decode(buf: _Buffer) -> Generator[None, None, Any]:
+    # decode the next value once it's complete
+    yield from _skip_whitespace(buf)
+    while True:
+        try:
+            value, end = _DECODER.raw_decode(buf.text, buf.pos)
+        except json.JSONDecodeError:
+            if buf.eof:
+                raise
+            yield None
+            continue
+        if not buf.eof and (end == len(buf.text) or buf.text[end] not in _DELIMITERS):
+            # a number (e.g. `1e`) may go on in the next chunk
+            yield None
+            continue
+        buf.pos = end
+        return value
+
+
+def _documents(buf: _Buffer, table: str) -> Generator[Optional[Record], None, None]:
+    # the members of a table object, after its opening brace
+    yield from _expect(buf, '"}')
+    while buf.text[buf.pos] != '}':
+        # the regular expressions and `decode_now` are shortcuts for
+        # the usual case of a document that's completely buffered
+        member = _MEMBER.match(buf.text, buf.pos)
+        if member is None:
+            yield from _expect(buf, '"')
+            doc_id = yield from _decode(buf)
+            yield from _expect(buf, ':')
+            buf.pos += 1
+        else:
+            doc_id = member.group(1)
+            if '\\' in doc_id:
+                doc_id = json.loads(f'"{doc_id}"')
+            buf.pos = member.end()
+        decoded, doc = buf.decode_now()
+        if not decoded:
+            doc = yield from _decode(buf)
+        yield (table, doc_id, doc)
+        separator = _SEPARATOR.match(buf.text, buf.pos)
+        if separator is None:
+            yield from _expect(buf, ',}')
+        else:
+            buf.pos = separator.start(1)
+        if buf.text[buf.pos] == ',':
+            buf.pos += 1
+            yield from _expect(buf, '"')
+
+
+def _parse(buf: _Buffer) -> Generator[Optional[Record], None, None]:
+    """
+    Yield the records of the text in `buf`, or `None` whenever more of it
+    has to be fed
+    """
+    yield from _skip_whitespace(buf)
+    if buf.pos >= len(buf.text):
+        # an empty file
+        return
+    yield from _expect(buf, '{')
+    buf.pos += 1
+    yield (None, None, {})
+    yield from _expect(buf, '"}')
+    while buf.text[buf.pos] != '}':
+        table = yield from _decode(buf)
+        yield from _expect(buf, ':')
+        buf.pos += 1
+        yield from _skip_whitespace(buf)
+        if buf.pos < len(buf.text) and buf.text[buf.pos] == '{':
+            buf.pos += 1
+            yield (table, None, {})
+            yield from _documents(buf, table)
+            buf.pos += 1
+        else:
+            yield (table, None, (yield from _decode(buf)))
+        yield from _expect(buf, ',}')
+        if buf.text[buf.pos] == ',':
+            buf.pos += 1
+            yield from _expect(buf, '"')
+    buf.pos += 1
+    yield from _skip_whitespace(buf)
+    if buf.pos < len(buf.text):
+        raise buf.error('Extra data')
+
+
+def iter_records(
+    read: Callable[[int, int], bytes], chunk_size: int = CHUNK_SIZE
+) -> Iterator[Record]:
+    """
+    Parse a file incrementally, `read(offset, size)` returns its contents
+    """
+    buf = _Buffer()
+    offset = 0
+    for record in _parse(buf):
+        if record is None:
+            # read more at once if a document doesn't fit
+            data = read(offset, max(chunk_size, len(buf.text) - buf.pos))
+            offset += len(data)
+            buf.feed(data)
+        else:
+            yield record
+
+
+async def aiter_records(
+    read: Callable[[int, int], Awaitable[bytes]], chunk_size: int = CHUNK_SIZE
+) -> AsyncIterator[Record]:
+    """
+    Coroutine version of `iter_records`, `read(offset, size)` is awaited
+    """
+    buf = _Buffer()
+    offset = 0
+    for record in _parse(buf):
+        if record is None:
+            data = await read(offset, max(chunk_size, len(buf.text) - buf.pos))
+            offset += len(data)
+            buf.feed(data)
+        else:
+            yield record
+
+
+def build_tree(records: Iterable[Record]) -> Optional[Dict[str, Any]]:
+    """
+    Build the document tree of the records of a file, `None` if it's empty
+    """
+    data: Dict[str, Any] = {}
+    started = False
+    for table, doc_id, value in records:
+        if table is None:
+            started = True
+        elif doc_id is None:
+            data[table] = value
+        else:
+            data[table][doc_id] = value
+    return data if started else None
@@ -0,0 +1,404 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `AIOTable`, a TinyDB table with coroutine counterparts
+of the CPU-bound query methods.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import Executor
+from typing import (
+    Any, AsyncIterator, Callable, Dict, Iterable, List, Mapping, MutableMapping, Optional, Sequence,
+    Set, Tuple, TypeVar, Union,
+)
+from tinydb.queries import QueryLike
+from tinydb.storages import Storage
+from tinydb.table import Document, Table
+from .cache import ResultCache
+from .exceptions import ReadonlyStorageError
+from .index import Index, IndexSpec, candidates, normalize
+from .storage import AIOStorage, _deep_copy
+
+T = TypeVar('T')  # pylint: disable=invalid-name
+Fields = Union[Mapping, Callable[[MutableMapping], None]]
+
+# documents `aiter` yields before giving other tasks a turn
+_AITER_BATCH = 1000
+
+
+async def _aiter_items(table: Mapping[str, Any]) -> AsyncIterator[Tuple[str, Any]]:
+    for item in list(table.items()):
+        yield item
+
+
+class _CopyOnWrite(Dict[int, Any]):
+    """
+    Table handed to an updater, which copies the documents stored in it and
+    those `for_update` hands out, so the stored ones are never changed
+    """
+    def __init__(self, items: Iterable[Tuple[int, Any]]) -> None:
+        super().__init__(items)
+        self._copied: Set[int] = set()
+
+    def __setitem__(self, doc_id: int, doc: Any) -> None:
+        super().__setitem__(doc_id, _deep_copy(doc))
+        self._copied.add(doc_id)
+
+    def for_update(self, doc_id: int) -> Any:
+        """
+        Get a document to change in place, copied on first use
+        """
+        if doc_id not in self._copied:
+            super().__setitem__(doc_id, _deep_copy(super().__getitem__(doc_id)))
+            self._copied.add(doc_id)
+        return super().__getitem__(doc_id)
+
+
+def _apply(fields: Fields, doc: MutableMapping) -> None:
+    if callable(fields):
+        fields(doc)
+    else:
+        doc.update(fields)
+
+
+class AIOTable(Table):  # pylint: disable=too-many-public-methods
+    """
+    TinyDB table with coroutine versions of the query methods
+
+    Every `a<method>` (e.g. `asearch`, `ainsert_multiple`, `aupdate`) runs the
+    respective `Table` method in `executor` (the default executor of the event
+    loop if `None`), so scanning a large table doesn't block the event loop.
+    The executor has to be thread based: the table and its storage are shared
+    with the worker. Calls made through the same `lock` are run one at a time.
+
+    Like all other methods they can only be used inside `async with AIOTinyDB(...)`.
+    Don't mix them with the synchronous methods while a coroutine method is
+    still running.
+
+    Storages like `AIOJSONStorage` keep the documents in memory and return
+    the same objects on every read, so modifications copy the documents
+    they change, and those they store, instead of changing them in place.
+    A modification which raises half-way therefore leaves the database
+    unchanged. Returned documents are shallow copies like with TinyDB:
+    changing their fields doesn't change the database, changing nested
+    values in place does.
+
+    Modifying a `readonly` table raises `ReadonlyStorageError`.
+
+    `indexes` lists fields (e.g. `'email'`) or tuples of fields (e.g.
+    `('tenant', 'created')`) to index. `search`, `get`, `count` and
+    `contains` then only check the documents an index selects when the query
+    compares indexed fields with `==`, `<`, `<=`, `>`, `>=` or `one_of`, on
+    the leading fields of a compound index, combined with `&` and `|`.
+    An index is built on the first query using it and kept up to date by the
+    methods of the table; other queries still check every document. Unlike
+    a full scan, which raises `TypeError`, a range query skips documents
+    whose field has a type that can't be compared with the query's value.
+
+    Results of `search` are also stored in `result_cache` if one is given,
+    which outlives the table (see `AIOTinyDB`).
+    """
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        storage: Storage,
+        name: str,
+        *args: Any,
+        executor: Optional[Executor] = None,
+        lock: Optional[asyncio.Lock] = None,
+        readonly: bool = False,
+        indexes: Optional[Sequence[IndexSpec]] = None,
+        result_cache: Optional[ResultCache] = None,
+        **kwargs: Any
+    ) -> None:
+        self._executor = executor
+        self._result_cache = result_cache
+        self._lock = lock if lock is not None else asyncio.Lock()
+        self._readonly = readonly
+        self._indexes: List[Index] = []
+        super().__init__(storage, name, *args, **kwargs)
+        self.set_indexes(indexes or ())
+
+    @property
+    def indexes(self) -> Tuple[Tuple[str, ...], ...]:
+        """
+        Fields of the indexes of this table
+        """
+        return tuple(index.fields for index in self._indexes)
+
+    def set_indexes(self, indexes: Sequence[IndexSpec]) -> None:
+        """
+        Replace the indexes of this table
+        """
+        fields = tuple(normalize(spec) for spec in indexes)
+        if fields != self.indexes:
+            self._indexes = [Index(index_fields, self._read_table) for index_fields in fields]
+
+    def _candidates(self, cond: QueryLike) -> Optional[Set[str]]:
+        """
+        IDs of the documents that may match `cond` according to the indexes
+        """
+        return candidates(self._indexes, cond)
+
+    def _reindex(self, doc_ids: Iterable[int]) -> None:
+        if not self._indexes:
+            return
+        table = self._read_table()
+        for doc_id in map(str, doc_ids):
+            for index in self._indexes:
+                index.add(doc_id, table[doc_id])
+
+    def _unindex(self, doc_ids: Iterable[int]) -> None:
+        for doc_id in map(str, doc_ids):
+            for index in self._indexes:
+                index.discard(doc_id)
+
+    def _indexed_docs(self, cond: QueryLike, doc_ids: Set[str]) -> List[Document]:
+        table = self._read_table()
+        return [
+            self.document_class(table[doc_id], self.document_id_class(doc_id))
+            for doc_id in sorted(doc_ids, key=self.document_id_class)
+            if cond(table[doc_id])
+        ]
+
+    def search(self, cond: QueryLike) -> List[Document]:
+        cache = self._result_cache
+        generation: Optional[int] = getattr(self._storage, 'generation', None)
+        is_cacheable: Callable[[], bool] = getattr(cond, 'is_cacheable', lambda: True)
+        if cache is None or generation is None or not is_cacheable():
+            return self._search(cond)
+        docs = cache.get(self.name, cond, generation)
+        if docs is None:
+            docs = self._search(cond)
+            cache.put(self.name, cond, generation, docs)
+        return docs
+
+    def _search(self, cond: QueryLike) -> List[Document]:
+        doc_ids = self._candidates(cond)
+        if doc_ids is None:
+            return super().search(cond)
+        cached = self._query_cache.get(cond)
+        if cached is not None:
+            return cached[:]
+        docs = self._indexed_docs(cond, doc_ids)
+        self._query_cache[cond] = docs[:]
+        return docs
+
+    def get(  # type: ignore[override]
+        self,
+        cond: Optional[QueryLike] = None,
+        doc_id: Optional[int] = None,
+        doc_ids: Optional[List] = None
+    ) -> Optional[Union[Document, List[Document]]]:
+        if cond is not None and doc_id is None and doc_ids is None:
+            candidate_ids = self._candidates(cond)
+            if candidate_ids is not None:
+                docs = self._indexed_docs(cond, candidate_ids)
+                return docs[0] if docs else None
+        return super().get(cond, doc_id, doc_ids)  # type: ignore[arg-type]
+
+    def insert(self, document: Mapping) -> int:
+        doc_id = super().insert(document)
+        self._reindex([doc_id])
+        return doc_id
+
+    def insert_multiple(self, documents: Iterable[Mapping]) -> List[int]:
+        doc_ids = super().insert_multiple(documents)
+        self._reindex(doc_ids)
+        return doc_ids
+
+    def update(
+        self,
+        fields: Fields,
+        cond: Optional[QueryLike] = None,
+        doc_ids: Optional[Iterable[int]] = None,
+    ) -> List[int]:
+        # like `Table.update`, but only the matching documents are copied
+        # and changed
+        requested = list(doc_ids) if doc_ids is not None else None
+        updated: List[int] = []
+
+        def updater(table: Dict[int, Mapping]) -> None:
+            assert isinstance(table, _CopyOnWrite)
+            if requested is not None:
+                updated.extend(doc_id for doc_id in requested if doc_id in table)
+            else:
+                updated.extend(doc_id for doc_id in list(table)
+                               if cond is None or cond(table[doc_id]))
+            for doc_id in updated:
+                _apply(fields, table.for_update(doc_id))
+        self._update_table(updater)
+        self._reindex(updated)
+        return updated
+
+    def update_multiple(self, updates: Iterable[Tuple[Fields, QueryLike]]) -> List[int]:
+        updates = list(updates)
+        updated: List[int] = []
+
+        def updater(table: Dict[int, Mapping]) -> None:
+            assert isinstance(table, _CopyOnWrite)
+            for doc_id in list(table):
+                for fields, cond in updates:
+                    if cond(table[doc_id]):
+                        updated.append(doc_id)
+                        _apply(fields, table.for_update(doc_id))
+        self._update_table(updater)
+        self._reindex(updated)
+        return updated
+
+    def remove(
+        self,
+        cond: Optional[QueryLike] = None,
+        doc_ids: Optional[Iterable[int]] = None,
+    ) -> List[int]:
+        removed = super().remove(cond, doc_ids)
+        self._unindex(removed)
+        return removed
+
+    def truncate(self) -> None:
+        super().truncate()
+        for index in self._indexes:
+            index.reset()
+
+    def clear_cache(self) -> None:
+        super().clear_cache()
+        if self._result_cache is not None:
+            self._result_cache.invalidate(self.name)
+
+    def _update_table(self, updater: Callable[[Dict[int, Mapping]], None]) -> None:
+        if self._readonly:
+            raise ReadonlyStorageError(f'Table {self.name!r} is opened for reading only')
+
+        # like `Table._update_table`, with a table copying what's changed
+        tables = self._storage.read()
+        if tables is None:
+            tables = {}
+        try:
+            raw_table = tables[self.name]
+        except KeyError:
+            raw_table = {}
+        table = _CopyOnWrite(
+            (self.document_id_class(doc_id), doc) for doc_id, doc in raw_table.items())
+        updater(table)
+        # only reached if the update succeeded
+        tables[self.name] = {str(doc_id): doc for doc_id, doc in table.items()}
+        self._storage.write(tables)
+        self.clear_cache()
+
+    async def _run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """
+        Run `func` in the executor while holding the lock
+
+        If the calling task is cancelled, the cancellation is only raised
+        once `func` returned.
+        """
+        loop = asyncio.get_event_loop()
+        async with self._lock:
+            future = loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs))
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                # the thread can't be stopped, it has to finish before the
+                # lock is released and the session may end
+                while not future.done():
+                    try:
+                        await asyncio.wait([future])
+                    except asyncio.CancelledError:
+                        pass
+                raise
+
+    async def ainsert(self, document: Mapping) -> int:
+        """Coroutine version of `insert`"""
+        return await self._run(self.insert, document)
+
+    async def ainsert_multiple(self, documents: Iterable[Mapping]) -> List[int]:
+        """Coroutine version of `insert_multiple`"""
+        return await self._run(self.insert_multiple, documents)
+
+    async def aall(self) -> List[Document]:
+        """Coroutine version of `all`"""
+        return await self._run(self.all)
+
+    async def asearch(self, cond: QueryLike) -> List[Document]:
+        """Coroutine version of `search`"""
+        return await self._run(self.search, cond)
+
+    async def aget(self, *args: Any, **kwargs: Any) -> Any:
+        """Coroutine version of `get`, takes the same arguments"""
+        return await self._run(self.get, *args, **kwargs)
+
+    async def acontains(
+        self,
+        cond: Optional[QueryLike] = None,
+        doc_id: Optional[int] = None
+    ) -> bool:
+        """Coroutine version of `contains`"""
+        return await self._run(self.contains, cond, doc_id)
+
+    async def aupdate(
+        self,
+        fields: Fields,
+        cond: Optional[QueryLike] = None,
+        doc_ids: Optional[Iterable[int]] = None,
+    ) -> List[int]:
+        """Coroutine version of `update`"""
+        return await self._run(self.update, fields, cond, doc_ids)
+
+    async def aupdate_multiple(self, updates: Iterable[Tuple[Fields, QueryLike]]) -> List[int]:
+        """Coroutine version of `update_multiple`"""
+        return await self._run(self.update_multiple, updates)
+
+    async def aupsert(self, document: Mapping, cond: Optional[QueryLike] = None) -> List[int]:
+        """Coroutine version of `upsert`"""
+        return await self._run(self.upsert, document, cond)
+
+    async def aremove(
+        self,
+        cond: Optional[QueryLike] = None,
+        doc_ids: Optional[Iterable[int]] = None,
+    ) -> List[int]:
+        """Coroutine version of `remove`"""
+        return await self._run(self.remove, cond, doc_ids)
+
+    async def atruncate(self) -> None:
+        """Coroutine version of `truncate`"""
+        return await self._run(self.truncate)
+
+    async def acount(self, cond: QueryLike) -> int:
+        """Coroutine version of `count`"""
+        return await self._run(self.count, cond)
+
+    async def aiter(self, cond: Optional[QueryLike] = None) -> AsyncIterator[Document]:
+        """
+        Iterate over all documents, or the ones matching `cond`, one at a time
+
+        Unlike `all()` and `search()` no list of documents is built. A
+        storage which hasn't parsed its file yet may stream the documents
+        from it (see `AIOJSONStorage(streaming=True)`), so exports and scans
+        of large tables run in bounded memory.
+        """
+        if isinstance(self._storage, AIOStorage):
+            items = self._storage.aiter_table(self.name)
+        else:
+            items = _aiter_items(self._read_table())
+        count = 0
+        async for doc_id, doc in items:
+            if cond is None or cond(doc):
+                yield self.document_class(doc, self.document_id_class(doc_id))
+            count += 1
+            if count % _AITER_BATCH == 0:
+                await asyncio.sleep(0)
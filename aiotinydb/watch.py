@@ -0,0 +1,243 @@
+# aiotinydb - asyncio compatibility shim for tinydb
+
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Lesser General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Lesser General Public License for more details.
+
+# You should have received a copy of the GNU Lesser General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This module contains `AIOFileWatcher`, which notices changes of a database
+file by any process, and helpers to tell which of its tables changed.
+"""
+
+import asyncio
+import ctypes
+import ctypes.util
+import marshal
+import mmap
+import os
+import struct
+import sys
+import zlib
+from types import TracebackType
+from typing import Dict, List, NamedTuple, Optional, Tuple, Type
+import aiofiles
+from .compression import MAGIC_SIZE, ContentReader, detect_codec
+from .serializers import detect_serializer
+from .storage import FILELOCK_SUPPORTED, StrOrBytesPath, _in_thread, _index_tables
+
+if FILELOCK_SUPPORTED:
+    from .filelock import AIOFileLock
+
+try:
+    if not sys.platform.startswith('linux'):
+        raise OSError('inotify is only available on Linux')
+    _LIBC = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _inotify_init1 = _LIBC.inotify_init1
+    _inotify_add_watch = _LIBC.inotify_add_watch
+    INOTIFY_SUPPORTED = True
+except (OSError, AttributeError):  # pragma: no cover
+    INOTIFY_SUPPORTED = False  # pragma: no cover
+
+# IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+_IN_MASK = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200
+_IN_Q_OVERFLOW = 0x4000
+# wd, mask, cookie and length of the name following it
+_IN_EVENT = struct.Struct('iIII')
+
+
+class TableChange(NamedTuple):
+    """
+    A table which was `'created'`, `'changed'` or `'dropped'`
+    """
+    table: str
+    kind: str
+
+
+def _file_stamp(filename: str) -> Optional[Tuple[int, ...]]:
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def table_digests(fileno: int) -> Dict[str, int]:
+    """
+    Checksum of every table in the database file `fileno`
+
+    The tables of an uncompressed JSON file are found by scanning for
+    braces and their bytes are checksummed as they are, without parsing
+    them. Other files are parsed.
+    """
+    if not os.fstat(fileno).st_size:
+        return {}
+    head = os.pread(fileno, MAGIC_SIZE, 0)
+    codec = detect_codec(head)
+    if codec is None and detect_serializer(head).name != 'msgpack':
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as buffer:
+            return {name: zlib.crc32(buffer[start:end])
+                    for name, (start, end) in _index_tables(buffer).items()}
+    contents = ContentReader(lambda offset, size: os.pread(fileno, size, offset), codec).read_all()
+    data = detect_serializer(contents).loads(contents) or {}
+    return {name: zlib.crc32(marshal.dumps(table)) for name, table in data.items()}
+
+
+async def read_digests(filename: StrOrBytesPath) -> Dict[str, int]:
+    """
+    Checksum of every table in the database file `filename`, taken under
+    a shared lock so that no writer is halfway through
+    """
+    while True:
+        try:
+            file = await aiofiles.open(filename, 'rb')
+        except FileNotFoundError:
+            return {}
+        lock = AIOFileLock(file, shared=True) if FILELOCK_SUPPORTED else None
+        try:
+            if lock is not None:
+                await lock.acquire()
+            opened = os.fstat(file.fileno())
+            current = os.stat(filename)
+            if (current.st_dev, current.st_ino) == (opened.st_dev, opened.st_ino):
+                return await _in_thread(table_digests, file.fileno())
+        except FileNotFoundError:
+            return {}
+        finally:
+            if lock is not None and lock.locked():
+                lock.release()
+            await file.close()
+        # replaced by an atomic write in the meantime
+
+
+def diff_digests(old: Dict[str, int], new: Dict[str, int]) -> List[TableChange]:
+    """
+    The tables that differ between two results of `table_digests()`
+    """
+    changes = []
+    for name in sorted(old.keys() | new.keys()):
+        if name not in new:
+            changes.append(TableChange(name, 'dropped'))
+        elif name not in old:
+            changes.append(TableChange(name, 'created'))
+        elif old[name] != new[name]:
+            changes.append(TableChange(name, 'changed'))
+    return changes
+
+
+class AIOFileWatcher:
+    """
+    Waits for changes of a file by any process
+
+    On Linux the directory of the file is watched with inotify, whose
+    events are read by the event loop, so `wait()` wakes up right away
+    without polling or a thread. Otherwise, with `inotify=False`, or if no
+    inotify instance is available, the inode, modification time and size of
+    the file are checked every `poll_interval` seconds. That's also needed
+    for network file systems, which don't report changes made by other
+    hosts to inotify.
+
+    # Example
+    ```
+    async with AIOFileWatcher('test.json') as watcher:
+        while True:
+            await watcher.wait()
+            ...
+    ```
+    """
+    def __init__(
+        self, filename: StrOrBytesPath, *, poll_interval: float = 1.0, inotify: bool = True
+    ) -> None:
+        self._filename = os.fsdecode(filename)
+        self._poll_interval = poll_interval
+        self._inotify = inotify and INOTIFY_SUPPORTED
+        self._fd: Optional[int] = None
+        self._event: Optional[asyncio.Event] = None
+        self._stamp = _file_stamp(self._filename)
+
+    @property
+    def method(self) -> str:
+        """
+        `'inotify'` or `'poll'`, depending on how changes are noticed
+        """
+        return 'poll' if self._fd is None else 'inotify'
+
+    def start(self) -> None:
+        """
+        Start watching, from now on changes aren't missed
+        """
+        self._stamp = _file_stamp(self._filename)
+        if not self._inotify or self._fd is not None:
+            return
+        fd = _inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            # e.g. the limit of inotify instances was reached
+            return
+        dirname = os.path.dirname(os.path.abspath(self._filename))
+        if _inotify_add_watch(fd, os.fsencode(dirname), _IN_MASK) < 0:
+            os.close(fd)
+            return
+        self._fd = fd
+        self._event = asyncio.Event()
+        asyncio.get_event_loop().add_reader(fd, self._read_events)
+
+    def _read_events(self) -> None:
+        assert self._fd is not None and self._event is not None
+        try:
+            events = os.read(self._fd, 65536)
+        except BlockingIOError:
+            return
+        name = os.fsencode(os.path.basename(self._filename))
+        offset = 0
+        while offset < len(events):
+            _, mask, _, length = _IN_EVENT.unpack_from(events, offset)
+            offset += _IN_EVENT.size
+            if mask & _IN_Q_OVERFLOW or events[offset:offset + length].rstrip(b'\0') == name:
+                self._event.set()
+            offset += length
+
+    def close(self) -> None:
+        """
+        Stop watching
+        """
+        if self._fd is not None:
+            asyncio.get_event_loop().remove_reader(self._fd)
+            os.close(self._fd)
+            self._fd = None
+            self._event = None
+
+    async def __aenter__(self) -> 'AIOFileWatcher':
+        self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        exc_tb: Optional[TracebackType]
+    ) -> None:
+        self.close()
+
+    async def wait(self) -> None:
+        """
+        Return once the file was changed, created or removed since `start()`
+        or the last call
+        """
+        while True:
+            if self._event is not None:
+                await self._event.wait()
+                self._event.clear()
+            else:
+                await asyncio.sleep(self._poll_interval)
+            stamp = _file_stamp(self._filename)
+            if stamp != self._stamp:
+                self._stamp = stamp
+                return
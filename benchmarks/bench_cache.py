@@ -0,0 +1,60 @@
+"""
+Benchmark of the result cache kept across sessions.
+
+Runs the same dashboard queries in many short read sessions of a persistent
+database, with and without `result_cache_size`.
+
+    python benchmarks/bench_cache.py [--docs 20000] [--sessions 200]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from time import perf_counter
+from typing import Any, List
+
+from tinydb import where
+
+from aiotinydb import AIOTinyDB
+
+QUERIES: List[Any] = [
+    where('status') == 'open',
+    (where('status') == 'closed') & (where('priority') > 3),
+    where('owner').one_of(['alice', 'bob']),
+]
+
+
+async def run(filename: str, docs: int, sessions: int, cache_size: int) -> float:
+    db = AIOTinyDB(filename, persistent=True, result_cache_size=cache_size)
+    async with db:
+        if not len(db):
+            db.insert_multiple(
+                {'status': ('open', 'closed')[i % 2], 'priority': i % 5,
+                 'owner': ('alice', 'bob', 'carol')[i % 3]} for i in range(docs))
+    start = perf_counter()
+    for _ in range(sessions):
+        async with db.reading():
+            for query in QUERIES:
+                db.search(query)
+    elapsed = perf_counter() - start
+    await db.aclose()
+    return elapsed / sessions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--sessions', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        plain = asyncio.run(run(filename, args.docs, args.sessions, 0))
+        cached = asyncio.run(run(filename, args.docs, args.sessions, 128))
+    print(f'{"no cache [ms]":>14} {"cache [ms]":>11} {"speedup":>8}')
+    print(f'{plain * 1000:>14.3f} {cached * 1000:>11.3f} {plain / cached:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark of file size and session latency for each compression codec.
+
+Opens a database of N documents for reading (`async with db.reading()`)
+and for writing one document (`async with db`), uncompressed and with
+every installed codec.
+
+    python benchmarks/bench_compression.py [--docs 100000] [--repeat 5]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from aiotinydb import AIOTinyDB, Codec, GzipCodec
+from aiotinydb.compression import LZ4_SUPPORTED, ZSTD_SUPPORTED, LZ4Codec, ZstdCodec
+
+
+async def run(filename: str, docs: int, repeat: int, codec: Optional[Codec]) -> Tuple[float, ...]:
+    async with AIOTinyDB(filename, compression=codec) as db:
+        db.insert_multiple({'id': i, 'name': f'user{i}', 'tags': ['a', 'b', 'c']}
+                           for i in range(docs))
+    read, write = [], []
+    for _ in range(repeat):
+        db = AIOTinyDB(filename)
+        start = perf_counter()
+        async with db.reading():
+            len(db)
+        read.append(perf_counter() - start)
+        start = perf_counter()
+        async with db:
+            db.insert({'id': -1})
+        write.append(perf_counter() - start)
+    return os.path.getsize(filename) / 2**20, min(read), min(write)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    codecs: List[Optional[Codec]] = [None, GzipCodec(level=1), GzipCodec()]
+    if ZSTD_SUPPORTED:
+        codecs.append(ZstdCodec())
+    if LZ4_SUPPORTED:
+        codecs.append(LZ4Codec())
+    print(f'{"codec":>10} {"size [MiB]":>11} {"read [ms]":>10} {"write [ms]":>11}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for codec in codecs:
+            filename = os.path.join(tmp, f'db{len(os.listdir(tmp))}.json')
+            size, read, write = asyncio.run(run(filename, args.docs, args.repeat, codec))
+            name = 'none' if codec is None else codec.name
+            if isinstance(codec, GzipCodec):
+                name += f'-{codec.level}'
+            print(f'{name:>10} {size:>11.2f} {read * 1000:>10.1f} {write * 1000:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Benchmark of concurrent single-insert writer sessions with group commit.
+
+Starts N coroutines which each insert one document in their own
+`async with db` session, with and without `group_commit_window`.
+
+    python benchmarks/bench_group_commit.py [--docs 20000] [--writers 50]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from time import perf_counter
+from typing import Optional
+
+from aiotinydb import AIOTinyDB
+
+
+async def run(filename: str, docs: int, writers: int, window: Optional[float]) -> float:
+    async with AIOTinyDB(filename) as db:
+        db.insert_multiple({'id': i, 'name': f'user{i}'} for i in range(docs))
+    db = AIOTinyDB(filename, group_commit_window=window)
+
+    async def write(i: int) -> None:
+        async with db:
+            db.insert({'id': -i, 'name': 'new'})
+
+    start = perf_counter()
+    await asyncio.gather(*(write(i) for i in range(writers)))
+    return perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--writers', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        plain = asyncio.run(run(filename, args.docs, args.writers, None))
+        os.remove(filename)
+        grouped = asyncio.run(run(filename, args.docs, args.writers, 0))
+    print(f'{"writers":>8} {"plain [ms]":>11} {"group commit [ms]":>18} {"speedup":>8}')
+    print(f'{args.writers:>8} {plain * 1000:>11.1f} {grouped * 1000:>18.1f} '
+          f'{plain / grouped:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
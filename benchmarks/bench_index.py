@@ -0,0 +1,79 @@
+"""
+Benchmark of indexed queries against full-table scans.
+
+Runs equality, range and compound queries on a table with and without
+secondary indexes. The first query of the indexed table builds them.
+
+    python benchmarks/bench_index.py [--docs 100000] [--queries 100]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+from time import perf_counter
+from typing import Any, Callable, Dict, List
+
+from tinydb import where
+
+from aiotinydb import AIOTinyDB
+
+
+def make_docs(docs: int) -> List[Dict[str, Any]]:
+    rng = random.Random(0)
+    return [{'email': f'user{i}@example.com', 'tenant': f't{rng.randrange(100)}',
+             'created': rng.randrange(1_000_000)} for i in range(docs)]
+
+
+def created_range(rng: random.Random, docs: int) -> Any:
+    start = rng.randrange(999_000)
+    return (where('created') >= start) & (where('created') < start + 1000)
+
+
+QUERIES: Dict[str, Callable[[random.Random, int], Any]] = {
+    'email ==': lambda rng, docs: where('email') == f'user{rng.randrange(docs)}@example.com',
+    'created range': created_range,
+    'tenant & created': lambda rng, docs: (where('tenant') == f't{rng.randrange(100)}')
+    & (where('created') > rng.randrange(1_000_000)),
+}
+
+
+async def run(filename: str, docs: int, queries: int, indexes: List[Any]) -> Dict[str, float]:
+    timings = {}
+    async with AIOTinyDB(filename) as db:
+        table = db.table('bench', indexes=indexes)
+        table.insert_multiple(make_docs(docs))
+        start = perf_counter()
+        table.count(where('email') == '')
+        timings['first query'] = perf_counter() - start
+        for name, make_query in QUERIES.items():
+            rng = random.Random(1)
+            table.clear_cache()
+            start = perf_counter()
+            for _ in range(queries):
+                table.search(make_query(rng, docs))
+            timings[name] = (perf_counter() - start) / queries
+    return timings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        scan = asyncio.run(run(filename, args.docs, args.queries, []))
+        os.remove(filename)
+        indexed = asyncio.run(
+            run(filename, args.docs, args.queries, ['email', ('tenant', 'created'), 'created']))
+    print(f'{"query":>18} {"scan [ms]":>10} {"indexed [ms]":>13} {"speedup":>8}')
+    for name in ['first query', *QUERIES]:
+        print(f'{name:>18} {scan[name] * 1000:>10.2f} {indexed[name] * 1000:>13.3f} '
+              f'{scan[name] / indexed[name]:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark of N single-document inserts inside one `async with` session.
+
+Compares the parsed in-memory tree of `AIOJSONStorage` with a storage that
+re-parses and re-serializes the whole buffer on every `read()`/`write()`,
+which is how `AIOJSONStorage` used to behave.
+
+    python benchmarks/bench_inserts.py [--docs 20000] [--inserts 1 10 100 1000]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import tempfile
+from time import perf_counter
+from typing import Any, Dict, Optional
+
+from aiotinydb import AIOTinyDB
+from aiotinydb.storage import AIOJSONStorage
+
+
+class ReparsingJSONStorage(AIOJSONStorage):
+    """Keeps the database as text and parses it on every access."""
+    _text = ''
+
+    def read(self) -> Optional[Dict[str, Dict[str, Any]]]:
+        return json.load(io.StringIO(self._text)) if self._text else None
+
+    def write(self, data: Dict[str, Dict[str, Any]]) -> None:
+        self._text = json.dumps(data, **self.kwargs)
+        self._data = data
+
+    async def _load(self) -> None:
+        await super()._load()
+        self._text = '' if self._data is None else json.dumps(self._data)
+
+
+def populate(filename: str, docs: int) -> None:
+    table = {str(i): {'id': i, 'name': f'user{i}', 'tags': ['a', 'b', 'c']}
+             for i in range(1, docs + 1)}
+    with open(filename, 'w') as file:
+        json.dump({'_default': table}, file)
+
+
+async def session(filename: str, storage: type, inserts: int) -> float:
+    start = perf_counter()
+    async with AIOTinyDB(filename, storage=storage) as db:
+        for i in range(inserts):
+            db.insert({'id': -i, 'name': 'new'})
+    return perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--inserts', type=int, nargs='+', default=[1, 10, 100, 1000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        print(f'{"inserts":>8} {"reparsing [s]":>14} {"in-memory [s]":>14} {"speedup":>8}')
+        for inserts in args.inserts:
+            populate(filename, args.docs)
+            before = asyncio.run(session(filename, ReparsingJSONStorage, inserts))
+            populate(filename, args.docs)
+            after = asyncio.run(session(filename, AIOJSONStorage, inserts))
+            print(f'{inserts:>8} {before:>14.3f} {after:>14.3f} {before / after:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
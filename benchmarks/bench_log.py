@@ -0,0 +1,65 @@
+"""
+Benchmark of many short sessions, each inserting a single document.
+
+Compares `AIOJSONStorage`, which rewrites the whole file at the end of every
+session, with `AIOLogStorage`, which appends the new document to a log.
+
+    python benchmarks/bench_log.py [--docs 20000] [--sessions 200] [--fsync none]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from time import perf_counter
+from typing import Any
+
+from aiotinydb import AIOTinyDB
+from aiotinydb.storage import AIOJSONStorage, AIOLogStorage
+
+
+def populate(filename: str, docs: int) -> None:
+    table = {str(i): {'id': i, 'name': f'user{i}', 'tags': ['a', 'b', 'c']}
+             for i in range(1, docs + 1)}
+    with open(filename, 'w') as file:
+        json.dump({'_default': table}, file)
+    if os.path.exists(filename + '.log'):
+        os.remove(filename + '.log')
+
+
+async def sessions(filename: str, storage: type, count: int, **kwargs: Any) -> float:
+    db = AIOTinyDB(filename, storage=storage, persistent=True, **kwargs)
+    start = perf_counter()
+    for i in range(count):
+        async with db:
+            db.insert({'id': -i, 'name': 'new'})
+        # written by every session, the documents are kept parsed though
+        await db.flush()
+    await db.aclose()
+    return perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--sessions', type=int, default=200)
+    parser.add_argument('--fsync', choices=('none', 'file', 'full'), default='none')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        populate(filename, args.docs)
+        json_time = asyncio.run(
+            sessions(filename, AIOJSONStorage, args.sessions, fsync=args.fsync))
+        populate(filename, args.docs)
+        log_time = asyncio.run(
+            sessions(filename, AIOLogStorage, args.sessions, fsync=args.fsync))
+        print(f'{"storage":>16} {"total [s]":>10} {"per session [ms]":>17}')
+        for name, total in (('AIOJSONStorage', json_time), ('AIOLogStorage', log_time)):
+            print(f'{name:>16} {total:>10.3f} {total / args.sessions * 1000:>17.2f}')
+        print(f'speedup: {json_time / log_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
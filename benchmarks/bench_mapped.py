@@ -0,0 +1,57 @@
+"""
+Benchmark of reading one small table from a large read-only database.
+
+Compares `AIOImmutableJSONStorage`, which parses the whole file, with
+`AIOMappedJSONStorage`, which maps it and decodes only the requested table,
+once while building its index and once with the cached index.
+
+    python benchmarks/bench_mapped.py [--docs 200000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+from time import perf_counter
+from typing import Any
+
+from aiotinydb import AIOTinyDB
+from aiotinydb.storage import AIOImmutableJSONStorage, AIOMappedJSONStorage
+
+
+def populate(filename: str, docs: int) -> None:
+    events = {str(i): {'id': i, 'name': f'event{i}', 'tags': ['a', 'b', 'c']}
+              for i in range(1, docs + 1)}
+    sessions = {'1': {'user': 'admin'}}
+    with open(filename, 'w') as file:
+        json.dump({'events': events, 'sessions': sessions}, file)
+
+
+async def session(filename: str, storage: type, **kwargs: Any) -> float:
+    start = perf_counter()
+    async with AIOTinyDB(filename, storage=storage, **kwargs) as db:
+        assert len(db.table('sessions')) == 1
+    return perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        populate(filename, args.docs)
+        print(f'file size: {os.path.getsize(filename) / 1024 ** 2:.1f} MiB')
+        results = [
+            ('immutable', asyncio.run(session(filename, AIOImmutableJSONStorage))),
+            ('mapped', asyncio.run(session(filename, AIOMappedJSONStorage))),
+            ('mapped, cached index', asyncio.run(session(filename, AIOMappedJSONStorage))),
+        ]
+        for name, duration in results:
+            print(f'{name:>22} {duration * 1000:>10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
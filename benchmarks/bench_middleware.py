@@ -0,0 +1,50 @@
+"""
+Benchmark of the background-flushing caching middleware.
+
+Runs many short sessions which insert one document each into a database,
+written at the end of every session or coalesced by `AIOCachingMiddleware`.
+
+    python benchmarks/bench_middleware.py [--docs 20000] [--sessions 200]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from time import perf_counter
+from typing import Any
+
+from aiotinydb import AIOJSONStorage, AIOTinyDB
+from aiotinydb.middleware import AIOCachingMiddleware
+
+
+async def run(filename: str, docs: int, sessions: int, storage: Any) -> float:
+    async with AIOTinyDB(filename) as db:
+        db.insert_multiple({'int': i, 'char': 'abc'} for i in range(docs))
+    db = AIOTinyDB(filename, storage=storage)
+    start = perf_counter()
+    for i in range(sessions):
+        async with db:
+            db.insert({'int': i})
+    await db.aclose()
+    return (perf_counter() - start) / sessions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=20000)
+    parser.add_argument('--sessions', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        plain = asyncio.run(run(filename, args.docs, args.sessions, AIOJSONStorage))
+        os.remove(filename)
+        cached = asyncio.run(run(filename, args.docs, args.sessions,
+                                 AIOCachingMiddleware(AIOJSONStorage)))
+    print(f'{"plain [ms]":>11} {"middleware [ms]":>16} {"speedup":>8}')
+    print(f'{plain * 1000:>11.3f} {cached * 1000:>16.3f} {plain / cached:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
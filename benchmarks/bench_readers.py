@@ -0,0 +1,72 @@
+"""
+Benchmark of concurrent read sessions from several processes on one file.
+
+Every process opens the database `--sessions` times and keeps each session
+open for `--hold` seconds, like a request handler would. Readers using an
+exclusive lock (`access_mode='r+'`, the default) queue behind each other,
+readers using a shared lock (`access_mode='r'`) don't.
+
+    python benchmarks/bench_readers.py [--processes 16] [--sessions 20]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+from time import perf_counter
+
+from aiotinydb import AIOTinyDB
+
+
+def populate(filename: str, docs: int) -> None:
+    table = {str(i): {'id': i, 'name': f'user{i}'} for i in range(1, docs + 1)}
+    with open(filename, 'w') as file:
+        json.dump({'_default': table}, file)
+
+
+def reader(filename: str, access_mode: str, sessions: int, hold: float) -> None:
+    async def run() -> None:
+        db = AIOTinyDB(filename, access_mode=access_mode)
+        for _ in range(sessions):
+            async with db:
+                db.get(doc_id=1)
+                await asyncio.sleep(hold)
+    asyncio.run(run())
+
+
+def measure(filename: str, access_mode: str, args: argparse.Namespace) -> float:
+    processes = [
+        multiprocessing.Process(
+            target=reader, args=(filename, access_mode, args.sessions, args.hold))
+        for _ in range(args.processes)
+    ]
+    start = perf_counter()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    return perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--processes', type=int, default=16)
+    parser.add_argument('--sessions', type=int, default=20)
+    parser.add_argument('--hold', type=float, default=0.005)
+    parser.add_argument('--docs', type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        populate(filename, args.docs)
+        total = args.processes * args.sessions
+        print(f'{"lock":>10} {"time [s]":>9} {"sessions/s":>11}')
+        for name, access_mode in (('exclusive', 'r+'), ('shared', 'r')):
+            duration = measure(filename, access_mode, args)
+            print(f'{name:>10} {duration:>9.3f} {total / duration:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Benchmark of the serializers across database sizes.
+
+Measures dump time, load time and file size for every serializer that can
+be used here (msgpack and orjson are optional).
+
+    python benchmarks/bench_serializers.py [--docs 1000 10000 100000] [--repeat 3]
+"""
+
+import argparse
+from time import perf_counter
+from typing import Any, Dict, List
+
+from aiotinydb.serializers import (
+    MSGPACK_SUPPORTED, ORJSON_SUPPORTED, JSONSerializer, MsgPackSerializer, ORJSONSerializer,
+    Serializer,
+)
+
+
+def make_data(docs: int) -> Dict[str, Dict[str, Any]]:
+    return {'_default': {
+        str(i): {'id': i, 'name': f'user{i}', 'score': i / 7, 'tags': ['a', 'b', 'c'],
+                 'address': {'street': f'{i} Main St', 'zip': f'{i % 100000:05}'}}
+        for i in range(1, docs + 1)}}
+
+
+def best_of(repeat: int, func: Any, *args: Any) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func(*args)
+        timings.append(perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    serializers: List[Serializer] = [JSONSerializer()]
+    if ORJSON_SUPPORTED:
+        serializers.append(ORJSONSerializer())
+    if MSGPACK_SUPPORTED:
+        serializers.append(MsgPackSerializer())
+
+    print(f'{"docs":>8} {"serializer":>10} {"dump [ms]":>10} {"load [ms]":>10} {"size [kB]":>10}')
+    for docs in args.docs:
+        data = make_data(docs)
+        for serializer in serializers:
+            contents = serializer.dumps(data)
+            dump = best_of(args.repeat, serializer.dumps, data)
+            load = best_of(args.repeat, serializer.loads, contents)
+            print(f'{docs:>8} {serializer.name:>10} {dump * 1000:>10.1f} {load * 1000:>10.1f} '
+                  f'{len(contents) / 1024:>10.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Benchmark of the memory of many worker processes reading one database.
+
+Every worker opens the database with `persistent=True`, looks documents up
+by ID and runs a query, then reports its proportional set size (PSS, its
+share of shared pages) while all workers are still alive. With
+`AIOImmutableJSONStorage` every worker holds its own parsed copy, with
+`AIOSnapshotStorage` they share the pages of the mapped snapshot. Linux
+only, as PSS is read from `/proc/self/smaps_rollup`.
+
+    python benchmarks/bench_snapshot.py [--docs 200000] [--workers 1,4,8]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+from time import perf_counter
+from typing import Any, List, Tuple
+
+from tinydb import where
+
+from aiotinydb import AIOImmutableJSONStorage, AIOSnapshotStorage, AIOTinyDB
+
+STORAGES = {'immutable': AIOImmutableJSONStorage, 'snapshot': AIOSnapshotStorage}
+
+
+def populate(filename: str, docs: int) -> None:
+    table = {str(i): {'id': i, 'name': f'user{i}', 'tags': ['a', 'b', 'c']}
+             for i in range(1, docs + 1)}
+    with open(filename, 'w') as file:
+        json.dump({'_default': table}, file)
+
+
+def pss() -> int:
+    with open('/proc/self/smaps_rollup') as file:
+        for line in file:
+            if line.startswith('Pss:'):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def worker(filename: str, storage: str, docs: int, barrier: Any) -> Tuple[int, float, float]:
+    async def run() -> Tuple[int, float, float]:
+        db = AIOTinyDB(filename, storage=STORAGES[storage], persistent=True)
+        async with db:
+            start = perf_counter()
+            for doc_id in range(1, docs + 1, max(docs // 1000, 1)):
+                db.get(doc_id=doc_id)
+            lookup = (perf_counter() - start) / min(docs, 1000)
+            start = perf_counter()
+            db.search(where('id') == docs // 2)
+            scan = perf_counter() - start
+        # measured while all workers hold the database, so shared pages are split
+        barrier.wait()
+        memory = pss()
+        barrier.wait()
+        await db.aclose()
+        return memory, lookup, scan
+    return asyncio.run(run())
+
+
+def measure(filename: str, storage: str, docs: int, workers: int) -> List[Tuple[int, float, float]]:
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        barrier = manager.Barrier(workers)
+        with context.Pool(workers) as pool:
+            return pool.starmap(worker, [(filename, storage, docs, barrier)] * workers)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=200000)
+    parser.add_argument('--workers', type=lambda value: [int(n) for n in value.split(',')],
+                        default=[1, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        populate(filename, args.docs)
+        print(f'file: {os.path.getsize(filename) / 2**20:.1f} MiB')
+        print(f'{"storage":>10} {"workers":>8} {"total PSS [MiB]":>16} '
+              f'{"get [us]":>9} {"scan [ms]":>10}')
+        for storage in STORAGES:
+            for workers in args.workers:
+                results = measure(filename, storage, args.docs, workers)
+                total = sum(memory for memory, _, _ in results) / 2**20
+                lookup = sum(result[1] for result in results) / workers * 1e6
+                scan = sum(result[2] for result in results) / workers * 1000
+                print(f'{storage:>10} {workers:>8} {total:>16.1f} {lookup:>9.1f} {scan:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark of small write sessions on a large database, JSON vs SQLite.
+
+Every session updates one document of a database of N documents. The
+JSON storage rewrites the whole file, `AIOSQLiteStorage` only the
+changed row; with `persistent=True` it also keeps the loaded documents.
+Reported are the time and the bytes written per session.
+
+    python benchmarks/bench_sqlite.py [--docs 100000] [--sessions 20]
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+from time import perf_counter
+from typing import Any, Dict, Tuple
+
+from aiotinydb import AIOJSONStorage, AIOSQLiteStorage, AIOTinyDB, HistogramMetrics
+
+
+async def run(filename: str, docs: int, sessions: int, storage: Any,
+              kwargs: Dict[str, Any]) -> Tuple[float, float]:
+    metrics = HistogramMetrics()
+    db = AIOTinyDB(filename, storage=storage, metrics=metrics, **kwargs)
+    async with db:
+        db.insert_multiple({'id': i, 'name': f'user{i}', 'visits': 0} for i in range(docs))
+    metrics.reset()
+    start = perf_counter()
+    for i in range(sessions):
+        async with db:
+            db.update({'visits': i}, doc_ids=[i + 1])
+    elapsed = (perf_counter() - start) / sessions
+    await db.aclose()
+    return elapsed, metrics['write'].bytes / sessions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=100000)
+    parser.add_argument('--sessions', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"storage":>20} {"session [ms]":>13} {"written [bytes]":>16}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, storage, kwargs in [('json', AIOJSONStorage, {}),
+                                      ('sqlite', AIOSQLiteStorage, {}),
+                                      ('sqlite persistent', AIOSQLiteStorage,
+                                       {'persistent': True})]:
+            filename = os.path.join(tmp, name.replace(' ', '-'))
+            elapsed, written = asyncio.run(
+                run(filename, args.docs, args.sessions, storage, kwargs))
+            print(f'{name:>20} {elapsed * 1000:>13.1f} {written:>16,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark of peak memory when loading and scanning a large database.
+
+Compares reading the whole file before parsing it with the incremental
+parser of `streaming=True`, and `all()` with `aiter()` for a full scan.
+Memory is measured with `tracemalloc`, which slows everything down.
+
+    python benchmarks/bench_streaming.py [--docs 200000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import tracemalloc
+from time import perf_counter
+from typing import Tuple
+
+from aiotinydb import AIOTinyDB
+
+
+def populate(filename: str, docs: int) -> None:
+    table = {str(i): {'id': i, 'name': f'user{i}', 'tags': ['a', 'b', 'c']}
+             for i in range(1, docs + 1)}
+    with open(filename, 'w') as file:
+        json.dump({'_default': table}, file)
+
+
+async def load(filename: str, streaming: bool) -> int:
+    async with AIOTinyDB(filename, streaming=streaming) as db:
+        return len(db)
+
+
+async def scan(filename: str, streaming: bool) -> int:
+    async with AIOTinyDB(filename, streaming=streaming) as db:
+        if streaming:
+            return sum([1 async for doc in db.table('_default').aiter() if doc['id'] % 2])
+        return sum(1 for doc in db.all() if doc['id'] % 2)
+
+
+def measure(coro: object) -> Tuple[float, float]:
+    tracemalloc.start()
+    start = perf_counter()
+    asyncio.run(coro)  # type: ignore[arg-type]
+    elapsed = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 2**20
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        populate(filename, args.docs)
+        size = os.path.getsize(filename) / 2**20
+        print(f'file: {size:.1f} MiB')
+        print(f'{"":>16} {"time [s]":>9} {"peak [MiB]":>11}')
+        for name, func, streaming in [('load', load, False), ('load streaming', load, True),
+                                      ('scan all()', scan, False), ('scan aiter()', scan, True)]:
+            elapsed, peak = measure(func(filename, streaming))
+            print(f'{name:>16} {elapsed:>9.2f} {peak:>11.1f}')
+
+
+if __name__ == '__main__':
+    main()
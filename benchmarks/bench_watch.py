@@ -0,0 +1,104 @@
+"""
+Benchmark of noticing which tables of a database another process changed.
+
+Compares the checksums `db.watch()` takes of every table with parsing the
+file, how long it takes from the end of a write session until
+`AIOFileWatcher` wakes up, and until the change comes out of `db.watch()`,
+with inotify and with polling.
+
+    python benchmarks/bench_watch.py [--docs 200000] [--poll-interval 0.1]
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+from time import perf_counter
+from typing import Any, List
+
+from aiotinydb import AIOFileWatcher, AIOTinyDB
+from aiotinydb.watch import read_digests
+
+
+async def populate(filename: str, docs: int) -> None:
+    # written like the sessions below write it, so only changed tables differ
+    async with AIOTinyDB(filename) as db:
+        for t in range(10):
+            db.table(f'table{t}').insert_multiple(
+                {'id': i, 'name': f'user{i}', 'tags': ['a', 'b', 'c']} for i in range(docs // 10))
+
+
+async def compare(filename: str, repeat: int) -> None:
+    digests, parses = [], []
+    for _ in range(repeat):
+        start = perf_counter()
+        await read_digests(filename)
+        digests.append(perf_counter() - start)
+        start = perf_counter()
+        async with AIOTinyDB(filename, access_mode='r') as db:
+            db.tables()
+        parses.append(perf_counter() - start)
+    print(f'{"checksums":>20} {statistics.median(digests) * 1000:>10.1f} ms')
+    print(f'{"parse":>20} {statistics.median(parses) * 1000:>10.1f} ms')
+
+
+async def wakeup(filename: str, repeat: int, **kwargs: Any) -> float:
+    writer = AIOTinyDB(filename, persistent=True)
+    latencies: List[float] = []
+    async with AIOFileWatcher(filename, **kwargs) as watcher:
+        for i in range(repeat):
+            waiting = asyncio.ensure_future(watcher.wait())
+            async with writer:
+                writer.table('table0').update({'visits': i}, doc_ids=[1])
+            written = perf_counter()
+            await waiting
+            latencies.append(perf_counter() - written)
+    await writer.aclose()
+    return statistics.median(latencies)
+
+
+async def latency(filename: str, repeat: int, **kwargs: Any) -> float:
+    writer = AIOTinyDB(filename, persistent=True)
+    feed = AIOTinyDB(filename).watch(**kwargs)
+    latencies: List[float] = []
+    pending = asyncio.ensure_future(feed.__anext__())
+    # until the watcher has taken its first checksums
+    await asyncio.sleep(2)
+    for i in range(repeat):
+        async with writer:
+            writer.table('table0').update({'visits': i}, doc_ids=[1])
+        written = perf_counter()
+        await pending
+        latencies.append(perf_counter() - written)
+        pending = asyncio.ensure_future(feed.__anext__())
+        await asyncio.sleep(0.05)
+    pending.cancel()
+    await asyncio.gather(pending, return_exceptions=True)
+    await feed.aclose()
+    await writer.aclose()
+    return statistics.median(latencies)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--docs', type=int, default=200000)
+    parser.add_argument('--poll-interval', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, 'db.json')
+        asyncio.run(populate(filename, args.docs))
+        print(f'file: {os.path.getsize(filename) / 2**20:.1f} MiB, 10 tables')
+        asyncio.run(compare(filename, args.repeat))
+        for name, kwargs in [('inotify', {}), ('poll', {'inotify': False,
+                                                        'poll_interval': args.poll_interval})]:
+            elapsed = asyncio.run(wakeup(filename, args.repeat, **kwargs))
+            print(f'{name + " wake-up":>20} {elapsed * 1000:>10.1f} ms')
+            elapsed = asyncio.run(latency(filename, args.repeat, **kwargs))
+            print(f'{name + " change":>20} {elapsed * 1000:>10.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
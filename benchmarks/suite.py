@@ -0,0 +1,287 @@
+"""
+Benchmark suite writing machine-readable results for comparing commits.
+
+Every benchmark runs for each combination of database size (`--sizes`,
+number of documents) and document width (`--widths`, number of fields):
+
+- `open_close`: latency of an `async with` session which doesn't write,
+  with `AIOJSONStorage` and `AIOImmutableJSONStorage`
+- `insert`, `search`: documents inserted and queries run per second in
+  a session, including its write-back
+- `caching_flush`: latency of one-insert sessions with
+  `AIOCachingMiddleware` and how long its flush takes
+- `loop_lag`: the longest the event loop was blocked during a session
+  which reads, updates and writes every document, with and without
+  `executor='thread'`
+- `contention`: sessions per second of `--processes` processes writing
+  to one file at the same time, serialized by `AIOFileLock`
+
+    python benchmarks/suite.py [--sizes 1000,10000] [--widths 4,16] [--output bench.json]
+    python benchmarks/suite.py --compare old.json new.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+from time import perf_counter, time
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Iterator, List, Optional
+
+from tinydb import where
+
+from aiotinydb import AIOImmutableJSONStorage, AIOJSONStorage, AIOTinyDB
+from aiotinydb.middleware import AIOCachingMiddleware
+
+Result = Dict[str, Any]
+
+
+def documents(docs: int, width: int, start: int = 0) -> Iterator[Dict[str, Any]]:
+    for i in range(start, start + docs):
+        doc: Dict[str, Any] = {'id': i, 'group': i % 100}
+        for field in range(width - 2):
+            doc[f'f{field}'] = (f'value{i}', i * 0.5, [i, field], None)[field % 4]
+        yield doc
+
+
+async def populate(filename: str, docs: int, width: int) -> None:
+    async with AIOTinyDB(filename) as db:
+        db.truncate()
+        db.insert_multiple(documents(docs, width))
+
+
+async def timings(repeat: int, func: Callable[[], Awaitable[Any]]) -> List[float]:
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        await func()
+        durations.append(perf_counter() - start)
+    return durations
+
+
+def summary(durations: List[float]) -> Result:
+    return {'min_ms': min(durations) * 1000, 'median_ms': statistics.median(durations) * 1000}
+
+
+async def bench_open_close(filename: str, docs: int, width: int, repeat: int) -> List[Result]:
+    await populate(filename, docs, width)
+    results = []
+    for storage in (AIOJSONStorage, AIOImmutableJSONStorage):
+        db = AIOTinyDB(filename, storage=storage)
+
+        async def session() -> None:
+            async with db:
+                len(db)
+        results.append({'storage': storage.__name__, **summary(await timings(repeat, session))})
+    return results
+
+
+async def bench_insert(filename: str, docs: int, width: int, repeat: int) -> List[Result]:
+    await populate(filename, docs, width)
+    db = AIOTinyDB(filename)
+    batch = 100
+    counter = iter(range(docs, docs + batch * repeat, batch))
+
+    async def session() -> None:
+        async with db:
+            db.insert_multiple(documents(batch, width, next(counter)))
+    durations = await timings(repeat, session)
+    return [{'batch': batch, 'docs_per_s': batch / statistics.median(durations),
+             **summary(durations)}]
+
+
+async def bench_search(filename: str, docs: int, width: int, repeat: int) -> List[Result]:
+    await populate(filename, docs, width)
+    db = AIOTinyDB(filename)
+    queries = 20
+
+    async def session() -> None:
+        async with db.reading():
+            # different values, so TinyDB's query cache doesn't answer them
+            for group in range(queries):
+                db.search(where('group') == group)
+    durations = await timings(repeat, session)
+    return [{'queries': queries, 'queries_per_s': queries / statistics.median(durations),
+             **summary(durations)}]
+
+
+async def bench_caching_flush(filename: str, docs: int, width: int, repeat: int) -> List[Result]:
+    await populate(filename, docs, width)
+    db = AIOTinyDB(filename, storage=AIOCachingMiddleware(AIOJSONStorage, max_delay=60))
+    sessions, flushes = [], []
+    counter = iter(range(docs, docs + repeat * 10))
+    for _ in range(repeat):
+        for _ in range(10):
+            start = perf_counter()
+            async with db:
+                db.insert(next(documents(1, width, next(counter))))
+            sessions.append(perf_counter() - start)
+        start = perf_counter()
+        await db.flush()
+        flushes.append(perf_counter() - start)
+    await db.aclose()
+    return [{'session_median_ms': statistics.median(sessions) * 1000,
+             'flush_median_ms': statistics.median(flushes) * 1000}]
+
+
+async def bench_loop_lag(filename: str, docs: int, width: int, repeat: int) -> List[Result]:
+    results = []
+    for executor in (None, 'thread'):
+        await populate(filename, docs, width)
+        db = AIOTinyDB(filename, executor=executor)
+        loop = asyncio.get_running_loop()
+        lags: List[float] = []
+        done = False
+
+        async def probe() -> None:
+            while not done:
+                start = loop.time()
+                await asyncio.sleep(0.001)
+                lags.append(loop.time() - start - 0.001)
+
+        async def session() -> None:
+            async with db:
+                db.update({'touched': True})
+        task = asyncio.ensure_future(probe())
+        durations = await timings(repeat, session)
+        done = True
+        await task
+        results.append({'executor': executor or 'loop', 'max_lag_ms': max(lags) * 1000,
+                        **summary(durations)})
+    return results
+
+
+def _contend(filename: str, width: int, sessions: int, start: 'Any') -> List[float]:
+    async def run() -> List[float]:
+        db = AIOTinyDB(filename)
+        start.wait()
+        latencies = []
+        for _ in range(sessions):
+            begin = perf_counter()
+            async with db:
+                db.insert(next(documents(1, width, os.getpid())))
+            latencies.append(perf_counter() - begin)
+        return latencies
+    return asyncio.run(run())
+
+
+async def bench_contention(filename: str, docs: int, width: int, repeat: int,
+                           processes: int = 4) -> List[Result]:
+    await populate(filename, docs, width)
+    sessions = repeat * 4
+    context = multiprocessing.get_context('spawn')
+    manager = context.Manager()
+    # the clock starts once all workers are up
+    barrier = manager.Barrier(processes + 1)
+    with context.Pool(processes) as pool:
+        pending = pool.starmap_async(
+            _contend, [(filename, width, sessions, barrier)] * processes)
+        await asyncio.get_running_loop().run_in_executor(None, barrier.wait)
+        begin = perf_counter()
+        latencies = [latency for worker in pending.get() for latency in worker]
+        elapsed = perf_counter() - begin
+    manager.shutdown()
+    async with AIOTinyDB(filename) as db:
+        assert len(db) == docs + processes * sessions
+    return [{'processes': processes, 'sessions_per_s': len(latencies) / elapsed,
+             'latency_median_ms': statistics.median(latencies) * 1000,
+             'latency_max_ms': max(latencies) * 1000}]
+
+
+BENCHMARKS: Dict[str, Callable[..., Coroutine[Any, Any, List[Result]]]] = {
+    'open_close': bench_open_close,
+    'insert': bench_insert,
+    'search': bench_search,
+    'caching_flush': bench_caching_flush,
+    'loop_lag': bench_loop_lag,
+    'contention': bench_contention,
+}
+
+
+def metadata(args: argparse.Namespace) -> Result:
+    try:
+        commit: Optional[str] = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'timestamp': time(), 'python': sys.version.split()[0],
+            'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'sizes': args.sizes, 'widths': args.widths, 'repeat': args.repeat}
+
+
+def run(args: argparse.Namespace) -> Result:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.only or BENCHMARKS:
+            for docs in args.sizes:
+                for width in args.widths:
+                    filename = os.path.join(tmp, f'{name}-{docs}-{width}.json')
+                    kwargs = {'processes': args.processes} if name == 'contention' else {}
+                    rows = asyncio.run(
+                        BENCHMARKS[name](filename, docs, width, args.repeat, **kwargs))
+                    for row in rows:
+                        result = {'benchmark': name, 'docs': docs, 'width': width, **row}
+                        print(json.dumps(result), file=sys.stderr)
+                        results.append(result)
+    return {'meta': metadata(args), 'results': results}
+
+
+def key(result: Result) -> str:
+    params = [f'{name}={value}' for name, value in result.items()
+              if not isinstance(value, float)]
+    return ' '.join(params)
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """
+    Print the ratio new / old of every measurement found in both files
+    """
+    with open(old_path) as file:
+        old = {key(result): result for result in json.load(file)['results']}
+    with open(new_path) as file:
+        new = {key(result): result for result in json.load(file)['results']}
+    for name, result in new.items():
+        if name not in old:
+            continue
+        ratios = [f'{field} {old[name][field]:.2f} -> {value:.2f} ({value / old[name][field]:.2f}x)'
+                  for field, value in result.items()
+                  if isinstance(value, float) and old[name].get(field)]
+        print(f'{name}: ' + ', '.join(ratios))
+
+
+def integers(value: str) -> List[int]:
+    return [int(item) for item in value.split(',')]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=integers, default=[1000, 10000])
+    parser.add_argument('--widths', type=integers, default=[4, 16])
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--only', type=lambda value: value.split(','),
+                        help=f'comma-separated subset of {", ".join(BENCHMARKS)}')
+    parser.add_argument('--output', help='file to write the results to, stdout by default')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,21 @@
 """
 This example demonstrates that CPU-bound operations such as `db.search()`
 can be run in a process pool to prevent blocking the event loop.
+
+Searches go through an `AIOProcessPool`, whose workers parse the database
+once and keep it in memory for later queries.
 """
 
 import asyncio
 import concurrent.futures
 import os
 import tempfile
-from typing import TypeVar
+from typing import List, TypeVar
 
 from tinydb import where
 from tinydb.table import Document
 
-from aiotinydb import AIOTinyDB
+from aiotinydb import AIOProcessPool, AIOTinyDB
 
 TempFileT = TypeVar("TempFileT", bound=tempfile._TemporaryFileWrapper)
 
@@ -35,21 +38,11 @@ async def create_db_in_process_pool(filename: str) -> None:
         await asyncio.get_event_loop().run_in_executor(executor, create_db)
 
 
-async def search_in_process_pool(filename: str) -> list[Document]:
-    global search  # local functions can't be pickled
-
-    def search():
-        async def _search():
-            print("Starting search in process pool.")
-            async with AIOTinyDB(filename) as db:
-                return db.search(where("0xff") == 1024)
-
-        result = asyncio.run(_search())
-        print("Completed search.")
-        return result
-
-    with concurrent.futures.ProcessPoolExecutor() as executor:
-        return await asyncio.get_event_loop().run_in_executor(executor, search)
+async def search_in_process_pool(db: AIOTinyDB) -> List[Document]:
+    print("Starting search in process pool.")
+    result = await db.pooled().search(where("0xff") == 1024)
+    print("Completed search.")
+    return result
 
 
 async def still_running():
@@ -65,10 +58,15 @@ async def main():
     still_running_task = asyncio.create_task(still_running())
 
     file = tempfile.NamedTemporaryFile("r+", delete=False)
+    pool = AIOProcessPool()
     try:
         await create_db_in_process_pool(file.name)
-        await search_in_process_pool(file.name)
+        db = AIOTinyDB(file.name, process_pool=pool)
+        # the first search parses the file, the second one reuses it
+        await search_in_process_pool(db)
+        await search_in_process_pool(db)
     finally:
+        pool.shutdown()
         file.close()
         os.remove(file.name)
 
@@ -19,6 +19,12 @@ def mypy(session: nox.Session):
     session.run("mypy")
 
 
+@nox.session
+def bench(session: nox.Session):
+    session.install(".")
+    session.run("python", "benchmarks/suite.py", "--output", "bench.json", *session.posargs)
+
+
 @nox.session(python=["3.7", "3.8", "3.9", "3.10", "3.11", "pypy3"])
 def test(session: nox.Session):
     session.install("-e", ".[test]")
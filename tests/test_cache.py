@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+
+from tinydb import where
+
+from . import BaseCase
+from aiotinydb import AIODirectoryStorage, AIOTinyDB
+
+
+class TestResultCache(BaseCase):
+    def test_across_sessions(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, result_cache_size=10)
+            async with db:
+                db.insert_multiple({'int': i} for i in range(10))
+                self.assertEqual(len(db.search(where('int') > 4)), 5)
+            for _ in range(3):
+                async with db:
+                    self.assertEqual(len(db.search(where('int') > 4)), 5)
+            cache = db.result_cache
+            self.assertEqual((cache.hits, cache.misses, len(cache)), (3, 1, 1))
+            async with db:
+                db.search(where('int').map(lambda value: value + 1) > 5)
+            self.assertEqual((cache.hits, cache.misses, len(cache)), (3, 1, 1))
+        self.loop.run_until_complete(coro())
+
+    def test_invalidation(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, result_cache_size=10)
+            async with db:
+                db.insert({'int': 1})
+                db.table('other').insert({'int': 1})
+                db.search(where('int') == 1)
+                db.table('other').search(where('int') == 1)
+            async with db:
+                self.assertEqual(len(db.table('other').search(where('int') == 1)), 1)
+                db.insert({'int': 1})
+                self.assertEqual(len(db.search(where('int') == 1)), 2)
+            self.assertEqual(db.result_cache.hits, 1)
+            # changed by another process
+            async with AIOTinyDB(self.file.name) as other:
+                other.insert({'int': 1})
+            async with db:
+                self.assertEqual(len(db.search(where('int') == 1)), 3)
+                db.drop_table('other')
+                self.assertEqual(db.table('other').search(where('int') == 1), [])
+            self.assertEqual(db.result_cache.hits, 1)
+        self.loop.run_until_complete(coro())
+
+    def test_eviction(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, result_cache_size=2)
+            async with db:
+                db.insert({'int': 1})
+                for value in (1, 2, 3, 1):
+                    db.search(where('int') == value)
+            cache = db.result_cache
+            self.assertEqual((cache.hits, cache.misses, cache.evictions), (0, 4, 2))
+            self.assertEqual(len(cache), 2)
+        self.loop.run_until_complete(coro())
+
+    def test_directory(self):
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+
+        async def coro():
+            db = AIOTinyDB(path, storage=AIODirectoryStorage, result_cache_size=10)
+            async with db:
+                db.table('a').insert({'int': 1})
+            for _ in range(2):
+                async with db:
+                    self.assertEqual(len(db.table('a').search(where('int') == 1)), 1)
+            self.assertEqual(db.result_cache.hits, 1)
+            async with AIOTinyDB(path, storage=AIODirectoryStorage) as other:
+                other.table('b').insert({'int': 1})
+            async with db:
+                db.table('a').search(where('int') == 1)
+            self.assertEqual(db.result_cache.hits, 1)
+        self.loop.run_until_complete(coro())
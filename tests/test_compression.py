@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import unittest
+
+from tinydb import where
+
+from . import BaseCase
+from aiotinydb import (
+    AIOLogStorage, AIOMappedJSONStorage, AIOTinyDB, GzipCodec, MsgPackSerializer,
+)
+from aiotinydb.compression import (
+    LZ4_SUPPORTED, ZSTD_SUPPORTED, ContentReader, LZ4Codec, ZstdCodec, detect_codec,
+)
+from aiotinydb.serializers import MSGPACK_SUPPORTED
+
+DATA = {'_default': {str(i): {'int': i, 'char': 'ä'} for i in range(1, 1001)}}
+
+
+class TestCodecs(BaseCase):
+    def test_round_trip(self):
+        codecs = [GzipCodec(), GzipCodec(level=1)]
+        if ZSTD_SUPPORTED:
+            codecs.append(ZstdCodec())
+        if LZ4_SUPPORTED:
+            codecs.append(LZ4Codec())
+        contents = json.dumps(DATA).encode()
+        for codec in codecs:
+            compressed = codec.compress(contents)
+            self.assertLess(len(compressed), len(contents) / 5)
+            self.assertIsInstance(detect_codec(compressed), type(codec))
+            for chunk_size in (1, 100, 1 << 20):
+                reader = ContentReader(
+                    lambda offset, size: compressed[offset:offset + min(size, chunk_size)],
+                    codec)
+                self.assertEqual(reader.head()[:1], b'{')
+                self.assertEqual(reader.read_all(), contents)
+        self.assertIsNone(detect_codec(contents))
+        self.assertIsNone(detect_codec(b''))
+
+
+class TestCompressedStorage(BaseCase):
+    def read_file(self):
+        with open(self.file.name, 'rb') as f:
+            return f.read()
+
+    def test_detection(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name, compression=GzipCodec()) as db:
+                db.insert_multiple(DATA['_default'].values())
+            self.assertEqual(json.loads(gzip.decompress(self.read_file())), DATA)
+            # the compression of the file is kept without passing a codec
+            async with AIOTinyDB(self.file.name) as db:
+                self.assertIsInstance(db.storage.compression, GzipCodec)
+                self.assertEqual(len(db), 1000)
+                db.insert({'int': 0})
+            self.assertEqual(len(json.loads(gzip.decompress(self.read_file()))['_default']), 1001)
+            async with AIOTinyDB(self.file.name, streaming=True) as db:
+                self.assertEqual(len([doc async for doc in db.aiter(where('int') > 990)]), 10)
+                self.assertEqual(len(db.search(where('int') < 10)), 10)
+        self.loop.run_until_complete(coro())
+
+    @unittest.skipUnless(MSGPACK_SUPPORTED, 'msgpack is not installed')
+    def test_msgpack(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name, serializer=MsgPackSerializer(),
+                                 compression=GzipCodec()) as db:
+                db.insert({'int': 1})
+            for streaming in (False, True):
+                async with AIOTinyDB(self.file.name, streaming=streaming) as db:
+                    self.assertEqual(db.all(), [{'int': 1}])
+                    self.assertIsInstance(db.storage.serializer, MsgPackSerializer)
+        self.loop.run_until_complete(coro())
+
+    def test_storages(self):
+        self.addCleanup(os.remove, self.file.name + '.log')
+
+        async def coro():
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage, compact_size=0,
+                                 compression=GzipCodec()) as db:
+                db.insert({'int': 1})
+            # waits for the compaction
+            await db.aclose()
+            self.assertEqual(json.loads(gzip.decompress(self.read_file())),
+                             {'_default': {'1': {'int': 1}}})
+            with self.assertRaises(ValueError):
+                async with AIOTinyDB(self.file.name, storage=AIOMappedJSONStorage):
+                    pass
+        self.loop.run_until_complete(coro())
+        with self.assertRaises(ValueError):
+            AIOMappedJSONStorage(self.file.name, compression=GzipCodec())
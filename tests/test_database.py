@@ -1,9 +1,12 @@
 import asyncio
+import json
 import os
+import time
 from . import BaseCase
 import unittest
+from unittest import mock
 from aiotinydb import AIOTinyDB, DatabaseNotReady
-from aiotinydb.storage import AIOImmutableJSONStorage, AIOJSONStorage
+from aiotinydb.storage import AIOImmutableJSONStorage, AIOJSONStorage, _deep_copy
 from aiotinydb.exceptions import *
 from tinydb import where
 
@@ -55,6 +58,120 @@ class TestDatabase(BaseCase):
                 self.assertEqual(db.tables(), {AIOTinyDB.default_table_name})
         self.loop.run_until_complete(coro())
 
+    def test_parsed_once_written_on_exit(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                db.insert_multiple({'int': i} for i in range(10))
+                storage = db.storage
+                self.assertIs(storage.read(), storage.read())
+                with open(self.file.name) as f:
+                    self.assertEqual(f.read(), '')
+            with open(self.file.name) as f:
+                self.assertEqual(len(json.load(f)[AIOTinyDB.default_table_name]), 10)
+        self.loop.run_until_complete(coro())
+
+    def test_copy_on_write(self):
+        def fail_on_second(doc):
+            doc['a'] = 2
+            doc['nested']['b'] = 2
+            if doc['int'] == 1:
+                raise RuntimeError('boom')
+
+        async def coro():
+            db = AIOTinyDB(self.file.name, persistent=True)
+            async with db:
+                tags = ['x']
+                db.insert_multiple({'int': i, 'a': 1, 'nested': {'b': 1}, 'tags': tags}
+                                   for i in range(2))
+                tags.append('inserted')
+                with self.assertRaises(RuntimeError):
+                    db.update(fail_on_second)
+                db.get(doc_id=1)['a'] = 3
+                db.all()[0]['tags'] = []
+                self.assertEqual(db.get(doc_id=1), {'int': 0, 'a': 1, 'nested': {'b': 1}, 'tags': ['x']})
+                # only the changed documents are copied
+                with mock.patch('aiotinydb.table._deep_copy', wraps=_deep_copy) as copy:
+                    db.update({'a': 1}, where('int') == 0)
+                    db.all()
+                self.assertEqual(copy.call_count, 1)
+                # written by the next successful update
+                db.update({'other': True}, doc_ids=[2])
+            await db.aclose()
+            with open(self.file.name) as f:
+                docs = json.load(f)[AIOTinyDB.default_table_name]
+            self.assertEqual(docs['1'], {'int': 0, 'a': 1, 'nested': {'b': 1}, 'tags': ['x']})
+            self.assertEqual(docs['2']['nested'], {'b': 1})
+        self.loop.run_until_complete(coro())
+
+    def test_async_queries(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                ids = await db.ainsert_multiple({'int': i} for i in range(5))
+                self.assertEqual(await db.ainsert({'int': 5}), 6)
+                self.assertEqual(len(await db.aall()), 6)
+                self.assertEqual(await db.aupdate({'odd': True}, where('int').test(lambda v: v % 2 == 1)), [2, 4, 6])
+                self.assertEqual(await db.acount(where('odd') == True), 3)
+                self.assertTrue(await db.acontains(doc_id=ids[0]))
+                self.assertEqual((await db.aget(where('int') == 3))['odd'], True)
+                self.assertEqual(await db.aremove(where('int') > 3), [5, 6])
+                self.assertEqual(len(await db.asearch(where('int') < 10)), 4)
+                alt = db.table('alt')
+                await alt.aupsert({'name': 'x'}, where('name') == 'x')
+                await alt.aupdate_multiple([({'int': 1}, where('name') == 'x')])
+                self.assertEqual(await alt.aall(), [{'name': 'x', 'int': 1}])
+                await alt.atruncate()
+                self.assertEqual(len(alt), 0)
+        self.loop.run_until_complete(coro())
+
+    def test_async_query_does_not_block(self):
+        ticks = []
+
+        def slow_query(doc):
+            time.sleep(0.01)
+            return True
+
+        async def ticker():
+            while True:
+                await asyncio.sleep(0.001)
+                ticks.append(None)
+
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                db.insert_multiple({} for _ in range(20))
+                task = asyncio.ensure_future(ticker())
+                self.assertEqual(len(await db.asearch(slow_query)), 20)
+                task.cancel()
+        self.loop.run_until_complete(coro())
+        self.assertGreater(len(ticks), 10)
+
+    def test_cancelled_async_query(self):
+        finished = []
+
+        def slow_update(doc):
+            time.sleep(0.1)
+            doc['late'] = True
+            finished.append(True)
+
+        async def session(db):
+            async with db:
+                await db.aupdate(slow_update)
+
+        async def coro():
+            db = AIOTinyDB(self.file.name, persistent=True)
+            async with db:
+                db.insert({'i': 0})
+            task = asyncio.ensure_future(session(db))
+            await asyncio.sleep(0.02)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # not changed behind the back of the next session
+            self.assertEqual(finished, [True])
+            async with db:
+                self.assertEqual(db.all(), [{'i': 0, 'late': True}])
+            await db.aclose()
+        self.loop.run_until_complete(coro())
+
     def test_aiostorage_not_closeable(self):
         s = AIOImmutableJSONStorage(self.file.name)
         with self.assertRaises(NotOverridableError):
@@ -85,6 +202,29 @@ class TestDatabase(BaseCase):
                     db.insert({})
         self.loop.run_until_complete(coro())
 
+    def test_readonly_access_mode(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                db.insert({})
+            db = AIOTinyDB(self.file.name, access_mode='r')
+            async with db:
+                self.assertEqual(len(db), 1)
+                self.assertTrue(db.storage._lock.shared)
+            with self.assertRaises(ReadonlyStorageError):
+                async with db:
+                    db.insert({})
+            with self.assertRaises(ValueError):
+                AIOTinyDB(self.file.name, access_mode='w')
+        self.loop.run_until_complete(coro())
+
+    def test_lock_timeout(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name):
+                with self.assertRaises(asyncio.TimeoutError):
+                    async with AIOTinyDB(self.file.name, lock_timeout=0.05):
+                        pass  # pragma: no cover
+        self.loop.run_until_complete(coro())
+
     def test_alternate_tables(self):
         async def coro():
             async with AIOTinyDB(self.file.name) as db:
@@ -122,3 +262,116 @@ class TestDatabase(BaseCase):
                 assert len(db.all()) == 2
 
         self.loop.run_until_complete(coro())
+
+    def test_concurrent_readers(self):
+        db = AIOTinyDB(self.file.name)
+        events = []
+
+        async def read(name):
+            async with db.reading():
+                events.append(f'{name} start')
+                await asyncio.sleep(0.1)
+                self.assertEqual(len(db.search(where('int') == 1)), 1)
+                events.append(f'{name} end')
+
+        async def write():
+            await asyncio.sleep(0.05)
+            async with db:
+                events.append('writer')
+                db.insert({'int': 2})
+
+        async def coro():
+            async with db:
+                db.insert({'int': 1})
+            start = time.perf_counter()
+            await asyncio.gather(read('a'), read('b'), write())
+            self.assertLess(time.perf_counter() - start, 0.2)
+            self.assertEqual(events, ['a start', 'b start', 'a end', 'b end', 'writer'])
+            # both readers shared one opened storage
+            self.assertEqual(db.storage.skipped_flushes, 1)
+            async with db.reading():
+                self.assertEqual(len(db), 2)
+                with self.assertRaises(ReadonlyStorageError):
+                    db.insert({})
+                with self.assertRaises(ReadonlyStorageError):
+                    await db.table('alt').ainsert({})
+                with self.assertRaises(ReadonlyStorageError):
+                    db.drop_tables()
+            async with db:
+                db.insert({})
+                self.assertEqual(len(db), 3)
+        self.loop.run_until_complete(coro())
+
+
+class TestGroupCommit(BaseCase):
+    def read_table(self):
+        with open(self.file.name) as f:
+            return json.load(f)['_default']
+
+    def test_queued_writers(self):
+        async def write(db, i):
+            async with db:
+                db.insert({'int': i})
+            # written back once the session returns
+            self.assertIn({'int': i}, self.read_table().values())
+
+        async def coro():
+            db = AIOTinyDB(self.file.name, group_commit_window=0)
+            await asyncio.gather(*(write(db, i) for i in range(50)))
+            self.assertEqual(db.storage.flushes, 1)
+            batched = AIOTinyDB(self.file.name, group_commit_window=0, group_commit_size=10)
+            await asyncio.gather(*(write(batched, i) for i in range(50)))
+            self.assertEqual(batched.storage.flushes, 5)
+            self.assertEqual(len(self.read_table()), 100)
+        self.loop.run_until_complete(coro())
+
+    def test_window(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, group_commit_window=0.1)
+            start = time.perf_counter()
+
+            async def write(delay):
+                await asyncio.sleep(delay)
+                async with db:
+                    db.insert({})
+                return time.perf_counter() - start
+
+            finished = await asyncio.gather(write(0), write(0.05))
+            self.assertEqual(db.storage.flushes, 1)
+            self.assertGreaterEqual(min(finished), 0.1)
+            async with db.reading():
+                self.assertEqual(len(db), 2)
+            async with db:
+                db.insert({})
+            await db.flush()
+            self.assertEqual(len(self.read_table()), 3)
+        self.loop.run_until_complete(coro())
+
+    def test_failed_write_back(self):
+        async def write(db):
+            async with db:
+                db.insert({})
+
+        async def coro():
+            db = AIOTinyDB(self.file.name, group_commit_window=0)
+            with mock.patch.object(AIOJSONStorage, '_flush', side_effect=OSError('disk full')):
+                results = await asyncio.gather(*(write(db) for _ in range(3)),
+                                               return_exceptions=True)
+            self.assertEqual([type(result) for result in results], [OSError] * 3)
+        self.loop.run_until_complete(coro())
+
+    def test_cancelled_member(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, group_commit_window=0.1)
+
+            async def write():
+                async with db:
+                    db.insert({})
+
+            first = asyncio.ensure_future(write())
+            await asyncio.sleep(0.05)
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            await write()
+            self.assertEqual(len(self.read_table()), 2)
+        self.loop.run_until_complete(coro())
@@ -0,0 +1,145 @@
+import asyncio
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from aiotinydb import AIODirectoryStorage, AIOTinyDB, DatabaseConflictError, GzipCodec
+from aiotinydb.directory import _TableFile
+from aiotinydb.exceptions import ReadonlyStorageError
+
+
+class TestDirectory(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.path)
+
+    def db(self, **kwargs):
+        return AIOTinyDB(self.path, storage=AIODirectoryStorage, **kwargs)
+
+    def listdir(self):
+        return sorted(name for name in os.listdir(self.path) if name != '.lock')
+
+    def read_table(self, filename):
+        with open(os.path.join(self.path, filename)) as f:
+            return json.load(f)
+
+    def test_table_files(self):
+        async def coro():
+            async with self.db() as db:
+                db.insert({'int': 1})
+                db.table('a/b').insert_multiple({'int': i} for i in range(3))
+            self.assertEqual(self.listdir(), ['_default.json', 'a%2Fb.json'])
+            self.assertEqual(self.read_table('_default.json'), {'1': {'int': 1}})
+            async with self.db() as db:
+                self.assertEqual(db.tables(), {'_default', 'a/b'})
+                self.assertEqual(len(db.table('a/b')), 3)
+                db.table('a/b').remove(doc_ids=[1])
+            self.assertEqual(len(self.read_table('a%2Fb.json')), 2)
+        self.loop.run_until_complete(coro())
+
+    def test_dot_names(self):
+        async def coro():
+            async with self.db() as db:
+                for name in ('', '.hidden', '..'):
+                    db.table(name).insert({'name': name})
+            async with self.db() as db:
+                self.assertEqual(db.tables(), {'', '.hidden', '..'})
+                self.assertEqual(db.table('.hidden').all(), [{'name': '.hidden'}])
+                self.assertEqual(db.table('').all(), [{'name': ''}])
+        self.loop.run_until_complete(coro())
+
+    def test_only_changed_tables(self):
+        async def coro():
+            async with self.db() as db:
+                db.table('events').insert_multiple({'int': i} for i in range(100))
+                db.table('sessions').insert({'user': 'admin'})
+            events = os.stat(os.path.join(self.path, 'events.json'))
+            with mock.patch.object(_TableFile, 'load_now', autospec=True,
+                                   side_effect=_TableFile.load_now) as load:
+                async with self.db() as db:
+                    self.assertEqual(db.tables(), {'events', 'sessions'})
+                    self.assertEqual(load.call_count, 0)
+                    db.table('sessions').update({'user': 'root'})
+                self.assertEqual(load.call_count, 1)
+                self.assertEqual(db.storage.flushes, 1)
+            after = os.stat(os.path.join(self.path, 'events.json'))
+            self.assertEqual((events.st_ino, events.st_mtime_ns), (after.st_ino, after.st_mtime_ns))
+            self.assertEqual(self.read_table('sessions.json'), {'1': {'user': 'root'}})
+            async with self.db() as db:
+                self.assertEqual(len(db.table('events')), 100)
+            self.assertEqual(db.storage.skipped_flushes, 1)
+        self.loop.run_until_complete(coro())
+
+    def test_drop_tables(self):
+        async def coro():
+            async with self.db(atomic=True) as db:
+                for name in ('a', 'b', 'c'):
+                    db.table(name).insert({'name': name})
+            async with self.db() as db:
+                db.drop_table('a')
+            self.assertEqual(self.listdir(), ['b.json', 'c.json'])
+            async with self.db() as db:
+                db.drop_tables()
+                db.table('d').insert({'name': 'd'})
+            self.assertEqual(self.listdir(), ['d.json'])
+        self.loop.run_until_complete(coro())
+
+    def test_conflict(self):
+        async def coro():
+            with self.assertRaises(DatabaseConflictError):
+                async with self.db() as db:
+                    db.table('a').insert({'int': 1})
+                    db.table('new').insert({'int': 1})
+                    # created by another process ignoring the lock
+                    with open(os.path.join(self.path, 'new.json'), 'w') as f:
+                        json.dump({'1': {'int': 2}}, f)
+            self.assertEqual(self.read_table('new.json'), {'1': {'int': 2}})
+            # none of the session's new tables is kept
+            self.assertEqual(self.listdir(), ['new.json'])
+        self.loop.run_until_complete(coro())
+
+    def test_concurrent_new_table(self):
+        async def session(i):
+            async with self.db() as db:
+                db.table('new').insert({'int': i})
+                await asyncio.sleep(0.01)
+
+        async def coro():
+            await asyncio.gather(*(session(i) for i in range(3)))
+            self.assertEqual(sorted(doc['int'] for doc in self.read_table('new.json').values()),
+                             [0, 1, 2])
+        self.loop.run_until_complete(coro())
+
+    def test_readonly(self):
+        async def coro():
+            async with self.db(access_mode='r') as db:
+                self.assertEqual(db.tables(), set())
+            self.assertFalse(os.listdir(self.path))
+            async with self.db() as db:
+                db.insert({'int': 1})
+            async with self.db(access_mode='r') as db:
+                self.assertEqual(len(db), 1)
+                with self.assertRaises(ReadonlyStorageError):
+                    db.insert({'int': 2})
+        self.loop.run_until_complete(coro())
+
+    def test_compression(self):
+        async def coro():
+            async with self.db(compression=GzipCodec()) as db:
+                db.table('a').insert({'int': 1})
+            with open(os.path.join(self.path, 'a.json'), 'rb') as f:
+                self.assertEqual(json.loads(gzip.decompress(f.read())), {'1': {'int': 1}})
+            async with self.db() as db:
+                self.assertEqual(db.table('a').all(), [{'int': 1}])
+                db.table('b').insert({'int': 2})
+            # new tables are compressed like the others only with `compression`
+            self.assertEqual(self.read_table('b.json'), {'1': {'int': 2}})
+        self.loop.run_until_complete(coro())
@@ -20,6 +20,40 @@ class TestFileLock(BaseCase):
 
         self.loop.run_until_complete(coro())
 
+    def test_shared_filelock(self):
+        async def io_operation(shared):
+            async with aiofiles.open(self.file.name) as f, AIOFileLock(f, shared=shared):
+                await asyncio.sleep(0.5)
+
+        async def coro(*shared):
+            start_time = perf_counter()
+            await asyncio.gather(*(io_operation(s) for s in shared))
+            return perf_counter() - start_time
+
+        assert self.loop.run_until_complete(coro(True, True, True)) < 1
+        assert self.loop.run_until_complete(coro(True, False)) > 1
+
+    def test_timeout_and_cancel(self):
+        async def coro():
+            async with aiofiles.open(self.file.name) as f1, aiofiles.open(self.file.name) as f2:
+                async with AIOFileLock(f1):
+                    lock = AIOFileLock(f2, timeout=0.1)
+                    start_time = perf_counter()
+                    with self.assertRaises(asyncio.TimeoutError):
+                        await lock.acquire()
+                    assert 0.1 <= perf_counter() - start_time < 0.5
+                    task = asyncio.ensure_future(AIOFileLock(f2).acquire())
+                    await asyncio.sleep(0.1)
+                    task.cancel()
+                    with self.assertRaises(asyncio.CancelledError):
+                        await task
+                # nothing acquired the lock in the background after cancelling
+                await asyncio.sleep(0.1)
+                async with AIOFileLock(f1, timeout=0):
+                    pass
+
+        self.loop.run_until_complete(coro())
+
     def test_filelock_misc(self):
         async def coro():
             async with aiofiles.open(self.file.name) as f:
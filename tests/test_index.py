@@ -0,0 +1,107 @@
+import random
+
+from tinydb import Query, where
+from tinydb.table import Table
+
+from . import BaseCase
+from aiotinydb import AIOTinyDB
+from aiotinydb.index import Index, candidates
+
+
+def make_doc(rng):
+    doc = {'tenant': rng.choice(['a', 'b', 'c']), 'created': rng.randrange(100)}
+    if rng.random() < 0.8:
+        doc['score'] = rng.choice([rng.randrange(10), rng.random() * 10, True, False])
+    if rng.random() < 0.1:
+        doc['tenant'] = rng.choice([None, ['a'], {'a': 1}])
+    return doc
+
+
+class TestIndex(BaseCase):
+    def queries(self, rng):
+        tenant, created, score = where('tenant'), where('created'), where('score')
+        value = rng.randrange(100)
+        return [
+            tenant == 'a',
+            tenant == None,  # noqa: E711
+            tenant.one_of(['a', 'c']),
+            created == value,
+            created < value, created <= value, created > value, created >= value,
+            (created >= value) & (created < value + 20),
+            (tenant == 'b') & (created > value),
+            (tenant == 'b') & (created == value),
+            (tenant == 'b') & (created < value) & (score >= 5),
+            (tenant == 'a') | (created == value),
+            (tenant == 'a') & ((created == value) | (created == value + 1)),
+            score == True,  # noqa: E712
+            score == 1,
+            (score > 2.5) & (score <= 7),
+            (tenant == 'a') & ~(created == value),
+            created != value,
+            where('missing') == 1,
+        ]
+
+    def test_matches_full_scan(self):
+        rng = random.Random(42)
+        docs = [make_doc(rng) for _ in range(500)]
+
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                db.insert_multiple(docs)
+                plain = db.table('_default')
+                indexed = db.table('indexed', indexes=['tenant', ('tenant', 'created'), 'score'])
+                indexed.insert_multiple(docs)
+                for _ in range(20):
+                    for query in self.queries(rng):
+                        expected = Table.search(plain, query)
+                        self.assertEqual(indexed.search(query), expected, query)
+                        self.assertEqual(indexed.count(query), len(expected), query)
+                        self.assertEqual(indexed.get(query), expected[0] if expected else None)
+                        indexed.clear_cache()
+                    # keep both tables in sync through every kind of change
+                    doc_id, created, doc = rng.randrange(1, 500), rng.randrange(100), make_doc(rng)
+                    for table in (plain, indexed):
+                        table.update({'created': created}, doc_ids=[doc_id])
+                        table.update({'score': 3}, where('created') == doc_id % 100)
+                        table.remove(where('created') == 99)
+                        table.insert(dict(doc))
+        self.loop.run_until_complete(coro())
+
+    def test_uses_index(self):
+        checked = []
+
+        def counted(value):
+            checked.append(value)
+            return value == 5
+
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                table = db.table('t', indexes=['n'])
+                table.insert_multiple({'n': i % 10, 'm': i} for i in range(100))
+                self.assertEqual(len(table.search(where('n').test(counted) & (where('n') == 5))),
+                                 10)
+                self.assertEqual(len(checked), 10)
+                table.truncate()
+                table.insert({'n': 5})
+                self.assertEqual(table.count(where('n') == 5), 1)
+        self.loop.run_until_complete(coro())
+
+    def test_declared_once(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name)
+            async with db:
+                db.table('users', indexes=['email'])
+                db.table('_default', indexes=[('tenant', 'created')])
+            async with db:
+                self.assertEqual(db.table('users').indexes, (('email',),))
+                self.assertEqual(db.table('_default').indexes, (('tenant', 'created'),))
+        self.loop.run_until_complete(coro())
+
+    def test_range(self):
+        table = {str(i): {'tenant': t, 'created': i} for i, t in enumerate('aabbcc')}
+        index = Index(('tenant', 'created'), lambda: table)
+        self.assertEqual(index.range(['b']), {'2', '3'})
+        self.assertEqual(index.range(['b'], (2, False), None, 0), {'3'})
+        self.assertEqual(index.lookup(['c', 5]), {'5'})
+        self.assertIsNone(candidates([index], Query().created == 1))
+        self.assertIsNone(candidates([index], lambda doc: True))
@@ -0,0 +1,67 @@
+import asyncio
+import os
+
+from . import BaseCase
+from aiotinydb import AIOTinyDB, HistogramMetrics, Metrics
+from aiotinydb.metrics import Histogram
+
+
+class TestHistogram(BaseCase):
+    def test_quantile(self):
+        histogram = Histogram(buckets=(0.001, 0.01, 0.1))
+        for duration in [0.0005] * 90 + [0.05] * 9 + [2.0]:
+            histogram.add(duration, 10)
+        self.assertEqual(histogram.counts, [90, 0, 9, 1])
+        self.assertEqual(histogram.bytes, 1000)
+        self.assertEqual(histogram.quantile(0.5), 0.001)
+        self.assertEqual(histogram.quantile(0.95), 0.1)
+        self.assertEqual(histogram.quantile(1.0), 2.0)
+        self.assertEqual(Histogram().quantile(0.5), 0.0)
+
+
+class TestMetrics(BaseCase):
+    def test_phases(self):
+        metrics = HistogramMetrics()
+
+        async def coro():
+            db = AIOTinyDB(self.file.name, metrics=metrics)
+            self.assertIs(db.metrics, metrics)
+            async with db:
+                db.insert({'int': 1})
+            async with db.reading():
+                self.assertEqual(len(db), 1)
+        self.loop.run_until_complete(coro())
+        snapshot = metrics.snapshot()
+        size = os.path.getsize(self.file.name)
+        self.assertEqual(snapshot['session']['count'], 2)
+        self.assertEqual(snapshot['lock_wait']['count'], 2)
+        self.assertEqual(snapshot['flock_wait']['count'], 2)
+        # the empty file isn't parsed
+        self.assertEqual((snapshot['read']['count'], snapshot['read']['bytes']), (2, size))
+        self.assertEqual((snapshot['parse']['count'], snapshot['parse']['bytes']), (1, size))
+        self.assertEqual(snapshot['serialize']['bytes'], size)
+        self.assertEqual(snapshot['write']['bytes'], size)
+        self.assertGreaterEqual(metrics['session'].total, metrics['write'].total)
+        metrics.reset()
+        self.assertEqual(metrics.snapshot(), {})
+        self.assertEqual(metrics['session'].count, 0)
+
+    def test_lock_wait(self):
+        observed = []
+
+        class Recorder(Metrics):
+            def observe(self, phase, duration, size=None):
+                observed.append((phase, duration))
+
+        async def coro():
+            db = AIOTinyDB(self.file.name, metrics=Recorder())
+
+            async def write(delay):
+                async with db:
+                    await asyncio.sleep(delay)
+                    db.insert({'int': 1})
+            await asyncio.gather(write(0.05), write(0))
+        self.loop.run_until_complete(coro())
+        waits = sorted(duration for phase, duration in observed if phase == 'lock_wait')
+        self.assertEqual(len(waits), 2)
+        self.assertGreaterEqual(waits[1], 0.04)
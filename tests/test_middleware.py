@@ -1,7 +1,12 @@
+import asyncio
+import json
+
 from . import BaseCase
 from aiotinydb import AIOTinyDB
 from aiotinydb.storage import AIOJSONStorage
-from aiotinydb.middleware import AIOMiddleware, CachingMiddleware, AIOMiddlewareMixin
+from aiotinydb.middleware import (
+    AIOCachingMiddleware, AIOMiddleware, CachingMiddleware, AIOMiddlewareMixin,
+)
 from aiotinydb.exceptions import NotOverridableError
 from tinydb import TinyDB, JSONStorage
 from tinydb.middlewares import Middleware
@@ -14,6 +19,89 @@ class TestMiddleware(BaseCase):
                     pass
         self.loop.run_until_complete(test())
 
+    def test_caching_flush_counters(self):
+        async def test():
+            middleware = CachingMiddleware(AIOJSONStorage)
+            db = AIOTinyDB(self.file.name, storage=middleware)
+            async with db:
+                db.all()
+            async with db:
+                db.insert({})
+            assert (middleware.flushes, middleware.skipped_flushes) == (1, 1)
+            assert (middleware.storage.flushes, middleware.storage.skipped_flushes) == (1, 1)
+        self.loop.run_until_complete(test())
+
+    def test_background_flush(self):
+        async def test():
+            middleware = AIOCachingMiddleware(AIOJSONStorage, max_delay=0.05)
+            db = AIOTinyDB(self.file.name, storage=middleware)
+            async with db:
+                db.insert_multiple({'int': i} for i in range(3))
+                db.insert({'int': 3})
+            self.assertEqual((middleware.pending, middleware.storage.flushes), (2, 0))
+            async with db:
+                self.assertEqual(len(db), 4)
+            await asyncio.sleep(0.2)
+            self.assertEqual((middleware.pending, middleware.flushes), (0, 1))
+            self.assertEqual(len(self.read_table()), 4)
+            # the file was unlocked
+            async with AIOTinyDB(self.file.name, lock_timeout=1) as other:
+                self.assertEqual(len(other), 4)
+        self.loop.run_until_complete(test())
+
+    def test_max_pending(self):
+        async def test():
+            middleware = AIOCachingMiddleware(AIOJSONStorage, max_delay=100, max_pending=5)
+            db = AIOTinyDB(self.file.name, storage=middleware, atomic=True)
+            async with db:
+                for i in range(12):
+                    db.insert({'int': i})
+                    await asyncio.sleep(0.01)
+                self.assertEqual(len(self.read_table()), 10)
+                await middleware.flush()
+                self.assertEqual(len(self.read_table()), 12)
+            self.assertEqual(middleware.flushes, 3)
+        self.loop.run_until_complete(test())
+
+    def test_async_methods(self):
+        async def test():
+            middleware = AIOCachingMiddleware(AIOJSONStorage, max_delay=0.05, max_pending=3)
+            db = AIOTinyDB(self.file.name, storage=middleware)
+            async with db:
+                for i in range(4):
+                    await db.ainsert({'int': i})
+                await db.aupdate({'int': 10}, doc_ids=[1])
+                await asyncio.sleep(0.2)
+            self.assertEqual((middleware.pending, middleware.flushes), (0, 2))
+            self.assertEqual(len(self.read_table()), 4)
+            self.assertEqual(self.read_table()['1'], {'int': 10})
+        self.loop.run_until_complete(test())
+
+    def test_cancelled_session(self):
+        async def session(db, started):
+            async with db:
+                db.insert({'int': 1})
+                started.set()
+                await asyncio.sleep(100)
+
+        async def test():
+            middleware = AIOCachingMiddleware(AIOJSONStorage, max_delay=100)
+            db = AIOTinyDB(self.file.name, storage=middleware)
+            started = asyncio.Event()
+            task = asyncio.ensure_future(session(db, started))
+            await started.wait()
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertEqual(middleware.pending, 1)
+            await db.aclose()
+            self.assertEqual(self.read_table(), {'1': {'int': 1}})
+        self.loop.run_until_complete(test())
+
+    def read_table(self):
+        with open(self.file.name) as f:
+            return json.load(f)['_default']
+
     def test_not_cloaseable(self):
         with self.assertRaises(NotOverridableError):
             AIOMiddleware(JSONStorage).close()
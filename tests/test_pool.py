@@ -0,0 +1,84 @@
+import os
+import re
+
+from . import BaseCase
+from aiotinydb import AIOTinyDB, AIOProcessPool, DatabaseNotReady
+from aiotinydb.exceptions import ReadonlyStorageError
+from aiotinydb.pool import _SnapshotStorage, decode_query, encode_query
+from tinydb import Query, TinyDB, where
+from tinydb.storages import MemoryStorage
+
+
+def is_even(value):
+    return value % 2 == 0
+
+
+def has_tag(doc):
+    return 'b' in doc.get('tags', [])
+
+
+DOCS = [
+    {'int': i, 'name': f'doc{i}', 'tags': ['a', 'b'][:i % 3], 'nested': {'x': [i]}, 'rows': [{'v': i}, {'v': -i}]}
+    for i in range(12)
+]
+
+
+class TestQuerySpec(BaseCase):
+    def test_roundtrip(self):
+        doc = Query()
+        queries = [
+            doc.int == 3, doc.int != 3, doc.int < 3, doc.int <= 3, doc.int > 3, doc.int >= 3,
+            doc.nested.x == [4], doc.name.exists(), doc.name.matches(r'doc1\d'),
+            doc.name.search('1'), doc.name.matches(r'(?i)DOC1\d'), doc.int.test(is_even),
+            doc.tags.any(['b']),
+            doc.tags.all(['a', 'b']), doc.rows.any(Query().v == 3), doc.int.one_of([1, 5]),
+            doc.fragment({'int': 7}), doc.noop(), (doc.int > 2) & ~(doc.int > 8),
+            (doc.int == 1) | (doc.int == 2), has_tag,
+        ]
+        db = TinyDB(storage=MemoryStorage)
+        db.insert_multiple(DOCS)
+        for query in queries:
+            expected = db.search(query)
+            # the decoded query has the same hash, it would be answered from the cache
+            db.clear_cache()
+            self.assertEqual(db.search(decode_query(encode_query(query))), expected)
+
+    def test_not_cacheable(self):
+        with self.assertRaises(ValueError):
+            encode_query(Query().map(str) == '1')
+
+    def test_regex_flags(self):
+        doc = Query()
+        for query in [doc.name.matches('DOC', re.I), doc.name.search('DOC', flags=re.I),
+                      (doc.int > 1) & ~doc.name.search('DOC', re.I),
+                      doc.rows.any(Query().name.matches('x', re.M))]:
+            with self.assertRaises(ValueError):
+                encode_query(query)
+
+    def test_readonly_snapshot(self):
+        with self.assertRaises(ReadonlyStorageError):
+            _SnapshotStorage(None).write({})
+
+
+class TestProcessPool(BaseCase):
+    def test_pooled(self):
+        pool = AIOProcessPool(max_workers=2)
+
+        async def coro():
+            db = AIOTinyDB(self.file.name, process_pool=pool)
+            async with db:
+                db.insert_multiple(DOCS)
+                db.table('alt').insert({'int': 1})
+            self.assertEqual(len(await db.pooled().search(where('int').test(is_even))), 6)
+            self.assertEqual(await db.pooled().count(where('int') > 9), 2)
+            self.assertTrue(await db.pooled('alt').contains(where('int') == 1))
+            async with db:
+                db.insert({'int': 100})
+            self.assertEqual(await db.pooled().count(where('int') > 9), 3)
+            with self.assertRaises(DatabaseNotReady):
+                AIOTinyDB(self.file.name).pooled()
+
+        try:
+            self.loop.run_until_complete(coro())
+        finally:
+            pool.shutdown()
@@ -0,0 +1,85 @@
+import asyncio
+
+from . import BaseCase
+from aiotinydb.rwlock import AIORWLock
+
+
+class TestRWLock(BaseCase):
+    def test_writer_preference(self):
+        events = []
+
+        async def reader(lock, name, delay):
+            await asyncio.sleep(delay)
+            await lock.acquire_read()
+            events.append(name)
+            await asyncio.sleep(0.05)
+            lock.release_read()
+
+        async def writer(lock, delay):
+            await asyncio.sleep(delay)
+            await lock.acquire_write()
+            assert lock.locked() and not lock.readers
+            events.append('writer')
+            await asyncio.sleep(0.05)
+            lock.release_write()
+
+        async def coro():
+            lock = AIORWLock()
+            await asyncio.gather(
+                reader(lock, 'r1', 0), writer(lock, 0.01), reader(lock, 'r2', 0.02))
+            return lock
+
+        lock = self.loop.run_until_complete(coro())
+        self.assertEqual(events, ['r1', 'writer', 'r2'])
+        self.assertFalse(lock.locked())
+
+    def test_cancelled_writer(self):
+        async def coro():
+            lock = AIORWLock()
+            await lock.acquire_read()
+            task = asyncio.ensure_future(lock.acquire_write())
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.sleep(0)
+            # readers are not blocked by a writer which gave up
+            await asyncio.wait_for(lock.acquire_read(), 0.1)
+            self.assertEqual(lock.readers, 2)
+
+        self.loop.run_until_complete(coro())
+
+    def test_cancelled_reader(self):
+        async def reader(lock, started):
+            await lock.acquire_read()
+            try:
+                started.set()
+                await asyncio.sleep(100)
+            finally:
+                lock.release_read()
+
+        async def coro():
+            lock = AIORWLock()
+            started = asyncio.Event()
+            tasks = [asyncio.ensure_future(reader(lock, started)) for _ in range(2)]
+            await started.wait()
+            await asyncio.sleep(0)
+            writer = asyncio.ensure_future(lock.acquire_write())
+            await asyncio.sleep(0)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # the releases of the cancelled readers weren't dropped
+            self.assertEqual(lock.readers, 0)
+            await asyncio.wait_for(writer, 0.1)
+            self.assertTrue(lock.locked())
+
+        self.loop.run_until_complete(coro())
+
+    def test_release_unlocked(self):
+        async def coro():
+            lock = AIORWLock()
+            with self.assertRaises(RuntimeError):
+                lock.release_read()
+            with self.assertRaises(RuntimeError):
+                lock.release_write()
+
+        self.loop.run_until_complete(coro())
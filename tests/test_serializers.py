@@ -0,0 +1,99 @@
+import json
+import unittest
+
+from . import BaseCase
+from aiotinydb import AIOTinyDB
+from aiotinydb.serializers import (
+    MSGPACK_SUPPORTED, ORJSON_SUPPORTED, JSONSerializer, MsgPackSerializer, ORJSONSerializer,
+    default_serializer, detect_serializer,
+)
+
+DATA = {'_default': {'1': {'name': 'ä', 'tags': ['a', 1, 2.5, None, True]}}}
+
+
+class TestSerializers(BaseCase):
+    def read_file(self):
+        with open(self.file.name, 'rb') as f:
+            return f.read()
+
+    def test_round_trip(self):
+        serializers = [JSONSerializer()]
+        if ORJSON_SUPPORTED:
+            serializers.append(ORJSONSerializer())
+        if MSGPACK_SUPPORTED:
+            serializers.append(MsgPackSerializer())
+        for serializer in serializers:
+            contents = serializer.dumps(DATA)
+            self.assertEqual(serializer.loads(contents), DATA)
+            self.assertEqual(type(detect_serializer(contents)) is MsgPackSerializer,
+                             serializer.name == 'msgpack')
+
+    def test_default(self):
+        self.assertIsInstance(default_serializer(), JSONSerializer)
+        self.assertIsInstance(detect_serializer(b'{}'), JSONSerializer)
+
+    def test_json_compatibility(self):
+        big = 2 ** 70
+
+        async def coro():
+            with open(self.file.name, 'w') as f:
+                json.dump({'_default': {'1': {'nan': float('nan'), 'big': big}}}, f)
+            async with AIOTinyDB(self.file.name) as db:
+                doc = db.get(doc_id=1)
+                self.assertNotEqual(doc['nan'], doc['nan'])
+                self.assertEqual(doc['big'], big)
+                db.insert({'big': big + 1, 'keys': {1: 'int key'}})
+            with open(self.file.name) as f:
+                self.assertEqual(json.load(f)['_default']['2'], {'big': big + 1, 'keys': {'1': 'int key'}})
+        self.loop.run_until_complete(coro())
+
+    def test_explicit_serializer_reads(self):
+        class CountingSerializer(JSONSerializer):
+            loaded = 0
+
+            def loads(self, contents):
+                CountingSerializer.loaded += 1
+                return super().loads(contents)
+
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                db.insert({'int': 1})
+            serializer = CountingSerializer()
+            async with AIOTinyDB(self.file.name, serializer=serializer) as db:
+                self.assertEqual(len(db), 1)
+                self.assertIs(db.storage.serializer, serializer)
+            self.assertEqual(CountingSerializer.loaded, 1)
+        self.loop.run_until_complete(coro())
+
+    @unittest.skipUnless(ORJSON_SUPPORTED, 'orjson is not installed')
+    def test_orjson(self):
+        self.assertEqual(ORJSONSerializer().dumps(DATA, indent=2),
+                         json.dumps(DATA, indent=2, ensure_ascii=False).encode())
+        with self.assertRaises(TypeError):
+            ORJSONSerializer().dumps(DATA, separators=(',', ':'))
+
+    def test_json_kwargs(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name, indent=4) as db:
+                db.insert({'int': 1})
+            self.assertEqual(self.read_file(), json.dumps(
+                {'_default': {'1': {'int': 1}}}, indent=4).encode())
+        self.loop.run_until_complete(coro())
+
+    @unittest.skipUnless(MSGPACK_SUPPORTED, 'msgpack is not installed')
+    def test_msgpack_detection(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name, serializer=MsgPackSerializer()) as db:
+                db.insert({'int': 1})
+            self.assertEqual(MsgPackSerializer().loads(self.read_file()),
+                             {'_default': {'1': {'int': 1}}})
+            # the format of the file is kept without passing a serializer
+            async with AIOTinyDB(self.file.name) as db:
+                self.assertIsInstance(db.storage.serializer, MsgPackSerializer)
+                db.insert({'int': 2})
+            self.assertEqual(len(MsgPackSerializer().loads(self.read_file())['_default']), 2)
+            # and converted with one
+            async with AIOTinyDB(self.file.name, serializer=JSONSerializer()) as db:
+                db.insert({'int': 3})
+            self.assertEqual(len(json.loads(self.read_file())['_default']), 3)
+        self.loop.run_until_complete(coro())
@@ -0,0 +1,106 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from tinydb import where
+
+from aiotinydb import AIOSnapshotStorage, AIOTinyDB
+from aiotinydb.exceptions import ReadonlyStorageError
+from aiotinydb.serializers import JSONSerializer
+
+
+class TestSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'db.json')
+        self.dump({
+            '_default': {str(i): {'int': i} for i in range(1, 101)},
+            'unsorted': {'3': {'char': 'c'}, '1': {'char': 'a'}, '20': {'char': 'ä'}},
+        })
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.path)
+
+    def dump(self, data):
+        with open(self.filename, 'w') as f:
+            json.dump(data, f)
+
+    def db(self, **kwargs):
+        return AIOTinyDB(self.filename, storage=AIOSnapshotStorage, **kwargs)
+
+    def test_read(self):
+        async def coro():
+            async with self.db() as db:
+                self.assertEqual(db.tables(), {'_default', 'unsorted'})
+                self.assertEqual(len(db), 100)
+                self.assertEqual(db.get(doc_id=42), {'int': 42})
+                self.assertIsNone(db.get(doc_id=101))
+                self.assertEqual(db.count(where('int') > 90), 10)
+                unsorted = db.table('unsorted')
+                self.assertEqual([doc.doc_id for doc in unsorted], [3, 1, 20])
+                self.assertEqual(unsorted.get(doc_id=20), {'char': 'ä'})
+                self.assertTrue(unsorted.contains(doc_id=1))
+                self.assertEqual([doc['int'] async for doc in db.aiter(where('int') < 3)], [1, 2])
+                with self.assertRaises(ReadonlyStorageError):
+                    db.insert({'int': 0})
+        self.loop.run_until_complete(coro())
+        self.assertTrue(os.path.exists(self.filename + '.snap'))
+
+    def test_shared(self):
+        async def coro():
+            first, second = self.db(), self.db(persistent=True)
+            async with first:
+                self.assertEqual(len(first), 100)
+            async with second:
+                self.assertEqual(len(second), 100)
+            # the second one maps the snapshot the first one built
+            self.assertEqual(first.storage.snapshots_built, 1)
+            self.assertEqual(second.storage.snapshots_built, 0)
+            self.assertEqual(first.storage.generation, second.storage.generation)
+            self.dump({'_default': {'1': {'int': 1}}})
+            async with second:
+                self.assertEqual(len(second), 1)
+            async with first:
+                self.assertEqual(len(first), 1)
+            self.assertEqual(first.storage.snapshots_built, 1)
+            self.assertEqual(second.storage.snapshots_built, 1)
+            self.assertEqual((first.storage.generation, second.storage.generation), (2, 2))
+            await second.aclose()
+        self.loop.run_until_complete(coro())
+
+    def test_snapshot_file(self):
+        snapshot_file = os.path.join(self.path, 'shm', 'db.snap')
+        os.mkdir(os.path.dirname(snapshot_file))
+
+        async def coro():
+            async with self.db(snapshot_file=snapshot_file) as db:
+                self.assertEqual(db.storage.snapshot_filename, snapshot_file)
+                self.assertEqual(len(db), 100)
+        self.loop.run_until_complete(coro())
+        self.assertTrue(os.path.exists(snapshot_file))
+        self.assertFalse(os.path.exists(self.filename + '.snap'))
+
+    def test_serializer(self):
+        class TaggingSerializer(JSONSerializer):
+            name = 'tagging'
+            dumped = []
+
+            def dumps(self, data, **kwargs):
+                TaggingSerializer.dumped.append(kwargs)
+                return super().dumps(data, **kwargs)
+
+        async def coro():
+            async with self.db(serializer=TaggingSerializer(), sort_keys=True) as db:
+                self.assertEqual(db.get(doc_id=42), {'int': 42})
+            self.assertEqual(len(TaggingSerializer.dumped), 103)
+            self.assertEqual(TaggingSerializer.dumped[0], {'sort_keys': True})
+            # a snapshot in another format is built again
+            async with self.db() as db:
+                self.assertEqual(db.get(doc_id=42), {'int': 42})
+                self.assertEqual((db.storage.snapshots_built, db.storage.generation), (1, 2))
+        self.loop.run_until_complete(coro())
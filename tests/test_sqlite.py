@@ -0,0 +1,152 @@
+import asyncio
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from contextlib import closing
+
+from tinydb import where
+
+from aiotinydb import AIOSQLiteStorage, AIOTinyDB, HistogramMetrics
+from aiotinydb.exceptions import ReadonlyStorageError
+from aiotinydb.sqlite import json_to_sqlite, sqlite_to_json
+
+
+class TestSQLite(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'db.sqlite')
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.path)
+
+    def db(self, **kwargs):
+        return AIOTinyDB(self.filename, storage=AIOSQLiteStorage, **kwargs)
+
+    def rows(self):
+        with closing(sqlite3.connect(self.filename)) as connection:
+            return {(tbl, doc_id): json.loads(doc) for tbl, doc_id, doc in connection.execute(
+                'SELECT tbl, doc_id, doc FROM tinydb_documents')}
+
+    def test_round_trip(self):
+        async def coro():
+            async with self.db() as db:
+                db.insert_multiple({'int': i} for i in range(10))
+                db.table('empty')
+                db.table('other').insert({'char': 'ä'})
+                db.table('empty').truncate()
+            async with self.db() as db:
+                self.assertEqual(db.tables(), {'_default', 'empty', 'other'})
+                self.assertEqual(db.count(where('int') > 4), 5)
+                self.assertEqual(db.table('other').all(), [{'char': 'ä'}])
+                db.drop_table('other')
+            async with self.db(access_mode='r') as db:
+                self.assertEqual(db.tables(), {'_default', 'empty'})
+                with self.assertRaises(ReadonlyStorageError):
+                    db.insert({'int': 10})
+        self.loop.run_until_complete(coro())
+        self.assertEqual(self.rows()[('_default', 3)], {'int': 2})
+
+    def test_delta(self):
+        metrics = HistogramMetrics()
+
+        async def coro():
+            db = self.db(metrics=metrics)
+            async with db:
+                db.insert_multiple({'int': i} for i in range(1000))
+            self.assertEqual(db.storage.rows_written, 1000)
+            async with db:
+                db.update({'touched': True}, where('int') == 5)
+                db.remove(where('int') >= 998)
+                db.table('other').insert({'int': 0})
+            self.assertEqual((db.storage.rows_written, db.storage.rows_deleted), (1002, 2))
+            async with db:
+                db.all()
+            self.assertEqual((db.storage.flushes, db.storage.skipped_flushes), (2, 1))
+        self.loop.run_until_complete(coro())
+        rows = self.rows()
+        self.assertEqual(len(rows), 999)
+        self.assertEqual(rows[('_default', 6)], {'int': 5, 'touched': True})
+        self.assertEqual(metrics['flock_wait'].count, 3)
+        self.assertEqual(metrics['write'].count, 2)
+
+    def test_persistent(self):
+        async def coro():
+            db = self.db(persistent=True)
+            other = self.db()
+            async with db:
+                db.insert({'int': 1})
+            generation = db.storage.generation
+            async with db.reading():
+                self.assertEqual(len(db), 1)
+            # kept across sessions
+            self.assertEqual(db.storage.generation, generation)
+            async with other:
+                other.insert({'int': 2})
+            async with db:
+                self.assertEqual(len(db), 2)
+            self.assertGreater(db.storage.generation, generation)
+            await db.aclose()
+        self.loop.run_until_complete(coro())
+
+    def test_aclose(self):
+        def threads():
+            # of this test, other tests may not close their storages
+            return [thread for thread in threading.enumerate()
+                    if thread.name.startswith('aiotinydb-sqlite') and thread not in before]
+
+        async def coro():
+            db = self.db()
+            async with db:
+                db.insert({'int': 1})
+            # kept between sessions
+            self.assertEqual(len(threads()), 1)
+            await db.aclose()
+            for thread in threads():
+                thread.join(1)
+            self.assertEqual(threads(), [])
+            # started again by the next session
+            async with db:
+                self.assertEqual(len(db), 1)
+            await db.aclose()
+        before = threading.enumerate()
+        self.loop.run_until_complete(coro())
+
+    def test_concurrent_access(self):
+        async def coro():
+            writer, reader = self.db(), self.db(access_mode='r')
+            blocked = self.db(lock_timeout=0.1)
+            async with writer:
+                writer.insert({'int': 1})
+            async with writer:
+                writer.insert({'int': 2})
+                # readers see the last commit without waiting
+                async with reader:
+                    self.assertEqual(len(reader), 1)
+                with self.assertRaises(asyncio.TimeoutError):
+                    async with blocked:
+                        pass
+            async with blocked:
+                self.assertEqual(len(blocked), 2)
+        self.loop.run_until_complete(coro())
+
+    def test_migration(self):
+        source = os.path.join(self.path, 'source.json')
+        target = os.path.join(self.path, 'target.json')
+        data = {'_default': {'1': {'int': 1}}, 'other': {'2': {'char': 'ä'}}, 'empty': {}}
+        with open(source, 'w') as f:
+            json.dump(data, f)
+
+        async def coro():
+            await json_to_sqlite(source, self.filename)
+            async with self.db() as db:
+                self.assertEqual(db.table('other').get(doc_id=2), {'char': 'ä'})
+            await sqlite_to_json(self.filename, target)
+        self.loop.run_until_complete(coro())
+        with open(target) as f:
+            self.assertEqual(json.load(f), data)
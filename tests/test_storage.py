@@ -0,0 +1,381 @@
+import asyncio
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+from unittest import mock
+
+from . import BaseCase
+from aiotinydb import AIOTinyDB
+from aiotinydb.exceptions import ReadonlyStorageError
+from aiotinydb.serializers import JSONSerializer, detect_serializer
+from aiotinydb.storage import (
+    AIOImmutableJSONStorage, AIOJSONStorage, AIOLogStorage, AIOMappedJSONStorage, _index_tables,
+)
+
+
+class TestExecutor(BaseCase):
+    def populate(self, docs):
+        with open(self.file.name, 'w') as f:
+            json.dump({'_default': {str(i): {'id': i, 'name': f'user{i}'}
+                                    for i in range(1, docs + 1)}}, f)
+
+    def test_invalid_executor(self):
+        with self.assertRaises(ValueError):
+            AIOJSONStorage(self.file.name, executor='fibers')
+
+    def test_executors(self):
+        self.populate(10)
+
+        async def coro():
+            with ThreadPoolExecutor(1) as pool:
+                for inserted, executor in enumerate(('thread', 'process', pool), 1):
+                    async with AIOTinyDB(self.file.name, executor=executor) as db:
+                        db.insert({'executor': str(executor)})
+                    async with AIOTinyDB(self.file.name, executor=executor,
+                                         storage=AIOImmutableJSONStorage) as db:
+                        self.assertEqual(len(db), 10 + inserted)
+        self.loop.run_until_complete(coro())
+
+    def test_loop_lag(self):
+        self.populate(50000)
+        lags = []
+
+        async def ticker(stop):
+            last = perf_counter()
+            while not stop.is_set():
+                await asyncio.sleep(0)
+                now = perf_counter()
+                lags.append(now - last)
+                last = now
+
+        async def coro():
+            # the pure-Python encoder of the json module releases the GIL
+            db = AIOTinyDB(self.file.name, executor='thread', indent=2,
+                           serializer=JSONSerializer())
+            async with db:
+                db.insert({'id': 0})
+                stop = asyncio.Event()
+                task = asyncio.ensure_future(ticker(stop))
+                await asyncio.sleep(0)
+                start = perf_counter()
+            duration = perf_counter() - start
+            stop.set()
+            await task
+            return duration
+
+        duration = self.loop.run_until_complete(coro())
+        self.assertLess(max(lags), duration / 2)
+
+
+class TestAtomic(BaseCase):
+    def test_invalid_fsync(self):
+        with self.assertRaises(ValueError):
+            AIOJSONStorage(self.file.name, fsync='sometimes')
+
+    def test_atomic_commit(self):
+        os.chmod(self.file.name, 0o640)
+
+        async def coro():
+            for fsync in ('none', 'file', 'full'):
+                async with AIOTinyDB(self.file.name, atomic=True, fsync=fsync) as db:
+                    db.insert({'fsync': fsync})
+            async with AIOTinyDB(self.file.name, fsync='full') as db:
+                db.insert({'fsync': 'in place'})
+            async with AIOTinyDB(self.file.name) as db:
+                self.assertEqual(len(db), 4)
+        self.loop.run_until_complete(coro())
+        self.assertEqual(os.stat(self.file.name).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(os.path.dirname(self.file.name)).count(
+            os.path.basename(self.file.name)), 1)
+        self.assertFalse([name for name in os.listdir(os.path.dirname(self.file.name))
+                          if name.startswith(f'.{os.path.basename(self.file.name)}.')])
+
+    def test_fault_injection(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name) as db:
+                db.insert({'int': 1})
+            with open(self.file.name) as f:
+                before = f.read()
+            for target in ('aiotinydb.storage.os.replace', 'aiotinydb.storage.os.fsync'):
+                with mock.patch(target, side_effect=OSError(28, 'No space left on device')):
+                    with self.assertRaises(OSError):
+                        async with AIOTinyDB(self.file.name, atomic=True, fsync='file') as db:
+                            db.insert({'int': 2})
+                with open(self.file.name) as f:
+                    self.assertEqual(f.read(), before)
+            self.assertFalse([name for name in os.listdir(os.path.dirname(self.file.name))
+                              if name.startswith(f'.{os.path.basename(self.file.name)}.')])
+        self.loop.run_until_complete(coro())
+
+    def test_concurrent_atomic_writers(self):
+        async def access_db(sleep_duration):
+            async with AIOTinyDB(self.file.name, atomic=True) as db:
+                await asyncio.sleep(sleep_duration)
+                db.insert({})
+
+        async def coro():
+            await asyncio.gather(*(access_db(0.01 * i) for i in range(5)))
+            async with AIOTinyDB(self.file.name) as db:
+                self.assertEqual(len(db), 5)
+        self.loop.run_until_complete(coro())
+
+
+class TestDirty(BaseCase):
+    def test_skip_clean_sessions(self):
+        with open(self.file.name, 'w') as f:
+            json.dump({'_default': {'1': {'int': 1}}}, f, indent=4)
+        with open(self.file.name) as f:
+            before = f.read()
+
+        async def coro():
+            db = AIOTinyDB(self.file.name)
+            for _ in range(3):
+                async with db:
+                    self.assertEqual(len(db.all()), 1)
+            with open(self.file.name) as f:
+                self.assertEqual(f.read(), before)
+            async with db:
+                db.insert({'int': 2})
+            self.assertEqual((db.storage.flushes, db.storage.skipped_flushes), (1, 3))
+        self.loop.run_until_complete(coro())
+
+
+class TestPersistent(BaseCase):
+    def read_file(self):
+        with open(self.file.name) as f:
+            return f.read()
+
+    def test_reuse_parsed_data(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, persistent=True)
+            with mock.patch('aiotinydb.storage.detect_serializer',
+                            wraps=detect_serializer) as detect:
+                for i in range(3):
+                    async with db:
+                        db.insert({'int': i})
+                    self.assertEqual(len(json.loads(self.read_file())['_default']), i + 1)
+                async with db.reading():
+                    self.assertEqual(len(db), 3)
+                # the file only ever contained what this instance wrote
+                self.assertEqual(detect.call_count, 0)
+                async with AIOTinyDB(self.file.name) as other:
+                    other.insert({'int': 'other'})
+                async with db:
+                    self.assertEqual(len(db), 4)
+                # parsed once by `other`, once after detecting its change
+                self.assertEqual(detect.call_count, 2)
+            await db.aclose()
+            self.assertIsNone(db.storage._file)
+        self.loop.run_until_complete(coro())
+
+    def test_flush_interval(self):
+        async def coro():
+            for atomic in (False, True):
+                with open(self.file.name, 'w'):
+                    pass
+                db = AIOTinyDB(self.file.name, persistent=True, flush_interval=0.1, atomic=atomic)
+                async with db:
+                    db.insert({'int': 1})
+                async with db:
+                    db.insert({'int': 2})
+                self.assertEqual(self.read_file(), '')
+                await asyncio.sleep(0.2)
+                self.assertEqual(len(json.loads(self.read_file())['_default']), 2)
+                self.assertEqual(db.storage.flushes, 1)
+                # the file is unlocked after flushing
+                async with AIOTinyDB(self.file.name, lock_timeout=0) as other:
+                    other.insert({'int': 3})
+                async with db:
+                    db.insert({'int': 4})
+                await db.flush()
+                self.assertEqual(len(json.loads(self.read_file())['_default']), 4)
+                async with db:
+                    db.insert({'int': 5})
+                await db.aclose()
+                self.assertEqual(len(json.loads(self.read_file())['_default']), 5)
+        self.loop.run_until_complete(coro())
+
+
+class TestLog(BaseCase):
+    def setUp(self):
+        super().setUp()
+        self.log = self.file.name + '.log'
+
+    def tearDown(self):
+        super().tearDown()
+        if os.path.exists(self.log):
+            os.remove(self.log)
+
+    def read_log(self):
+        with open(self.log) as f:
+            return [json.loads(line) for line in f]
+
+    def test_append_and_replay(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, storage=AIOLogStorage, compact_ratio=None)
+            async with db:
+                db.insert_multiple({'int': i} for i in range(3))
+            async with db:
+                db.update({'int': 10}, doc_ids=[2])
+                db.remove(doc_ids=[3])
+                db.table('other').insert({'int': 4})
+            async with db:
+                db.drop_table('other')
+            # the snapshot is never written, every session appended a batch
+            with open(self.file.name) as f:
+                self.assertEqual(f.read(), '')
+            self.assertEqual(self.read_log()[-2:], [['drop', 'other'], ['commit']])
+            self.assertEqual(sum(record == ['commit'] for record in self.read_log()), 3)
+            self.assertEqual(db.storage.compactions, 0)
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage) as other:
+                self.assertEqual([doc['int'] for doc in other.all()], [0, 10])
+                self.assertEqual(other.tables(), {'_default'})
+        self.loop.run_until_complete(coro())
+
+    def test_torn_tail(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, storage=AIOLogStorage, compact_ratio=None)
+            async with db:
+                db.insert({'int': 1})
+            with open(self.log, 'a') as f:
+                f.write('["put", "_default", "2", {"int": 2}]\n["put", "_defa')
+            async with db:
+                self.assertEqual(len(db), 1)
+                db.insert({'int': 3})
+            # cut off before the next batch was appended
+            self.assertEqual(sum(record == ['commit'] for record in self.read_log()), 2)
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage) as other:
+                self.assertEqual([doc['int'] for doc in other.all()], [1, 3])
+        self.loop.run_until_complete(coro())
+
+    def test_uncommitted_records(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, storage=AIOLogStorage, compact_ratio=None)
+            async with db:
+                db.insert({'int': 1})
+            with open(self.log, 'a') as f:
+                f.write('["put", "_default", "2", {"int": 2}]\n')
+            async with db:
+                self.assertEqual(len(db), 1)
+                db.table('other').insert({'int': 3})
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage) as other:
+                self.assertEqual([doc['int'] for doc in other.all()], [1])
+                self.assertEqual(len(other.table('other')), 1)
+        self.loop.run_until_complete(coro())
+
+    def test_compaction(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, storage=AIOLogStorage, compact_size=200)
+            for i in range(10):
+                async with db:
+                    db.insert({'int': i, 'padding': 'x' * 20})
+            # waits for the compaction running in the background
+            await db.aclose()
+            self.assertGreater(db.storage.compactions, 0)
+            self.assertEqual(db.storage.flushes, 10)
+            self.assertLess(os.path.getsize(self.log), 200)
+            with open(self.file.name) as f:
+                self.assertGreater(len(json.load(f)['_default']), 0)
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage) as other:
+                self.assertEqual([doc['int'] for doc in other.all()], list(range(10)))
+        self.loop.run_until_complete(coro())
+
+    def test_failed_compaction(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, storage=AIOLogStorage, compact_size=10)
+            with mock.patch.object(AIOLogStorage, '_compact', side_effect=OSError('full')):
+                # the session doesn't wait for the compaction it started
+                async with db:
+                    db.insert({'int': 1})
+                await asyncio.sleep(0.1)
+                # its error is raised by the next session
+                with self.assertRaises(OSError):
+                    async with db:
+                        pass
+                async with db:
+                    self.assertEqual(len(db), 1)
+                    db.insert({'int': 2})
+                with self.assertRaises(OSError):
+                    await db.aclose()
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage) as other:
+                self.assertEqual(len(other), 2)
+        self.loop.run_until_complete(coro())
+
+    def test_persistent(self):
+        async def coro():
+            db = AIOTinyDB(self.file.name, storage=AIOLogStorage, persistent=True)
+            async with db:
+                db.insert({'int': 1})
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage) as other:
+                other.insert({'int': 2})
+            # the log written by `other` is noticed and replayed
+            async with db:
+                self.assertEqual(len(db), 2)
+                db.insert({'int': 3})
+            await db.aclose()
+            async with AIOTinyDB(self.file.name, storage=AIOLogStorage) as other:
+                self.assertEqual(len(other), 3)
+        self.loop.run_until_complete(coro())
+
+
+class TestMapped(BaseCase):
+    data = {
+        '_default': {'1': {'text': 'braces } { and "quotes" \\'}},
+        'tab "}le"': {'1': {'nested': {'deep': [{'x': 1}, {}]}}, '2': {}},
+        'ünïcode': {},
+    }
+
+    def tearDown(self):
+        super().tearDown()
+        if os.path.exists(self.file.name + '.idx'):
+            os.remove(self.file.name + '.idx')
+
+    def test_lazy_tables(self):
+        async def coro():
+            for indent in (None, 2):
+                with open(self.file.name, 'w') as f:
+                    json.dump(self.data, f, indent=indent)
+                async with AIOTinyDB(self.file.name, storage=AIOMappedJSONStorage) as db:
+                    self.assertEqual(db.tables(), set(self.data))
+                    self.assertEqual(db.storage.read().decoded, [])
+                    self.assertEqual(db.table('tab "}le"').get(doc_id=1),
+                                     self.data['tab "}le"']['1'])
+                    self.assertEqual(db.storage.read().decoded, ['tab "}le"'])
+                    self.assertEqual(len(db.table('ünïcode')), 0)
+                    self.assertEqual(db.all(), list(self.data['_default'].values()))
+        self.loop.run_until_complete(coro())
+
+    def test_index_file(self):
+        with open(self.file.name, 'w') as f:
+            json.dump(self.data, f)
+
+        async def coro():
+            with mock.patch('aiotinydb.storage._index_tables', wraps=_index_tables) as index:
+                for _ in range(2):
+                    async with AIOTinyDB(self.file.name, storage=AIOMappedJSONStorage) as db:
+                        self.assertEqual(len(db.table('tab "}le"')), 2)
+                self.assertEqual(index.call_count, 1)
+                # a changed file is indexed again
+                with open(self.file.name, 'w') as f:
+                    json.dump({'other': {'1': {}}}, f)
+                async with AIOTinyDB(self.file.name, storage=AIOMappedJSONStorage) as db:
+                    self.assertEqual(db.tables(), {'other'})
+                self.assertEqual(index.call_count, 2)
+                async with AIOTinyDB(self.file.name, storage=AIOMappedJSONStorage,
+                                     index_file=False) as db:
+                    self.assertEqual(len(db.table('other')), 1)
+                self.assertEqual(index.call_count, 3)
+        self.loop.run_until_complete(coro())
+
+    def test_empty_and_readonly(self):
+        async def coro():
+            async with AIOTinyDB(self.file.name, storage=AIOMappedJSONStorage) as db:
+                self.assertEqual(db.tables(), set())
+                with self.assertRaises(ReadonlyStorageError):
+                    db.insert({'int': 1})
+            with open(self.file.name, 'w') as f:
+                f.write('{}')
+            async with AIOTinyDB(self.file.name, storage=AIOMappedJSONStorage) as db:
+                self.assertEqual(db.tables(), set())
+        self.loop.run_until_complete(coro())
@@ -0,0 +1,88 @@
+import json
+import random
+from unittest import mock
+
+from tinydb import where
+
+from . import BaseCase
+from aiotinydb import AIOJSONStorage, AIOLogStorage, AIOTinyDB
+from aiotinydb.streaming import build_tree, iter_records
+
+
+def random_value(rng, depth=0):
+    if depth < 3 and rng.random() < 0.2:
+        return {f'k{i}ä"': random_value(rng, depth + 1) for i in range(rng.randrange(4))}
+    if depth < 3 and rng.random() < 0.2:
+        return [random_value(rng, depth + 1) for i in range(rng.randrange(4))]
+    return rng.choice([rng.randrange(-10**12, 10**12), rng.random() * 1e9, -1.5e-7, 1e300,
+                       'a \\ "b"', None, True, False])
+
+
+def parse(contents, chunk_size):
+    return build_tree(iter_records(lambda offset, size: contents[offset:offset + size],
+                                   chunk_size))
+
+
+class TestParser(BaseCase):
+    def test_matches_json(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            data = {f't{t}': {str(i): random_value(rng) for i in range(rng.randrange(20))}
+                    for t in range(rng.randrange(1, 4))}
+            data['scalar'] = random_value(rng)
+            for indent in (None, 2):
+                contents = json.dumps(data, indent=indent, ensure_ascii=False).encode()
+                for chunk_size in (1, 7, 4096):
+                    self.assertEqual(parse(contents, chunk_size), data)
+        self.assertIsNone(parse(b'', 1))
+        for contents in (b'{}', b' { } '):
+            self.assertEqual(parse(contents, 1), json.loads(contents))
+
+    def test_malformed(self):
+        for contents in (b'{', b'[]', b'{"a": {"1": 1,}}', b'{"a": {}} x', b'{"a": {"1": 1x}}'):
+            with self.assertRaises(json.JSONDecodeError):
+                parse(contents, 2)
+
+
+class TestStreaming(BaseCase):
+    def setUp(self):
+        super().setUp()
+        docs = {'a': {str(i): {'int': i} for i in range(1, 101)},
+                'b': {str(i): {'int': i, 'char': 'ä'} for i in range(1, 11)},
+                'c': {'1': {'int': 1}}}
+        with open(self.file.name, 'w') as f:
+            json.dump(docs, f)
+
+    def db(self):
+        return AIOTinyDB(self.file.name, streaming=True)
+
+    def test_load(self):
+        async def coro():
+            with mock.patch.object(AIOJSONStorage, '_read_data') as read_data:
+                async with self.db() as db:
+                    self.assertEqual(len(db.table('a')), 100)
+                    db.table('c').insert({'int': 2})
+                self.assertFalse(read_data.called)
+            async with AIOTinyDB(self.file.name) as db:
+                self.assertEqual(db.tables(), {'a', 'b', 'c'})
+                self.assertEqual(len(db.table('c')), 2)
+        self.loop.run_until_complete(coro())
+
+    def test_aiter(self):
+        async def coro():
+            with mock.patch.object(AIOJSONStorage, '_parse_now') as parse_now:
+                async with self.db() as db:
+                    docs = [doc async for doc in db.table('b').aiter(where('int') > 5)]
+                    self.assertEqual([doc.doc_id for doc in docs], [6, 7, 8, 9, 10])
+                    self.assertEqual(docs[0], {'int': 6, 'char': 'ä'})
+                    self.assertEqual([doc async for doc in db.table('missing').aiter()], [])
+                self.assertFalse(parse_now.called)
+            async with self.db() as db:
+                db.table('b').remove(where('int') > 1)
+                self.assertEqual([doc async for doc in db.table('b').aiter()],
+                                 [{'int': 1, 'char': 'ä'}])
+        self.loop.run_until_complete(coro())
+
+    def test_unsupported(self):
+        with self.assertRaises(ValueError):
+            AIOLogStorage(self.file.name, streaming=True)
@@ -0,0 +1,114 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+
+from tinydb import where
+
+from aiotinydb import AIOFileWatcher, AIOTinyDB, TableChange
+from aiotinydb.compression import GzipCodec
+from aiotinydb.exceptions import DatabaseNotReady
+from aiotinydb.storage import AIOLogStorage
+from aiotinydb.watch import INOTIFY_SUPPORTED, read_digests
+
+
+class TestWatch(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.path = tempfile.mkdtemp()
+        self.filename = os.path.join(self.path, 'db.json')
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.path)
+
+    async def changes(self, feed, count):
+        return [await asyncio.wait_for(feed.__anext__(), 5) for _ in range(count)]
+
+    def check_feed(self, **kwargs):
+        async def coro():
+            writer = AIOTinyDB(self.filename, atomic=True)
+            async with writer:
+                writer.table('other').insert({'int': 0})
+            feed = AIOTinyDB(self.filename).watch(**kwargs)
+            # started on the first step
+            pending = asyncio.ensure_future(self.changes(feed, 1))
+            await asyncio.sleep(0.05)
+            async with writer:
+                writer.table('users').insert({'name': 'a'})
+            self.assertEqual(await pending, [TableChange('users', 'created')])
+            async with writer:
+                writer.table('users').update({'name': 'b'})
+            self.assertEqual(await self.changes(feed, 1), [TableChange('users', 'changed')])
+            async with writer:
+                writer.drop_table('users')
+                writer.table('other').insert({'int': 1})
+            self.assertEqual(await self.changes(feed, 2),
+                             [TableChange('other', 'changed'), TableChange('users', 'dropped')])
+            await feed.aclose()
+        self.loop.run_until_complete(coro())
+
+    @unittest.skipUnless(INOTIFY_SUPPORTED, 'inotify is only available on Linux')
+    def test_inotify(self):
+        self.check_feed()
+
+    def test_polling(self):
+        self.check_feed(inotify=False, poll_interval=0.01)
+
+    def test_watcher(self):
+        async def coro():
+            async with AIOFileWatcher(self.filename, inotify=False, poll_interval=0.01) as watcher:
+                self.assertEqual(watcher.method, 'poll')
+                waiting = asyncio.ensure_future(watcher.wait())
+                await asyncio.sleep(0.05)
+                self.assertFalse(waiting.done())
+                with open(self.filename, 'w') as f:
+                    f.write('{}')
+                await asyncio.wait_for(waiting, 5)
+            if INOTIFY_SUPPORTED:
+                async with AIOFileWatcher(self.filename) as watcher:
+                    self.assertEqual(watcher.method, 'inotify')
+        self.loop.run_until_complete(coro())
+
+    def test_digests(self):
+        compressed = os.path.join(self.path, 'db.json.gz')
+
+        async def coro():
+            self.assertEqual(await read_digests(self.filename), {})
+            for filename, kwargs in [(self.filename, {}),
+                                     (compressed, {'compression': GzipCodec()})]:
+                async with AIOTinyDB(filename, **kwargs) as db:
+                    db.insert({'int': 1})
+                    db.table('empty')
+                    db.table('other').insert({'int': 1})
+                digests = await read_digests(filename)
+                self.assertEqual(set(digests), {'_default', 'other'})
+                self.assertEqual(digests['_default'], digests['other'])
+        self.loop.run_until_complete(coro())
+
+    def test_invalidation(self):
+        async def coro():
+            db = AIOTinyDB(self.filename, persistent=True, result_cache_size=8)
+            other = AIOTinyDB(self.filename)
+            async with other:
+                other.insert({'int': 1})
+            async with db.reading():
+                self.assertEqual(len(db.search(where('int') == 1)), 1)
+            self.assertIsNotNone(db.storage._data)
+            feed = db.watch(inotify=False, poll_interval=0.01)
+            pending = asyncio.ensure_future(self.changes(feed, 1))
+            await asyncio.sleep(0.05)
+            async with other:
+                other.insert({'int': 1})
+            await pending
+            # dropped before the next session
+            self.assertIsNone(db.storage._data)
+            async with db.reading():
+                self.assertEqual(len(db.search(where('int') == 1)), 2)
+            await feed.aclose()
+            await db.aclose()
+
+            with self.assertRaises(DatabaseNotReady):
+                await AIOTinyDB(self.filename, storage=AIOLogStorage).watch().__anext__()
+        self.loop.run_until_complete(coro())